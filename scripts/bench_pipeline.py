@@ -0,0 +1,148 @@
+"""Benchmark of the broadcast path: source chunks -> broadcast units -> subscribers.
+
+Pushes synthetic MP3 through the frame parser, the chunker and the broadcast ring with a
+number of subscribers reading every unit, and reports CPU time and allocated memory per
+broadcast MiB. With --baseline, the same run is repeated with src/streaming/frames.py as
+of that git revision (e.g. the commit before the zero-copy pipeline) for comparison.
+
+    poetry run python -m scripts.bench_pipeline [--mib 32] [--subscribers 10] [--baseline REV]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+import subprocess
+import sys
+from collections.abc import Iterator
+from types import ModuleType
+
+from src.streaming.broadcast import BroadcastRing
+from src.streaming import frames as current_frames
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz: 417/418-byte frames.
+_HEADER = b"\xff\xfb\x90\x00"
+_HEADER_PADDED = b"\xff\xfb\x92\x00"
+
+
+def synthetic_mp3(size: int) -> bytes:
+    frames: list[bytes] = []
+    total = 0
+    i = 0
+    while total < size:
+        # Padding pattern of a real 128 kbps stream (about every third frame).
+        padded = i % 3 == 2
+        frame = (_HEADER_PADDED if padded else _HEADER) + bytes([i % 251]) * (
+            (418 if padded else 417) - 4
+        )
+        frames.append(frame)
+        total += len(frame)
+        i += 1
+    return b"".join(frames)
+
+
+def source_chunks(data: bytes, chunk_size: int) -> Iterator[bytes]:
+    for i in range(0, len(data), chunk_size):
+        yield data[i : i + chunk_size]
+
+
+def frame_pipeline(
+    frames: ModuleType, data: bytes, chunk_size: int, unit_size: int, subscribers: int
+) -> Iterator[None]:
+    parser = frames.MpegFrameParser()
+    chunker = frames.FrameChunker(target_size=unit_size, fallback_bytes_per_second=16000.0)
+    ring = BroadcastRing(capacity=256)
+    cursors = [0] * subscribers
+
+    def publish_ready(final: bool) -> Iterator[None]:
+        while chunker.ready() or (final and chunker.pending_bytes):
+            unit = chunker.pop()
+            if unit is None:
+                return
+            ring.publish(unit.data, unit.duration)
+            for i, cursor in enumerate(cursors):
+                ring.get(cursor)
+                cursors[i] = cursor + 1
+            yield
+
+    for raw in source_chunks(data, chunk_size):
+        chunker.push(parser.feed(raw))
+        yield from publish_ready(final=False)
+    chunker.push(parser.flush())
+    yield from publish_ready(final=True)
+
+
+def measure(
+    frames: ModuleType,
+    data: bytes,
+    chunk_size: int,
+    unit_size: int,
+    subscribers: int,
+) -> tuple[float, float]:
+    """Returns (CPU ms, allocated MiB) per broadcast MiB."""
+
+    mib = len(data) / (1024 * 1024)
+
+    started = time.process_time()
+    for _ in frame_pipeline(frames, data, chunk_size, unit_size, subscribers):
+        pass
+    cpu_ms = (time.process_time() - started) * 1000.0 / mib
+
+    # Separate pass: tracing slows everything down. Per-step peaks add up to (roughly)
+    # everything allocated, since each step frees what the previous one allocated.
+    allocated = 0
+    tracemalloc.start()
+    try:
+        steps = frame_pipeline(frames, data, chunk_size, unit_size, subscribers)
+        while True:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            try:
+                next(steps)
+            except StopIteration:
+                break
+            _, peak = tracemalloc.get_traced_memory()
+            allocated += max(0, peak - before)
+    finally:
+        tracemalloc.stop()
+    return cpu_ms, allocated / (1024 * 1024) / mib
+
+
+def load_frames_at(revision: str) -> ModuleType:
+    source = subprocess.run(
+        ["git", "show", f"{revision}:src/streaming/frames.py"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    module = ModuleType(f"frames_{revision}")
+    # dataclasses look the defining module up in sys.modules.
+    sys.modules[module.__name__] = module
+    exec(compile(source, f"{revision}:frames.py", "exec"), module.__dict__)
+    return module
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mib", type=int, default=32, help="Audio to push through (MiB)")
+    parser.add_argument("--subscribers", type=int, default=10)
+    parser.add_argument("--unit-size", type=int, default=4096)
+    parser.add_argument("--baseline", help="git revision to compare frames.py against")
+    args = parser.parse_args()
+
+    variants: list[tuple[str, ModuleType]] = [("current", current_frames)]
+    if args.baseline:
+        variants.insert(0, (args.baseline, load_frames_at(args.baseline)))
+
+    data = synthetic_mp3(args.mib * 1024 * 1024)
+    print(f"{args.mib} MiB, {args.subscribers} subscribers, {args.unit_size}-byte units")
+    print(f"{'source chunk':>12}  {'frames.py':<10}  {'CPU ms/MiB':>10}  {'alloc MiB/MiB':>13}")
+    for chunk_size in (65536, 262144):
+        for name, frames in variants:
+            cpu_ms, alloc = measure(frames, data, chunk_size, args.unit_size, args.subscribers)
+            print(f"{chunk_size:>12}  {name:<10}  {cpu_ms:>10.1f}  {alloc:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Benchmark of the /stream endpoint: CPU per 1,000 listeners.
+
+Connects a number of in-process listeners to one broadcast output, publishes synthetic
+audio into it as fast as they take it, and reports the CPU time spent per second of
+audio per 1,000 listeners. Compares the raw ASGI endpoint (src.api.stream) with the
+previous route, a StreamingResponse over the listener's async generator. The server
+itself (socket writes, HTTP framing) is not included: send() only counts bytes.
+
+    poetry run python -m scripts.bench_stream [--listeners 1000] [--seconds 30]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+
+from starlette.responses import StreamingResponse
+from starlette.types import Message, Receive, Scope, Send
+
+from src.api.stream import StreamEndpoint
+from src.streaming.broadcast import BroadcastOutput, BroadcastReader, listen
+
+_MIME_TYPE = "audio/mpeg"
+_HEADERS = {
+    "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+    "Pragma": "no-cache",
+}
+
+App = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+
+def streaming_response_app(open_listener: Callable[[], BroadcastReader]) -> App:
+    # What the /stream route did before the raw endpoint.
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        response = StreamingResponse(
+            listen(open_listener()), media_type=_MIME_TYPE, headers=_HEADERS
+        )
+        await response(scope, receive, send)
+
+    return app
+
+
+def raw_endpoint_app(open_listener: Callable[[], BroadcastReader]) -> App:
+    return StreamEndpoint(lambda scope: (open_listener(), _MIME_TYPE))
+
+
+async def measure(
+    make_app: Callable[[Callable[[], BroadcastReader]], App],
+    listeners: int,
+    seconds: float,
+    unit_size: int,
+    kbps: int,
+) -> float:
+    """Returns CPU ms per second of audio per 1,000 listeners."""
+
+    output = BroadcastOutput(capacity=256)
+    app = make_app(lambda: BroadcastReader(output, burst_seconds=0.0))
+    # Same as uvicorn: listen_for_disconnect runs next to every StreamingResponse.
+    scope: Scope = {
+        "type": "http",
+        "method": "GET",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "path_params": {},
+        "query_string": b"",
+        "headers": [],
+    }
+    stop = asyncio.Event()
+    writes = 0
+
+    async def receive() -> Message:
+        await stop.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        nonlocal writes
+        if message["type"] == "http.response.body" and message.get("more_body"):
+            writes += 1
+
+    tasks = [asyncio.create_task(app(scope, receive, send)) for _ in range(listeners)]
+    await asyncio.sleep(0.1)
+
+    unit = b"\xff\xfb\x90\x00" + bytes(unit_size - 4)
+    duration = unit_size / (kbps * 125)
+    units = max(1, int(seconds / duration))
+    started = time.process_time()
+    for i in range(units):
+        output.publish(unit, duration)
+        # Every listener writes each unit before the next one is published.
+        while writes < (i + 1) * listeners:
+            await asyncio.sleep(0)
+    cpu_s = time.process_time() - started
+
+    output.close()
+    stop.set()
+    await asyncio.gather(*tasks)
+    return cpu_s * 1000.0 / (units * duration) / (listeners / 1000.0)
+
+
+async def run(args: argparse.Namespace) -> None:
+    print(
+        f"{args.listeners} listeners, {args.seconds:g} s of {args.kbps} kbps audio, "
+        f"{args.unit_size}-byte writes"
+    )
+    print(f"{'endpoint':<20}  {'CPU ms per audio s per 1k listeners':>36}")
+    for name, make_app in (
+        ("StreamingResponse", streaming_response_app),
+        ("raw ASGI", raw_endpoint_app),
+    ):
+        cpu_ms = await measure(make_app, args.listeners, args.seconds, args.unit_size, args.kbps)
+        print(f"{name:<20}  {cpu_ms:>36.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listeners", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=30.0, help="Audio to push through")
+    parser.add_argument("--unit-size", type=int, default=4096, help="Bytes per write")
+    parser.add_argument("--kbps", type=int, default=192)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+
+
+def add_page_routes(app: FastAPI) -> None:
+    """The player page, favicon and static files (also served by split-mode workers)."""
+
+    static_dir = Path(__file__).resolve().parent.parent / "static"
+
+    index_path = static_dir / "index.html"
+    favicon_svg_path = static_dir / "favicon.svg"
+
+    @app.get("/", include_in_schema=False)
+    async def index() -> FileResponse:
+        headers = {
+            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+            "Pragma": "no-cache",
+        }
+        return FileResponse(path=str(index_path), media_type="text/html", headers=headers)
+
+    @app.get("/favicon.ico", include_in_schema=False)
+    async def favicon_ico() -> FileResponse:
+        # Часть браузеров всегда запрашивает /favicon.ico.
+        # Отдаём наш SVG (современные браузеры понимают), чтобы была иконка во вкладке.
+        headers = {
+            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+            "Pragma": "no-cache",
+        }
+        return FileResponse(path=str(favicon_svg_path), media_type="image/svg+xml", headers=headers)
+
+    app.mount("/static", StaticFiles(directory=str(static_dir), html=False), name="static")
@@ -1,31 +1,33 @@
 from __future__ import annotations
 
+import hmac
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from zoneinfo import ZoneInfo
 
-from fastapi import APIRouter, Query, Request
+from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
-from starlette.responses import StreamingResponse
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Scope
 
+from src.api.stream import StreamEndpoint, query_param
 from src.models.now_playing import NowPlaying
+from src.streaming.broadcast import BroadcastReader
+from src.streaming.hls import PLAYLIST_MIME_TYPE
+from src.streaming.relay import RELAY_MIME_TYPE
+from src.streaming.streamer import PREVIEW_MAX_TRACKS, Streamer
 
 router = APIRouter()
 
+_MOUNT_QUERY = Query(default=None, description="Station (mount); the default one if omitted")
 
-def _build_tz(name: str):
-    if not name or name.upper() in {"UTC", "Z"}:
-        return timezone.utc
-    # Fixed offsets like +03:00 / -0500 / +0300
-    import re
 
-    m = re.match(r"^([+-])(\d{2}):?(\d{2})$", name.strip())
-    if m:
-        sign = 1 if m.group(1) == "+" else -1
-        hh = int(m.group(2))
-        mm = int(m.group(3))
-        return timezone(sign * timedelta(hours=hh, minutes=mm))
-    return ZoneInfo(name)
+def _streamer(request: Request, mount: str | None) -> Streamer:
+    if not mount:
+        return request.app.state.streamer
+    streamer = request.app.state.streamers.get(mount)
+    if streamer is None:
+        raise HTTPException(status_code=404, detail=f"Unknown mount: {mount}")
+    return streamer
 
 
 @router.get("/health")
@@ -34,8 +36,8 @@ async def health() -> dict[str, str]:
 
 
 @router.get("/api/now-playing", response_model=NowPlaying)
-async def now_playing(request: Request) -> JSONResponse:
-    streamer = request.app.state.streamer
+async def now_playing(request: Request, mount: str | None = _MOUNT_QUERY) -> JSONResponse:
+    streamer = _streamer(request, mount)
     current = await streamer.now_playing.get()
 
     if current is None:
@@ -44,7 +46,7 @@ async def now_playing(request: Request) -> JSONResponse:
             title="(ещё не началось)",
             source="unknown",
             duration_seconds=None,
-            mime_type=request.app.state.settings.stream_mime_type,
+            mime_type=streamer.mime_type,
         )
 
     pos = streamer.current_position_seconds()
@@ -55,10 +57,13 @@ async def now_playing(request: Request) -> JSONResponse:
 @router.get("/api/master")
 async def master_debug(
     request: Request,
-    count: int = Query(default=10, ge=0, le=200, description="Preview tracks per slot"),
+    count: int = Query(
+        default=10, ge=0, le=PREVIEW_MAX_TRACKS, description="Preview tracks per slot"
+    ),
     queue_count: int = Query(default=5, ge=0, le=50, description="Queue size for current slot"),
+    mount: str | None = _MOUNT_QUERY,
 ) -> JSONResponse:
-    streamer = request.app.state.streamer
+    streamer = _streamer(request, mount)
     settings = request.app.state.settings
 
     current = await streamer.now_playing.get()
@@ -68,7 +73,7 @@ async def master_debug(
             source="unknown",
             duration_seconds=None,
             position_seconds=None,
-            mime_type=settings.stream_mime_type,
+            mime_type=streamer.mime_type,
         )
     else:
         current = current.model_copy(
@@ -82,7 +87,7 @@ async def master_debug(
     return JSONResponse(
         content={
             "now_playing": current.model_dump(),
-            "schedule_timezone": settings.schedule_timezone(),
+            "schedule_timezone": streamer.schedule_timezone_name,
             "assumed_bitrate_kbps": settings.assumed_bitrate_kbps,
             "source_chunk_size": settings.chunk_size,
             "broadcast_chunk_size": settings.broadcast_chunk_size,
@@ -96,23 +101,22 @@ async def master_debug(
 
 
 @router.get("/api/stats")
-async def stats(request: Request) -> JSONResponse:
-    streamer = request.app.state.streamer
+async def stats(request: Request, mount: str | None = _MOUNT_QUERY) -> JSONResponse:
+    streamer = _streamer(request, mount)
     return JSONResponse(content=streamer.diagnostics())
 
 
 @router.get("/api/schedule")
-async def schedule(request: Request) -> JSONResponse:
-    settings = request.app.state.settings
-    streamer = request.app.state.streamer
+async def schedule(request: Request, mount: str | None = _MOUNT_QUERY) -> JSONResponse:
+    streamer = _streamer(request, mount)
 
-    schedule_tz_name = settings.schedule_timezone()
-    schedule_tz = _build_tz(schedule_tz_name)
+    schedule_tz_name = streamer.schedule_timezone_name
+    schedule_tz = streamer.schedule_tz
     now_tz = datetime.now(schedule_tz)
     today = now_tz.date()
 
     slots: list[dict[str, object]] = []
-    for slot in settings.schedule():
+    for slot in streamer.scheduler.slots:
         label = slot.source
         if slot.source == "telegram":
             if slot.key and streamer.telegram_session.enabled():
@@ -144,19 +148,153 @@ async def schedule(request: Request) -> JSONResponse:
             }
         )
 
-    return JSONResponse(content={"timezone": schedule_tz_name, "slots": slots})
+    next_transition = streamer.next_schedule_transition()
+    return JSONResponse(
+        content={
+            "timezone": schedule_tz_name,
+            "slots": slots,
+            "next_transition_at": (
+                next_transition.astimezone(timezone.utc).isoformat()
+                if next_transition is not None
+                else None
+            ),
+        }
+    )
 
 
-@router.get("/stream")
-async def stream(request: Request) -> StreamingResponse:
-    streamer = request.app.state.streamer
+@router.post("/api/admin/reload")
+async def admin_reload(request: Request, mount: str | None = _MOUNT_QUERY) -> JSONResponse:
+    """Queue a schedule reload: the request body (schedule JSON) or, if empty, the schedule file."""
+
     settings = request.app.state.settings
+    streamer = _streamer(request, mount)
+
+    token = (settings.admin_token or "").strip()
+    if not token:
+        raise HTTPException(status_code=404, detail="Admin endpoint is disabled")
+    auth = request.headers.get("authorization", "")
+    if not hmac.compare_digest(auth.encode("utf-8"), f"Bearer {token}".encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+    body = (await request.body()).decode("utf-8").strip()
+    try:
+        result = streamer.reload_schedule(body or None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return JSONResponse(content=result, status_code=202)
+
+
+@router.get("/api/mounts")
+async def mounts(request: Request) -> JSONResponse:
+    streamers = request.app.state.streamers
+    default = request.app.state.streamer
+    return JSONResponse(
+        content={
+            "mounts": [
+                {
+                    "mount": name,
+                    "path": f"/stream/{name}",
+                    "mime_type": streamer.mime_type,
+                    "default": streamer is default,
+                    "listeners": streamer.listener_count(),
+                    "renditions": streamer.renditions(),
+                    "hls": f"/hls/{name}/master.m3u8" if streamer.hls_variants() else None,
+                }
+                for name, streamer in streamers.items()
+            ]
+        }
+    )
+
+
+def _open_stream(scope: Scope) -> tuple[BroadcastReader, str]:
+    # /stream and /stream/<mount>, optionally ?rendition=mp3-64 (see /api/mounts).
+    state = scope["app"].state
+    mount = scope["path_params"].get("mount")
+    streamer: Streamer | None = state.streamers.get(mount) if mount else state.streamer
+    if streamer is None:
+        raise HTTPException(status_code=404, detail=f"Unknown mount: {mount}")
+    rendition = query_param(scope, "rendition")
+    if rendition is not None and rendition not in streamer.renditions():
+        raise HTTPException(status_code=404, detail=f"Unknown rendition: {rendition}")
+    return streamer.open_listener(rendition), streamer.rendition_mime_type(rendition)
+
+
+_stream_endpoint = StreamEndpoint(_open_stream)
+router.add_route("/stream", _stream_endpoint, methods=["GET"], include_in_schema=False)
+router.add_route("/stream/{mount}", _stream_endpoint, methods=["GET"], include_in_schema=False)
 
-    headers = {
-        "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-        "Pragma": "no-cache",
-    }
 
+@router.get("/relay/{mount}")
+async def relay(
+    request: Request,
+    mount: str,
+    epoch: str | None = Query(default=None, description="Epoch from the previous hello"),
+    resume_from: int | None = Query(
+        default=None, alias="from", ge=0, description="Next chunk seq to resume at"
+    ),
+) -> StreamingResponse:
+    """Feed for edge relays (YURETS_RELAY_UPSTREAM): audio plus now-playing updates."""
+
+    streamer = _streamer(request, mount)
     return StreamingResponse(
-        streamer.subscribe(), media_type=settings.stream_mime_type, headers=headers
+        streamer.relay_frames(epoch, resume_from),
+        media_type=RELAY_MIME_TYPE,
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+# Missing (expired or not yet cut) HLS resources must not stick in a CDN cache.
+_HLS_MISSING_HEADERS = {"Cache-Control": "no-store"}
+# Published segments never change; a day outlives the window many times over.
+_HLS_SEGMENT_CACHE = "public, max-age=86400, immutable"
+
+
+def _hls_playlist_cache(target_duration: int) -> str:
+    # Half a target duration: proxies absorb the polling, players still see new segments.
+    return f"public, max-age={max(1, target_duration // 2)}"
+
+
+@router.get("/hls/{mount}/master.m3u8")
+async def hls_master(request: Request, mount: str) -> Response:
+    streamer = _streamer(request, mount)
+    playlist = streamer.hls_master_playlist()
+    if playlist is None:
+        raise HTTPException(
+            status_code=404, detail="No HLS output yet", headers=_HLS_MISSING_HEADERS
+        )
+    target = int(request.app.state.settings.hls_segment_seconds)
+    return Response(
+        playlist,
+        media_type=PLAYLIST_MIME_TYPE,
+        headers={"Cache-Control": _hls_playlist_cache(target)},
+    )
+
+
+@router.get("/hls/{mount}/{variant}/live.m3u8")
+async def hls_playlist(request: Request, mount: str, variant: str) -> Response:
+    segmenter = _streamer(request, mount).hls_segmenter(variant)
+    playlist = segmenter.playlist() if segmenter is not None else None
+    if segmenter is None or playlist is None:
+        raise HTTPException(
+            status_code=404, detail="No such HLS playlist", headers=_HLS_MISSING_HEADERS
+        )
+    return Response(
+        playlist,
+        media_type=PLAYLIST_MIME_TYPE,
+        headers={"Cache-Control": _hls_playlist_cache(segmenter.target_duration)},
+    )
+
+
+@router.get("/hls/{mount}/{variant}/{epoch}/{seq}.mp3")
+async def hls_segment(request: Request, mount: str, variant: str, epoch: str, seq: int) -> Response:
+    segmenter = _streamer(request, mount).hls_segmenter(variant)
+    segment = None
+    if segmenter is not None and segmenter.epoch == epoch:
+        segment = segmenter.segment(seq)
+    if segment is None:
+        raise HTTPException(
+            status_code=404, detail="No such HLS segment", headers=_HLS_MISSING_HEADERS
+        )
+    return Response(
+        segment.data, media_type="audio/mpeg", headers={"Cache-Control": _HLS_SEGMENT_CACHE}
     )
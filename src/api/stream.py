@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+
+from starlette.datastructures import QueryParams
+from starlette.types import Receive, Scope, Send
+
+from src.streaming.broadcast import BroadcastReader, SubscriberLagged
+
+# (reader, MIME type) for a request; raises HTTPException (404, 503) if it can't be served.
+OpenListener = Callable[[Scope], tuple[BroadcastReader, str]]
+
+_NO_CACHE_HEADERS = (
+    (b"cache-control", b"no-store, no-cache, must-revalidate, max-age=0"),
+    (b"pragma", b"no-cache"),
+)
+
+
+class StreamEndpoint:
+    """Raw ASGI app for /stream: listeners are served straight from a `BroadcastReader`.
+
+    Compared to a StreamingResponse over an async generator there is no generator hop
+    per write, no task group and cancel scope per listener, and the response headers are
+    built once per MIME type. A disconnect is noticed by one pending `receive()`, raced
+    against the wait for the next write, so a listener that left while the stream is
+    quiet is closed at once.
+
+    Writes may be memoryviews of ring slots (see `BroadcastReader.read`). ASGI asks for
+    bytes, but uvicorn, the only server this app runs under, passes the body straight to
+    the transport, which takes any buffer; under another server wrap it in `bytes()`.
+    """
+
+    def __init__(self, open_listener: OpenListener) -> None:
+        self._open_listener = open_listener
+        self._headers: dict[str, list[tuple[bytes, bytes]]] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        reader, mime_type = self._open_listener(scope)
+        disconnected: asyncio.Task[None] | None = None
+        reading: asyncio.Future[bytes | memoryview | None] | None = None
+        try:
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": self._response_headers(mime_type),
+                }
+            )
+            if scope["method"] == "HEAD":
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+            disconnected = asyncio.create_task(_wait_disconnect(receive))
+            while not disconnected.done():
+                reading = asyncio.ensure_future(reader.read())
+                await asyncio.wait((reading, disconnected), return_when=asyncio.FIRST_COMPLETED)
+                if not reading.done():
+                    break
+                try:
+                    chunk = reading.result()
+                except SubscriberLagged:
+                    break
+                if chunk is None:
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                reader.sent()
+            if not disconnected.done():
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        except OSError:
+            # ASGI 2.4 servers raise on writes to a closed connection.
+            pass
+        finally:
+            if reading is not None:
+                reading.cancel()
+            if disconnected is not None:
+                disconnected.cancel()
+            reader.close()
+
+    def _response_headers(self, mime_type: str) -> list[tuple[bytes, bytes]]:
+        headers = self._headers.get(mime_type)
+        if headers is None:
+            headers = [(b"content-type", mime_type.encode("latin-1")), *_NO_CACHE_HEADERS]
+            self._headers[mime_type] = headers
+        return headers
+
+
+def query_param(scope: Scope, name: str) -> str | None:
+    return QueryParams(scope["query_string"]).get(name)
+
+
+async def _wait_disconnect(receive: Receive) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
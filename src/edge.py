@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time as time_module
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Scope
+
+from src.api.pages import add_page_routes
+from src.api.stream import StreamEndpoint
+from src.models.now_playing import NowPlaying
+from src.services.now_playing import NowPlayingState
+from src.settings import Settings
+from src.streaming.broadcast import BroadcastReader
+from src.streaming.http_client import HttpError, http_get
+from src.streaming.relay import RELAY_MIME_TYPE, RelayedOutput, UpstreamRelay, relay_frames
+
+logger = logging.getLogger(__name__)
+
+# Upstream API responses (schedule, master preview) are shared by all edge clients.
+_API_CACHE_TTL_S = 5.0
+_DISCOVERY_RETRY_S = 5.0
+_MOUNT_QUERY = Query(default=None, description="Station (mount); the default one if omitted")
+
+
+@dataclass
+class _EdgeMount:
+    relay: RelayedOutput
+    now_playing: NowPlayingState
+    upstream: UpstreamRelay
+
+
+def create_edge_app(settings: Settings) -> FastAPI:
+    """Edge relay: re-broadcasts the stations of an upstream yurets instance.
+
+    One /relay/<mount> connection per station carries the audio and now-playing
+    updates; listeners are served from a local ring (own burst buffer), and other edges
+    can relay from this one in turn. Schedule and preview APIs are fetched from the
+    upstream and cached briefly.
+    """
+
+    upstream = settings.relay_upstream.strip().rstrip("/")
+    mounts: dict[str, _EdgeMount] = {}
+    api_cache: dict[str, tuple[float, Response]] = {}
+
+    async def _mount_names() -> list[str]:
+        names = [m.strip() for m in settings.relay_mounts.split(",") if m.strip()]
+        while not names:
+            try:
+                async with http_get(
+                    f"{upstream}/api/mounts", timeout=settings.relay_timeout_seconds
+                ) as resp:
+                    body = await resp.read()
+                if resp.status != 200:
+                    raise HttpError(f"HTTP {resp.status}")
+                names = [str(m["mount"]) for m in json.loads(body)["mounts"]]
+            except (HttpError, ValueError, KeyError, TypeError) as e:
+                logger.warning("Cannot list upstream mounts at %s: %s", upstream, e)
+                await asyncio.sleep(_DISCOVERY_RETRY_S)
+        return names
+
+    async def _start() -> None:
+        for name in await _mount_names():
+            relay = RelayedOutput(
+                None,
+                capacity=int(settings.subscriber_queue_chunks),
+                burst_seconds=float(settings.burst_on_connect_seconds),
+                skip_lagging=settings.slow_subscriber_policy == "skip",
+                max_lag_seconds=float(settings.slow_subscriber_disconnect_seconds),
+                write_max_bytes=int(settings.subscriber_write_max_bytes),
+                write_latency_seconds=float(settings.subscriber_write_latency_seconds),
+            )
+            now_playing = NowPlayingState()
+            link = UpstreamRelay(
+                f"{upstream}/relay/{name}", relay, now_playing, settings.relay_timeout_seconds
+            )
+            mounts[name] = _EdgeMount(relay=relay, now_playing=now_playing, upstream=link)
+        await asyncio.gather(*(m.upstream.run() for m in mounts.values()))
+
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        task = asyncio.create_task(_start(), name="yurets-edge")
+        try:
+            yield
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            for m in mounts.values():
+                m.relay.output.close()
+
+    app = FastAPI(title="Юрец ФМ", lifespan=lifespan)
+
+    def _mount(name: str | None) -> _EdgeMount:
+        if not mounts:
+            raise HTTPException(status_code=503, detail="Upstream not reached yet")
+        if not name:
+            return next(iter(mounts.values()))
+        m = mounts.get(name)
+        if m is None:
+            raise HTTPException(status_code=404, detail=f"Unknown mount: {name}")
+        return m
+
+    def _open_stream(scope: Scope) -> tuple[BroadcastReader, str]:
+        m = _mount(scope["path_params"].get("mount"))
+        if m.relay.mime_type is None:
+            raise HTTPException(status_code=503, detail="Upstream not connected yet")
+        return m.relay.open_listener(), m.relay.mime_type
+
+    @app.get("/health")
+    async def health() -> dict[str, str]:
+        return {"status": "ok"}
+
+    stream = StreamEndpoint(_open_stream)
+    app.add_route("/stream", stream, methods=["GET"], include_in_schema=False)
+    app.add_route("/stream/{mount}", stream, methods=["GET"], include_in_schema=False)
+
+    @app.get("/relay/{mount}")
+    async def relay(
+        mount: str,
+        epoch: str | None = Query(default=None),
+        resume_from: int | None = Query(default=None, alias="from", ge=0),
+    ) -> StreamingResponse:
+        m = _mount(mount)
+        if m.relay.mime_type is None:
+            raise HTTPException(status_code=503, detail="Upstream not connected yet")
+        frames = relay_frames(
+            m.relay.output,
+            m.now_playing,
+            m.upstream.position_seconds,
+            hello={"mount": mount, "mime_type": m.relay.mime_type},
+            burst_seconds=float(settings.burst_on_connect_seconds),
+            epoch=epoch,
+            resume_from=resume_from,
+        )
+        return StreamingResponse(
+            frames, media_type=RELAY_MIME_TYPE, headers={"Cache-Control": "no-store"}
+        )
+
+    @app.get("/api/now-playing", response_model=NowPlaying)
+    async def now_playing(mount: str | None = _MOUNT_QUERY) -> JSONResponse:
+        m = _mount(mount)
+        current = await m.now_playing.get()
+        if current is None:
+            current = NowPlaying(
+                title="(ещё не началось)",
+                source="unknown",
+                duration_seconds=None,
+                mime_type=m.relay.mime_type or settings.stream_mime_type,
+            )
+        current = current.model_copy(update={"position_seconds": m.upstream.position_seconds()})
+        return JSONResponse(content=current.model_dump())
+
+    @app.get("/api/mounts")
+    async def list_mounts() -> JSONResponse:
+        return JSONResponse(
+            content={
+                "mounts": [
+                    {
+                        "mount": name,
+                        "path": f"/stream/{name}",
+                        "mime_type": m.relay.mime_type,
+                        "default": i == 0,
+                        "listeners": m.relay.listeners,
+                        "renditions": {},
+                        "hls": None,
+                    }
+                    for i, (name, m) in enumerate(mounts.items())
+                ]
+            }
+        )
+
+    @app.get("/api/stats")
+    async def stats(mount: str | None = _MOUNT_QUERY) -> JSONResponse:
+        m = _mount(mount)
+        return JSONResponse(
+            content={
+                "mode": "edge",
+                "mime_type": m.relay.mime_type,
+                "upstream": m.upstream.stats(),
+                "subscribers": m.relay.stats(),
+            }
+        )
+
+    async def _cached_upstream(request: Request) -> Response:
+        key = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+        cached = api_cache.get(key)
+        now = time_module.monotonic()
+        if cached is not None and now - cached[0] < _API_CACHE_TTL_S:
+            return cached[1]
+        try:
+            async with http_get(upstream + key, timeout=settings.relay_timeout_seconds) as resp:
+                body = await resp.read()
+        except HttpError as e:
+            raise HTTPException(status_code=502, detail=f"Upstream unavailable: {e}") from e
+        response = Response(
+            body,
+            status_code=resp.status,
+            media_type=resp.headers.get("content-type", "application/json"),
+        )
+        if resp.status == 200:
+            for stale in [k for k, (at, _) in api_cache.items() if now - at >= _API_CACHE_TTL_S]:
+                del api_cache[stale]
+            api_cache[key] = (now, response)
+        return response
+
+    @app.get("/api/schedule")
+    async def schedule(request: Request) -> Response:
+        return await _cached_upstream(request)
+
+    @app.get("/api/master")
+    async def master_debug(request: Request) -> Response:
+        return await _cached_upstream(request)
+
+    add_page_routes(app)
+    return app
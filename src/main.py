@@ -1,62 +1,77 @@
 from __future__ import annotations
 
+import asyncio
+import signal
 from contextlib import asynccontextmanager
-from pathlib import Path
+from typing import Any
 
 from fastapi import FastAPI
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
 
+from src.api.pages import add_page_routes
 from src.api.routes import router
 from src.settings import Settings
+from src.streaming.shared_ring import SharedFanout
+from src.streaming.sources.pool import SourcePool
 from src.streaming.streamer import Streamer
 
 
 @asynccontextmanager
 async def lifespan(fastapi_app: FastAPI):
-    streamer: Streamer = fastapi_app.state.streamer
-
-    await streamer.startup()
+    streamers: dict[str, Streamer] = fastapi_app.state.streamers
+    pool: SourcePool = fastapi_app.state.source_pool
+
+    for streamer in streamers.values():
+        await streamer.startup()
+    # SIGHUP re-reads schedule files (applied at the next track, /stream keeps going).
+    loop = asyncio.get_running_loop()
+    sighup = getattr(signal, "SIGHUP", None)
+    if sighup is not None:
+        try:
+            loop.add_signal_handler(sighup, _reload_schedule_files, streamers)
+        except (NotImplementedError, RuntimeError):
+            sighup = None
     try:
         yield
     finally:
-        await streamer.shutdown()
+        if sighup is not None:
+            loop.remove_signal_handler(sighup)
+        for streamer in streamers.values():
+            await streamer.shutdown()
+        await pool.close()
+
 
+def _reload_schedule_files(streamers: dict[str, Streamer]) -> None:
+    for streamer in streamers.values():
+        if streamer.has_schedule_file:
+            streamer.request_reload()
 
-def create_app() -> FastAPI:
-    settings = Settings()
+
+def create_app(settings: Settings | None = None, fanout: SharedFanout | None = None) -> FastAPI:
+    settings = settings or Settings()
     app = FastAPI(title="Юрец ФМ", lifespan=lifespan)
 
+    # One station per mount; they share sources, indexes, caches and the Telegram session.
+    pool = SourcePool(settings)
+    streamers = {
+        name: Streamer(settings=mount_settings, pool=pool, mount=name, fanout=fanout)
+        for name, mount_settings in settings.mounts()
+    }
     app.state.settings = settings
-    app.state.streamer = Streamer(settings=settings)
+    app.state.source_pool = pool
+    app.state.streamers = streamers
+    # The first mount is the default station (/stream and the API without ?mount=).
+    app.state.streamer = next(iter(streamers.values()))
 
     app.include_router(router)
-
-    static_dir = Path(__file__).resolve().parent / "static"
-
-    index_path = static_dir / "index.html"
-    favicon_svg_path = static_dir / "favicon.svg"
-
-    @app.get("/", include_in_schema=False)
-    async def index() -> FileResponse:
-        headers = {
-            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-            "Pragma": "no-cache",
-        }
-        return FileResponse(path=str(index_path), media_type="text/html", headers=headers)
-
-    @app.get("/favicon.ico", include_in_schema=False)
-    async def favicon_ico() -> FileResponse:
-        # Часть браузеров всегда запрашивает /favicon.ico.
-        # Отдаём наш SVG (современные браузеры понимают), чтобы была иконка во вкладке.
-        headers = {
-            "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-            "Pragma": "no-cache",
-        }
-        return FileResponse(path=str(favicon_svg_path), media_type="image/svg+xml", headers=headers)
-
-    app.mount("/static", StaticFiles(directory=str(static_dir), html=False), name="static")
+    add_page_routes(app)
     return app
 
 
-application = create_app()
+def __getattr__(name: str) -> Any:
+    # `uvicorn src.main:application`. Built on first access, so that importing
+    # `create_app` (split mode, see src.serve) doesn't build a second app.
+    global application
+    if name == "application":
+        application = create_app()
+        return application
+    raise AttributeError(name)
@@ -0,0 +1,121 @@
+"""Run the radio: `python -m src.serve`.
+
+With YURETS_RELAY_UPSTREAM set this is an edge relay (see src.edge). Otherwise, with
+YURETS_WORKERS <= 1 it is the plain single-process server; with more, split mode:
+this process is the master (schedule, sources, pacing, API, served on a Unix socket) and
+publishes every output into shared memory; N worker processes bind host:port with
+SO_REUSEPORT, serve /stream from the shared rings and proxy everything else to it. All
+listeners hear the same audio and every track is downloaded once.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import tempfile
+from multiprocessing.process import BaseProcess
+
+import uvicorn
+
+from src.edge import create_edge_app
+from src.main import create_app
+from src.settings import Settings
+from src.streaming.shared_ring import SharedFanout
+from src.worker import run_worker
+
+logger = logging.getLogger(__name__)
+
+# Time workers get to end their streams (closed rings) before being terminated.
+_WORKER_STOP_TIMEOUT_S = 5.0
+# Listener and relay connections never finish on their own: uvicorn would wait forever.
+_GRACEFUL_SHUTDOWN_S = 3
+
+
+def main() -> None:
+    settings = Settings()
+    if settings.relay_upstream.strip():
+        if settings.workers > 1:
+            logger.warning("Edge relay mode runs a single process, YURETS_WORKERS ignored")
+        uvicorn.run(
+            create_edge_app(settings),
+            host=settings.host,
+            port=settings.port,
+            timeout_graceful_shutdown=_GRACEFUL_SHUTDOWN_S,
+        )
+        return
+    if settings.workers <= 1:
+        uvicorn.run(
+            "src.main:application",
+            host=settings.host,
+            port=settings.port,
+            timeout_graceful_shutdown=_GRACEFUL_SHUTDOWN_S,
+        )
+        return
+    # uvicorn re-raises the signal that stopped it once it is done; without a handler
+    # SIGTERM would kill the master before it stops the workers and frees shared memory.
+    signal.signal(signal.SIGTERM, lambda signum, frame: None)
+    asyncio.run(_run_split(settings))
+
+
+async def _run_split(settings: Settings) -> None:
+    workers = int(settings.workers)
+    prefix = f"yfm{os.getpid()}"
+    master_socket = settings.master_socket.strip() or os.path.join(
+        tempfile.gettempdir(), f"{prefix}.sock"
+    )
+    fanout = SharedFanout.create(prefix, settings, workers)
+    context = multiprocessing.get_context("spawn")
+    procs: list[BaseProcess] = []
+
+    def _spawn(index: int) -> BaseProcess:
+        proc = context.Process(
+            target=run_worker,
+            args=(prefix, workers, index, master_socket, _GRACEFUL_SHUTDOWN_S),
+            name=f"yurets-worker-{index}",
+            daemon=True,
+        )
+        proc.start()
+        return proc
+
+    try:
+        server = uvicorn.Server(
+            uvicorn.Config(
+                create_app(settings, fanout),
+                uds=master_socket,
+                log_level="info",
+                timeout_graceful_shutdown=_GRACEFUL_SHUTDOWN_S,
+            )
+        )
+        serve_task = asyncio.create_task(server.serve())
+        while not server.started and not serve_task.done():
+            await asyncio.sleep(0.05)
+        if not serve_task.done():
+            procs = [_spawn(i) for i in range(workers)]
+        while not serve_task.done():
+            await asyncio.wait({serve_task}, timeout=1.0)
+            if server.should_exit:
+                continue
+            for i, proc in enumerate(procs):
+                if not proc.is_alive():
+                    logger.warning("Worker %s exited with code %s, restarting", i, proc.exitcode)
+                    procs[i] = _spawn(i)
+        await serve_task
+    finally:
+        # Closed rings end every worker's streams, so the workers can stop gracefully.
+        fanout.close()
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.join(_WORKER_STOP_TIMEOUT_S)
+            if proc.is_alive():
+                proc.kill()
+        fanout.release()
+        if os.path.exists(master_socket):
+            os.unlink(master_socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,10 +9,13 @@ class NowPlayingState:
     def __init__(self) -> None:
         self._lock = asyncio.Lock()
         self._current: NowPlaying | None = None
+        # Bumped on every change (edge relays forward the new value).
+        self.version = 0
 
     async def set(self, value: NowPlaying) -> None:
         async with self._lock:
             self._current = value
+            self.version += 1
 
     async def get(self) -> NowPlaying | None:
         async with self._lock:
@@ -1,29 +1,92 @@
 from __future__ import annotations
 
-from datetime import datetime, time
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
 
 from src.settings import ScheduleSlot
 
 
 class Scheduler:
+    """Schedule compiled into sorted day segments.
+
+    Slot boundaries split the day into segments; each segment is owned by the first slot
+    (in schedule order) that covers it, or by the first slot if none does. Adjacent
+    segments with the same owner are merged, so a lookup is one binary search and every
+    remaining segment start is a real transition.
+    """
+
     def __init__(self, slots: list[ScheduleSlot]) -> None:
-        self._slots = slots
+        self._slots = list(slots)
+        # Segment start times (the first is always 00:00) and owning slot indexes.
+        self._starts: list[time] = []
+        self._owners: list[int] = []
+        # Times of day at which the active slot changes, sorted.
+        self._transitions: list[time] = []
+        self._compile()
+
+    @property
+    def slots(self) -> list[ScheduleSlot]:
+        return list(self._slots)
 
     def choose_slot(self, now: datetime | None = None) -> ScheduleSlot | None:
+        if not self._slots:
+            return None
         now = now or datetime.now()
-        current = now.time()
-
-        for slot in self._slots:
-            if _time_in_slot(current, slot.start, slot.end):
-                return slot
-
-        # fallback: first slot (predictable)
-        return self._slots[0] if self._slots else None
+        i = bisect_right(self._starts, now.time()) - 1
+        return self._slots[self._owners[i]]
 
     def choose_source(self, now: datetime | None = None) -> str:
         slot = self.choose_slot(now=now)
         return slot.source if slot is not None else "local"
 
+    def next_transition(self, now: datetime | None = None) -> datetime | None:
+        """When the active slot changes next (same tzinfo as `now`), or None if never."""
+
+        if not self._transitions:
+            return None
+        now = now or datetime.now()
+        i = bisect_right(self._transitions, now.time())
+        day = now.date()
+        if i == len(self._transitions):
+            # Past the last transition of the day: the first one tomorrow.
+            i = 0
+            day += timedelta(days=1)
+        return datetime.combine(day, self._transitions[i], tzinfo=now.tzinfo)
+
+    def _compile(self) -> None:
+        if not self._slots:
+            return
+        points = {time(0)}
+        for slot in self._slots:
+            points.add(_naive(slot.start))
+            points.add(_naive(slot.end))
+        for point in sorted(points):
+            owner = next(
+                (
+                    i
+                    for i, slot in enumerate(self._slots)
+                    if _time_in_slot(point, _naive(slot.start), _naive(slot.end))
+                ),
+                # fallback: first slot (predictable)
+                0,
+            )
+            if self._owners and self._owners[-1] == owner:
+                continue
+            self._starts.append(point)
+            self._owners.append(owner)
+
+        if len(self._owners) > 1:
+            self._transitions = [
+                start
+                for i, start in enumerate(self._starts)
+                # i == 0 compares midnight with the last segment of the day (wrap-around).
+                if self._owners[i] != self._owners[i - 1]
+            ]
+
+
+def _naive(t: time) -> time:
+    return t.replace(tzinfo=None)
+
 
 def _time_in_slot(current: time, start: time, end: time) -> bool:
     if start == end:
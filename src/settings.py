@@ -1,13 +1,17 @@
 from __future__ import annotations
 
 import json
+import re
 from datetime import time
 from typing import Any, Literal, cast
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+_MOUNT_NAME = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
 class ScheduleSlot(BaseModel):
     start: time
     end: time
@@ -20,12 +24,29 @@ class ScheduleConfig(BaseModel):
     slots: list[ScheduleSlot]
 
 
+class MountConfig(BaseModel):
+    # Schedule document (same format as schedule_json); the global one if omitted.
+    schedule: dict[str, Any] | list[Any] | None = None
+    schedule_file: str | None = None
+    stream_mime_type: Literal["audio/mpeg", "audio/ogg"] | None = None
+    renditions: str | None = None
+
+
 class TelegramSettings(BaseModel):
     api_id: int | None = None
     api_hash: str | None = None
     bot_token: str | None = None
     session: str = "/telegram_session/yurets_fm.session"
     fetch_limit: int = 50
+    cache_dir: str = ""
+    cache_max_mb: int = 0
+    download_parallel: int = 1
+    catchup_interval: float = 300.0
+    index_path: str = ""
+    full_history: bool = False
+    backfill_pause: float = 2.0
+    full_refresh_interval: float = 21600.0
+    download_part_size: int = 1048576
 
 
 class Settings(BaseSettings):
@@ -40,14 +61,55 @@ class Settings(BaseSettings):
     # Telegram downloads can be tuned separately via telegram_download_chunk_size.
     chunk_size: int = 65536
 
-    # Chunk size used when broadcasting to HTTP clients.
+    # Target size of a broadcast unit sent to HTTP clients. Units hold whole MP3 frames /
+    # Ogg pages (never split), so the actual size is the largest multiple of frames that
+    # fits, or one frame if a single frame is bigger.
     # Smaller chunks reduce jitter/underruns in browser streaming.
     broadcast_chunk_size: int = 4096
     assumed_bitrate_kbps: int = 192
 
-    # How many chunks to buffer per subscriber before dropping the connection.
-    # Dropping chunks corrupts MP3/OGG streams and causes audible stutter.
+    # Capacity (in broadcast chunks) of the shared broadcast ring. A subscriber that
+    # lags behind by more than this (e.g. a stalled mobile link) is handled by
+    # `slow_subscriber_policy`.
     subscriber_queue_chunks: int = 256
+    # "skip": jump a lagging listener forward to recent audio, dropping whole frames/pages
+    # so the stream stays decodable; disconnect it only if it keeps lagging, without ever
+    # catching up, for `slow_subscriber_disconnect_seconds`. "disconnect": drop it at once
+    # (the player reconnects).
+    slow_subscriber_policy: Literal["skip", "disconnect"] = "skip"
+    slow_subscriber_disconnect_seconds: float = 30.0
+
+    # Everything queued for a listener goes out as one write (one HTTP chunk) per wake-up:
+    # up to `subscriber_write_max_bytes`, waiting up to `subscriber_write_latency_seconds`
+    # for more audio to batch. Listeners that keep up get about that much audio per write
+    # instead of one write per broadcast chunk; lagging ones catch up in big writes.
+    # 0 latency sends what is queued right away.
+    subscriber_write_max_bytes: int = 65536
+    subscriber_write_latency_seconds: float = 0.5
+
+    # Seconds of recent audio sent to a new listener at once (like Icecast burst-on-connect),
+    # so the browser buffer fills immediately instead of at 1x realtime. Limited by what
+    # the broadcast ring holds. 0 disables.
+    burst_on_connect_seconds: float = 4.0
+
+    # Extra lower-bitrate streams, each re-encoded once by a long-lived ffmpeg process and
+    # shared by all its listeners (/stream?rendition=mp3-64). "codec:kbps" comma separated,
+    # codec is mp3 or opus, e.g. "mp3:64,mp3:128,opus:96". Empty disables.
+    renditions: str = ""
+    ffmpeg_path: str = "ffmpeg"
+
+    # HLS alongside /stream (/hls/<mount>/master.m3u8): MPEG output cut into segments of
+    # about `hls_segment_seconds`, the last `hls_window_segments` listed in the live
+    # playlist. Segments live in memory and are immutable, so a CDN can cache them.
+    # Off by default: each segmenter keeps its own copy of the recent audio.
+    hls_enabled: bool = False
+    hls_segment_seconds: float = 4.0
+    hls_window_segments: int = 6
+
+    # Seconds before the end of a track at which the next one is picked and its source
+    # opened, so its first frames are already buffered at the boundary (gapless playback).
+    # Should cover Telegram connection setup.
+    prefetch_lead_seconds: float = 10.0
 
     # How many source-chunks to buffer per track ahead of broadcast.
     # This decouples Telegram download timing from real-time playback.
@@ -57,20 +119,107 @@ class Settings(BaseSettings):
     # Larger values often reduce gaps/stalls from Telegram/CDN.
     telegram_download_chunk_size: int = 262144
 
+    # Parallel Telegram downloads: a track is fetched as ranges of this many bytes, with up
+    # to telegram_download_parallel ranges in flight (adapted to observed throughput).
+    # 1 = one sequential stream. Ranges are rounded to telegram_download_chunk_size.
+    telegram_download_parallel: int = 4
+    telegram_download_part_size: int = 1048576
+
+    # SQLite file with precomputed local track metadata (duration, bitrate, tags).
+    # Survives restarts so a large library is parsed only once. Empty = in-memory only.
+    local_index_path: str = "/data/local_index.sqlite3"
+
+    # How local libraries notice added/removed/renamed files:
+    # "inotify" (Linux, local disks), "poll" (compare per-directory mtimes; use for NAS mounts),
+    # or "auto" (inotify when available, otherwise poll).
+    local_watch_mode: Literal["auto", "inotify", "poll"] = "auto"
+    local_poll_interval_seconds: float = 10.0
+
+    # Threads for blocking local metadata work (stat, mutagen parsing, directory walks).
+    # Bounded so header parsing can never crowd out the event loop pacing the stream.
+    local_metadata_workers: int = 2
+
+    # No-repeat window: a title played within the last N tracks (any slot) is deferred
+    # further down the slot deck. 0 disables the window (the deck itself still plays
+    # every track once per cycle). Scope "day" resets the window at midnight in the
+    # schedule timezone, "rolling" carries it over.
+    no_repeat_window: int = 50
+    no_repeat_window_scope: Literal["day", "rolling"] = "day"
+
     # Schedule format (recommended):
     # {"timezone":"UTC","slots":[{"start":"00:00","end":"00:00","source":"local","key":"/music"}]}
     # Backward-compatible legacy format: a plain list of slots (timezone defaults to UTC).
     schedule_json: str = Field(
         default='{"timezone":"UTC","slots":[{"start":"00:00","end":"00:00","source":"local","key":"/music"}]}'
     )
+    # JSON file with the schedule (same format as schedule_json). When set it takes
+    # precedence, is re-read when its mtime changes (polled every
+    # schedule_file_poll_seconds) and on SIGHUP; the change applies at the next track.
+    schedule_file: str = ""
+    schedule_file_poll_seconds: float = 5.0
+    # Bearer token for POST /api/admin/reload; the endpoint is disabled when empty.
+    admin_token: str | None = None
+
+    # Several stations in one process, each served at /stream/<mount> with its own
+    # schedule, master task and listeners; Telegram session, indexes and caches are shared.
+    # {"rock":{"schedule":{...}},"jazz":{"schedule_file":"/data/jazz.json",
+    #  "stream_mime_type":"audio/ogg"}}
+    # Empty: a single station "main" built from the settings above. The first mount also
+    # serves /stream.
+    mounts_json: str = ""
+
+    # `python -m src.serve`: address and number of HTTP worker processes. With more than
+    # one, a single master process plays the stations and publishes them into shared
+    # memory; workers (SO_REUSEPORT on host:port) serve /stream from it and proxy the
+    # rest of the API to the master over a Unix socket (`master_socket`, a temp file if
+    # empty).
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = 1
+    master_socket: str = ""
+
+    # Edge relay mode (`python -m src.serve`): base URL of another yurets instance
+    # ("http://origin:8000") whose stations are re-broadcast from its /relay/<mount> feed
+    # instead of playing local or Telegram sources. `relay_mounts` (comma separated)
+    # limits which stations; empty relays all the upstream has. The connection is
+    # considered dead after `relay_timeout_seconds` without data.
+    relay_upstream: str = ""
+    relay_mounts: str = ""
+    relay_timeout_seconds: float = 15.0
+
+    # (schedule_json, timezone, slots) of the last parse; see `_parsed_schedule`.
+    _schedule_cache: tuple[str, str, list[ScheduleSlot]] | None = PrivateAttr(default=None)
 
     # Telegram settings (flat env vars with prefix)
     telegram_api_id: int | None = None
     telegram_api_hash: str | None = None
     telegram_bot_token: str | None = None
     telegram_session: str = "/telegram_session/yurets_fm.session"
+    # Page size for channel history requests (newest messages on first sync, back-fill pages).
     telegram_fetch_limit: int = 50
 
+    # SQLite file with every audio document seen per channel (id, size, duration, title,
+    # file reference). Survives restarts, so the history is walked only once.
+    telegram_index_path: str = "/data/telegram_index.sqlite3"
+    # Back-fill the whole channel history in the background (one page every
+    # telegram_backfill_pause_seconds) and rotate over all of it. False = rotate over the
+    # newest telegram_fetch_limit tracks only (the default, as before the index existed).
+    telegram_full_history: bool = False
+    telegram_backfill_pause_seconds: float = 2.0
+
+    # Channel tracks are fetched once, then kept up to date by new/edited/deleted message
+    # events. A cheap catch-up (only messages newer than the newest known one) runs after
+    # a reconnect and every telegram_catchup_interval_seconds; a full re-fetch only every
+    # telegram_full_refresh_seconds, for changes whose events were missed.
+    telegram_catchup_interval_seconds: float = 300.0
+    telegram_full_refresh_seconds: float = 21600.0
+
+    # On-disk cache of downloaded Telegram audio, keyed by document (id + access hash).
+    # Replays are served from disk instead of being downloaded again. Least recently used
+    # files are evicted above the size cap. Empty dir or 0 MB disables the cache.
+    telegram_cache_dir: str = "/data/telegram_cache"
+    telegram_cache_max_mb: int = 2048
+
     def telegram(self) -> TelegramSettings:
         return TelegramSettings(
             api_id=self.telegram_api_id,
@@ -78,22 +227,68 @@ class Settings(BaseSettings):
             bot_token=self.telegram_bot_token,
             session=self.telegram_session,
             fetch_limit=self.telegram_fetch_limit,
+            cache_dir=self.telegram_cache_dir,
+            cache_max_mb=self.telegram_cache_max_mb,
+            download_parallel=self.telegram_download_parallel,
+            download_part_size=self.telegram_download_part_size,
+            catchup_interval=self.telegram_catchup_interval_seconds,
+            full_refresh_interval=self.telegram_full_refresh_seconds,
+            index_path=self.telegram_index_path,
+            full_history=self.telegram_full_history,
+            backfill_pause=self.telegram_backfill_pause_seconds,
         )
 
+    def mounts(self) -> list[tuple[str, Settings]]:
+        """(name, settings) per station, in declaration order."""
+
+        if not self.mounts_json.strip():
+            return [("main", self)]
+        data: Any = json.loads(self.mounts_json)
+        if not isinstance(data, dict) or not data:
+            raise ValueError("mounts_json must be a non-empty JSON object")
+        out: list[tuple[str, Settings]] = []
+        for name, raw in cast(dict[str, Any], data).items():
+            if not _MOUNT_NAME.fullmatch(name):
+                raise ValueError(f"Invalid mount name: {name!r}")
+            cfg = MountConfig.model_validate(raw)
+            update: dict[str, Any] = {}
+            if cfg.schedule is not None:
+                update["schedule_json"] = json.dumps(cfg.schedule)
+                # An inline schedule replaces the global file too, which would win otherwise.
+                update["schedule_file"] = ""
+            if cfg.schedule_file is not None:
+                update["schedule_file"] = cfg.schedule_file
+            if cfg.stream_mime_type is not None:
+                update["stream_mime_type"] = cfg.stream_mime_type
+            if cfg.renditions is not None:
+                update["renditions"] = cfg.renditions
+            out.append((name, self.model_copy(update=update)))
+        return out
+
     def schedule_timezone(self) -> str:
-        data: Any = json.loads(self.schedule_json)
-        if isinstance(data, dict) and "timezone" in data:
-            tz = cast(Any, data).get("timezone")
-            if isinstance(tz, str) and tz.strip():
-                return tz.strip()
-        # Legacy schedule list: default to UTC
-        return "UTC"
+        return self._parsed_schedule()[0]
 
     def schedule(self) -> list[ScheduleSlot]:
-        data: Any = json.loads(self.schedule_json)
-        if isinstance(data, dict):
-            # New format
-            cfg = ScheduleConfig.model_validate(data)
-            return cfg.slots
-        # Legacy format
-        return [ScheduleSlot.model_validate(item) for item in data]
+        return list(self._parsed_schedule()[1])
+
+    def _parsed_schedule(self) -> tuple[str, list[ScheduleSlot]]:
+        # Parsed once; re-parsed only if schedule_json itself was replaced.
+        cached = self._schedule_cache
+        if cached is not None and cached[0] == self.schedule_json:
+            return cached[1], cached[2]
+
+        tz, slots = parse_schedule(self.schedule_json)
+        self._schedule_cache = (self.schedule_json, tz, slots)
+        return tz, slots
+
+
+def parse_schedule(text: str) -> tuple[str, list[ScheduleSlot]]:
+    """Parse a schedule JSON document into (timezone, slots)."""
+
+    data: Any = json.loads(text)
+    if isinstance(data, dict):
+        # New format
+        cfg = ScheduleConfig.model_validate(data)
+        return (cfg.timezone.strip() or "UTC"), cfg.slots
+    # Legacy format: default to UTC
+    return "UTC", [ScheduleSlot.model_validate(item) for item in data]
@@ -0,0 +1,376 @@
+from __future__ import annotations
+
+import asyncio
+import secrets
+import time as time_module
+from collections.abc import AsyncIterator, Callable
+from typing import Protocol
+
+# Audio a reader that fell out of the ring restarts behind the head: enough for the next
+# write to be full, little enough that it doesn't fall out again at once.
+_CATCH_UP_SECONDS = 1.0
+
+
+class SubscriberLagged(Exception):
+    """Raised when a reader's cursor fell behind the oldest chunk kept in the ring."""
+
+
+class BroadcastRing:
+    """Shared, sequence-numbered ring of broadcast chunks.
+
+    The master publishes every chunk exactly once; each subscriber keeps its own
+    cursor (the sequence number of the next chunk it wants). Publishing is O(1)
+    plus a single wake-up of everyone waiting, and chunks are handed out as-is,
+    so no per-listener copies are made.
+
+    A reader whose cursor points before `oldest_seq` has lost data: that is how
+    slow listeners are detected (by lag, not by a full per-listener queue).
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self._capacity = max(1, int(capacity))
+        # Entries are usually memoryviews into source chunks (see frames._ChunkParser).
+        self._slots: list[bytes | memoryview | None] = [None] * self._capacity
+        self._durations: list[float] = [0.0] * self._capacity
+        self._header_flags: list[bool] = [False] * self._capacity
+        self._next_seq = 0
+        self._closed = False
+        self._event = asyncio.Event()
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def head_seq(self) -> int:
+        """Sequence number the next published chunk will get."""
+        return self._next_seq
+
+    @property
+    def oldest_seq(self) -> int:
+        """Sequence number of the oldest chunk still readable."""
+        return max(0, self._next_seq - self._capacity)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def publish(
+        self, chunk: bytes | memoryview, duration: float = 0.0, header: bool = False
+    ) -> int:
+        seq = self._next_seq
+        self._slots[seq % self._capacity] = chunk
+        self._durations[seq % self._capacity] = duration
+        self._header_flags[seq % self._capacity] = header
+        self._next_seq = seq + 1
+        self._wake()
+        return seq
+
+    def get(self, seq: int) -> bytes | memoryview:
+        if seq < self.oldest_seq:
+            raise SubscriberLagged(seq)
+        if seq >= self._next_seq:
+            raise IndexError(seq)
+        chunk = self._slots[seq % self._capacity]
+        assert chunk is not None
+        return chunk
+
+    def entry(self, seq: int) -> tuple[bytes | memoryview, float, bool]:
+        """Chunk `seq` with its duration and codec-header flag (same errors as `get`)."""
+        chunk = self.get(seq)
+        i = seq % self._capacity
+        return chunk, self._durations[i], self._header_flags[i]
+
+    def backlog_start(self, seconds: float, floor: int = 0) -> int:
+        """Oldest sequence such that [seq, head) covers at least `seconds` of audio.
+
+        Never goes below `oldest_seq` or `floor`.
+        """
+
+        seq = self._next_seq
+        lowest = max(self.oldest_seq, floor)
+        covered = 0.0
+        while seq > lowest and covered < seconds:
+            seq -= 1
+            covered += self._durations[seq % self._capacity]
+        return seq
+
+    def span_seconds(self, start: int, end: int) -> float:
+        start = max(start, self.oldest_seq)
+        return sum(self._durations[i % self._capacity] for i in range(start, end))
+
+    def lag(self, cursor: int) -> int:
+        return max(0, self._next_seq - cursor)
+
+    async def wait(self, cursor: int) -> None:
+        """Wait until a chunk with sequence >= `cursor` exists or the ring is closed."""
+        while cursor >= self._next_seq and not self._closed:
+            await self._event.wait()
+
+    def close(self) -> None:
+        self._closed = True
+        self._wake()
+
+    def _wake(self) -> None:
+        # Swap the event instead of clear(): waiters of the old one are released
+        # together, new waiters block on the fresh one.
+        event = self._event
+        self._event = asyncio.Event()
+        event.set()
+
+
+class OutputSink(Protocol):
+    """Something else that gets every chunk published to an output (HLS, shared memory)."""
+
+    def push(self, chunk: bytes | memoryview, duration: float, header: bool) -> None: ...
+
+
+class BroadcastOutput:
+    """A broadcast ring plus the codec setup data late joiners need first.
+
+    Every ring entry starts on a frame/page boundary; for Ogg a decoder also needs the
+    current stream's setup pages before any audio page, so those are kept aside and
+    replayed to new subscribers.
+
+    Attached sinks get every published chunk as well.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.ring = BroadcastRing(capacity)
+        # Identifies this ring's sequence numbering (relay clients resume by seq).
+        self.epoch = secrets.token_hex(8)
+        self.codec_headers = b""
+        self.codec_headers_seq = 0
+        self.sinks: list[OutputSink] = []
+        self._last_was_header = False
+
+    def publish(self, chunk: bytes | memoryview, duration: float, header: bool = False) -> int:
+        if header:
+            if self._last_was_header:
+                self.codec_headers += chunk
+            else:
+                self.codec_headers = bytes(chunk)
+                self.codec_headers_seq = self.ring.head_seq
+        self._last_was_header = header
+        for sink in self.sinks:
+            sink.push(chunk, duration, header)
+        return self.ring.publish(chunk, duration, header)
+
+    def join(self, burst_seconds: float) -> tuple[int, bytes]:
+        """Starting cursor and setup data (possibly empty) for a new subscriber.
+
+        Burst-on-connect: start `burst_seconds` back so the client buffer fills at once.
+        For Ogg the burst must not reach into the previous stream (other setup pages); if
+        it starts right at the current setup pages they come from the ring.
+        """
+
+        codec_headers = self.codec_headers
+        floor = self.codec_headers_seq if codec_headers else 0
+        start = self.ring.backlog_start(float(burst_seconds), floor=floor)
+        if codec_headers and start <= self.codec_headers_seq:
+            codec_headers = b""
+        return start, codec_headers
+
+    def catch_up(self, cursor: int) -> tuple[int, bytes]:
+        """New cursor and setup data for a reader at `cursor` that fell out of the ring.
+
+        It restarts `_CATCH_UP_SECONDS` behind the head, and never more than half the ring
+        back: a burst as long as the ring would put it at the oldest entry, to fall out
+        again with the next publish. Entries start on frame/page boundaries, so only whole
+        frames are dropped and the stream stays decodable; Ogg setup pages are replayed
+        only if a new stream began in the skipped part.
+        """
+
+        ring = self.ring
+        floor = ring.head_seq - ring.capacity // 2
+        codec_headers = self.codec_headers
+        if codec_headers:
+            floor = max(floor, self.codec_headers_seq)
+        start = ring.backlog_start(_CATCH_UP_SECONDS, floor=floor)
+        if self.codec_headers_seq < cursor or start <= self.codec_headers_seq:
+            codec_headers = b""
+        return start, codec_headers
+
+    def close(self) -> None:
+        self.ring.close()
+
+
+class BroadcastReader:
+    """One listener's cursor into a `BroadcastOutput`, with the slow-consumer policy.
+
+    A reader that falls out of the ring (its link stalled longer than the ring holds)
+    either skips forward to recent audio (`skip_lagging`) or gives up at once. Skipping
+    also gives up once the reader has been lagging for `max_lag_seconds` without ever
+    catching up with the head: such a link can't carry the stream.
+
+    Whoever serves the listener calls `sent` after every write and `close` at the end;
+    the owner of the output keeps its accounting in the callbacks.
+    """
+
+    def __init__(
+        self,
+        output: BroadcastOutput,
+        burst_seconds: float,
+        skip_lagging: bool = False,
+        max_lag_seconds: float = 0.0,
+        write_max_bytes: int = 65536,
+        write_latency_seconds: float = 0.0,
+        on_first_audio: Callable[[float], None] | None = None,
+        on_skip: Callable[[BroadcastReader], None] | None = None,
+        on_close: Callable[[BroadcastReader], None] | None = None,
+    ) -> None:
+        self.output = output
+        self.burst_seconds = float(burst_seconds)
+        self.cursor, self._pending = output.join(self.burst_seconds)
+        # Seq the reader joined at: the burst is [start_seq, head at join).
+        self.start_seq = self.cursor
+        self.joined_at = time_module.monotonic()
+        self.skips = 0
+        self.skipped_chunks = 0
+        # Writes handed out by `read` and their total size.
+        self.writes = 0
+        self.write_bytes = 0
+        # Since the first skip not followed by catching up with the head.
+        self.lagging_since: float | None = None
+        # Seconds from joining until the first write with audio went out.
+        self.first_audio_s: float | None = None
+        # Dropped by the slow-consumer policy.
+        self.lagged = False
+        self.closed = False
+        self._skip_lagging = skip_lagging
+        self._max_lag_s = float(max_lag_seconds)
+        self._write_max_bytes = int(write_max_bytes)
+        self._write_latency_s = float(write_latency_seconds)
+        self._on_first_audio = on_first_audio
+        self._on_skip = on_skip
+        self._on_close = on_close
+
+    def lag(self) -> int:
+        return self.output.ring.lag(self.cursor)
+
+    async def next(self) -> bytes | memoryview | None:
+        """Next chunk for this listener (setup pages first); None once the output closed.
+
+        Raises SubscriberLagged when the policy gives up on the reader.
+        """
+
+        entry = await self._next()
+        return entry[0] if entry is not None else None
+
+    async def read(self) -> bytes | memoryview | None:
+        """Everything queued for this listener as one write; None once the output closed.
+
+        Waits for the first chunk, then keeps collecting until `write_latency_seconds` of
+        audio is pending, that much time has passed or `write_max_bytes` would be
+        exceeded. So a listener behind the head (burst, recovering link) gets up to
+        `write_max_bytes` at once and one that keeps up about `write_latency_seconds` of
+        audio per write, instead of one write per broadcast chunk. A single chunk is
+        passed on without a copy.
+
+        Raises SubscriberLagged like `next`.
+        """
+
+        entry = await self._next()
+        if entry is None:
+            return None
+        first, covered = entry
+        max_bytes = self._write_max_bytes
+        latency_seconds = self._write_latency_s
+        parts = [first]
+        size = len(first)
+        ring = self.output.ring
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + latency_seconds
+        while size < max_bytes and not self._pending:
+            if self.cursor >= ring.head_seq:
+                remaining = deadline - loop.time()
+                if covered >= latency_seconds or remaining <= 0 or ring.closed:
+                    break
+                try:
+                    await asyncio.wait_for(ring.wait(self.cursor), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                continue
+            try:
+                chunk, duration, _ = ring.entry(self.cursor)
+            except SubscriberLagged:
+                # The next read applies the slow-consumer policy.
+                break
+            if size + len(chunk) > max_bytes:
+                break
+            parts.append(chunk)
+            size += len(chunk)
+            covered += duration
+            self.cursor += 1
+        self.writes += 1
+        self.write_bytes += size
+        return first if len(parts) == 1 else b"".join(parts)
+
+    def sent(self) -> None:
+        """Note that a write went out (the first one with audio gives `first_audio_s`)."""
+
+        if self.first_audio_s is None and self.cursor > self.start_seq:
+            self.first_audio_s = time_module.monotonic() - self.joined_at
+            if self._on_first_audio is not None:
+                self._on_first_audio(self.first_audio_s)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        if self._on_close is not None:
+            self._on_close(self)
+
+    async def _next(self) -> tuple[bytes | memoryview, float] | None:
+        ring = self.output.ring
+        while True:
+            if self._pending:
+                pending, self._pending = self._pending, b""
+                return pending, 0.0
+            if self.cursor >= ring.head_seq:
+                if ring.closed:
+                    return None
+                self.lagging_since = None
+                await ring.wait(self.cursor)
+                continue
+            try:
+                chunk, duration, _ = ring.entry(self.cursor)
+            except SubscriberLagged:
+                self._catch_up()
+                continue
+            self.cursor += 1
+            return chunk, duration
+
+    def _catch_up(self) -> None:
+        now = time_module.monotonic()
+        if not self._skip_lagging or (
+            self.lagging_since is not None and now - self.lagging_since >= self._max_lag_s
+        ):
+            self.lagged = True
+            raise SubscriberLagged(self.cursor)
+        if self.lagging_since is None:
+            self.lagging_since = now
+        start, self._pending = self.output.catch_up(self.cursor)
+        self.skips += 1
+        self.skipped_chunks += start - self.cursor
+        self.cursor = start
+        if self._on_skip is not None:
+            self._on_skip(self)
+
+
+async def listen(reader: BroadcastReader) -> AsyncIterator[bytes | memoryview]:
+    """A reader as a response body iterator; closes it when the iteration ends."""
+
+    try:
+        while True:
+            try:
+                chunk = await reader.read()
+            except SubscriberLagged:
+                return
+            if chunk is None:
+                return
+            yield chunk
+            # Resumed after the write went out.
+            reader.sent()
+    finally:
+        reader.close()
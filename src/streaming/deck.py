@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import hashlib
+import random
+from collections import deque
+from collections.abc import Callable
+
+from src.streaming.sources.base import TrackCatalog
+
+
+class TrackDeck:
+    """Deterministic shuffled deck of track keys for one slot and day.
+
+    Cycle 0 is shuffled with `random.Random(seed)`, later cycles with a seed derived
+    from (seed, cycle), so the order only depends on the day, the slot and the library,
+    never on how often the deck was peeked. Every key appears once per cycle, so a
+    no-repeat pick doesn't redraw with replacement: it takes the next card, and only
+    the cards it passes over (recently played, or gone from the library) cost extra,
+    O(defer_by) each to move them back.
+
+    Library changes are merged in place: new keys are inserted at a position derived
+    from their hash (O(n) per added key), removed keys are skipped when they come up.
+    """
+
+    def __init__(self, seed: int) -> None:
+        self._seed = seed
+        self._version: int | None = None
+        self._known: set[str] = set()
+        self._sorted_keys: list[str] = []
+        self._cards: deque[str] = deque()
+        self._next_cycle = 0
+
+    def sync(self, catalog: TrackCatalog) -> None:
+        if catalog.version == self._version:
+            return
+        keys = list(catalog.keys)
+        if self._version is None:
+            self._known = set(keys)
+            self._sorted_keys = keys
+            self._cards.clear()
+            self._next_cycle = 0
+            self._deal()
+        else:
+            added = [k for k in keys if k not in self._known]
+            self._known = set(keys)
+            self._sorted_keys = keys
+            for key in added:
+                pos = _stable_int(str(self._seed), key) % (len(self._cards) + 1)
+                self._cards.insert(pos, key)
+        self._version = catalog.version
+
+    def draw(self, skip: Callable[[str], bool], defer_by: int) -> str | None:
+        """Take the next card.
+
+        Cards for which `skip(key)` is true (e.g. recently played titles) are pushed
+        `defer_by` positions back instead of being dropped. If every card is skipped,
+        the first skipped one is returned anyway (small libraries).
+        """
+
+        held: str | None = None
+        for _ in range(len(self._known)):
+            key = self._pop()
+            if key is None:
+                break
+            if not skip(key):
+                if held is not None:
+                    self._defer(held, defer_by)
+                return key
+            if held is None:
+                held = key
+            else:
+                self._defer(key, defer_by)
+        return held
+
+    def peek(self, count: int, skip: Callable[[str], bool]) -> list[str]:
+        """Read ahead without consuming. Skipped and duplicate keys are left out.
+
+        Reads from a copy: dealing ahead into this deck would move where deferred and
+        new cards land, so previews would change the running order.
+        """
+
+        out: list[str] = []
+        if count <= 0 or not self._known:
+            return out
+        scratch = self.copy()
+        seen: set[str] = set()
+        # Bounded: one extra cycle past the point where every key has been seen.
+        while len(out) < count and len(seen) < len(self._known):
+            key = scratch._pop()
+            if key is None:
+                break
+            if key in seen:
+                continue
+            seen.add(key)
+            if skip(key):
+                continue
+            out.append(key)
+        return out
+
+    def copy(self) -> TrackDeck:
+        """Independent copy in the same state, e.g. to simulate draws for a preview."""
+
+        other = TrackDeck(self._seed)
+        other._version = self._version
+        # Both are replaced on sync, never changed in place, so they can be shared.
+        other._known = self._known
+        other._sorted_keys = self._sorted_keys
+        other._cards = deque(self._cards)
+        other._next_cycle = self._next_cycle
+        return other
+
+    def _defer(self, key: str, defer_by: int) -> None:
+        self._cards.insert(min(len(self._cards), max(1, defer_by)), key)
+
+    def _pop(self) -> str | None:
+        while True:
+            if not self._cards:
+                self._deal()
+                if not self._cards:
+                    return None
+            key = self._cards.popleft()
+            if key in self._known:
+                return key
+
+    def _deal(self) -> None:
+        cycle = self._next_cycle
+        self._next_cycle += 1
+        rng = random.Random(self._seed if cycle == 0 else _stable_int(str(self._seed), str(cycle)))
+        cards = list(self._sorted_keys)
+        rng.shuffle(cards)
+        self._cards.extend(cards)
+
+
+def _stable_int(*parts: str) -> int:
+    h = hashlib.sha256("\0".join(parts).encode("utf-8")).digest()
+    return int.from_bytes(h[:8], "big", signed=False)
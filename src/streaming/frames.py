@@ -0,0 +1,426 @@
+from __future__ import annotations
+
+import struct
+from collections import deque
+from dataclasses import dataclass
+from typing import Protocol
+
+# MPEG audio bitrate tables (kbps) indexed by [version_is_v1][layer][bitrate_index].
+_MPEG_BITRATES: dict[tuple[bool, int], tuple[int, ...]] = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Sample rates indexed by version bits (0=MPEG2.5, 2=MPEG2, 3=MPEG1).
+_MPEG_SAMPLE_RATES: dict[int, tuple[int, int, int]] = {
+    0: (11025, 12000, 8000),
+    2: (22050, 24000, 16000),
+    3: (44100, 48000, 32000),
+}
+
+_OGG_HEADER = struct.Struct("<4sBBqIIIB")
+_OGG_NO_GRANULE = -1
+
+
+@dataclass(frozen=True)
+class AudioFrame:
+    """One decodable unit: an MPEG audio frame or an Ogg page.
+
+    `duration` is the presentation time in seconds, or None if it could not be
+    determined (Ogg pages of an unsupported codec).
+    `header` marks codec setup data (Ogg identification/comment pages) that a decoder
+    needs before any audio.
+    When `source` is set, `data` is a view of `source[offset:offset + len(data)]`, which
+    lets the chunker merge adjacent frames without copying.
+    """
+
+    data: bytes | memoryview
+    duration: float | None
+    header: bool = False
+    source: bytes | None = None
+    offset: int = 0
+
+
+class FrameParser(Protocol):
+    def feed(self, data: bytes) -> list[AudioFrame]: ...
+
+    def flush(self) -> list[AudioFrame]: ...
+
+
+def frame_parser_for(mime_type: str) -> FrameParser:
+    if mime_type == "audio/ogg":
+        return OggPageParser()
+    return MpegFrameParser()
+
+
+class _ChunkParser:
+    """Zero-copy framing over source chunks.
+
+    Frames inside a chunk are memoryview slices of that chunk, which is shared by every
+    frame, broadcast unit and ring entry cut from it. Only a frame that straddles two
+    chunks is assembled in the carry buffer, from at most `_bridge` bytes of the next
+    chunk, so the cost stays linear in the chunk size.
+    """
+
+    # Longest frame/page plus look-ahead the parser may need to decide on it.
+    _bridge = 8192
+
+    def __init__(self) -> None:
+        self._carry = bytearray()
+        # Rest of a skipped region (e.g. a long ID3 tag) continuing into the next chunk.
+        self._skip_pending = 0
+        self.skipped_bytes = 0
+
+    def feed(self, data: bytes) -> list[AudioFrame]:
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        out: list[AudioFrame] = []
+        pos = 0
+        if self._skip_pending:
+            pos = min(self._skip_pending, len(data))
+            self._skip_pending -= pos
+            self.skipped_bytes += pos
+            if self._skip_pending:
+                return out
+
+        carry = self._carry
+        if carry:
+            old = len(carry)
+            carry += data[pos : pos + self._bridge]
+            used = self._parse(carry, 0, out, shared=False, final=False)
+            if used >= old:
+                # Past the boundary: continue in `data` itself, without copying.
+                pos += used - old
+                carry.clear()
+                if self._skip_pending:
+                    return self._skip_into(data, pos, out)
+            else:
+                # Still inside carried bytes (the frame is longer than the bridge).
+                carry += data[pos + self._bridge :]
+                del carry[:used]
+                del carry[: self._parse(carry, 0, out, shared=False, final=False)]
+                return out
+
+        end = self._parse(data, pos, out, shared=True, final=False)
+        carry += memoryview(data)[end:]
+        return out
+
+    def flush(self) -> list[AudioFrame]:
+        out: list[AudioFrame] = []
+        carry = self._carry
+        used = self._parse(carry, 0, out, shared=False, final=True)
+        self.skipped_bytes += len(carry) - used
+        carry.clear()
+        self._skip_pending = 0
+        return out
+
+    def _skip_into(self, data: bytes, pos: int, out: list[AudioFrame]) -> list[AudioFrame]:
+        # A skip that started in the carry continues in `data`.
+        n = min(self._skip_pending, len(data) - pos)
+        self._skip_pending -= n
+        self.skipped_bytes += n
+        pos += n
+        if not self._skip_pending:
+            end = self._parse(data, pos, out, shared=True, final=False)
+            self._carry += memoryview(data)[end:]
+        return out
+
+    def _skip_beyond(self, available: int, size: int) -> int:
+        """Skip `size` bytes of which only `available` are in the buffer; returns `available`."""
+
+        self.skipped_bytes += available
+        self._skip_pending = size - available
+        return available
+
+    def _parse(
+        self, buf: bytes | bytearray, pos: int, out: list[AudioFrame], shared: bool, final: bool
+    ) -> int:
+        """Append complete frames from buf[pos:] to `out`; returns the end of consumed data."""
+        raise NotImplementedError
+
+    @staticmethod
+    def _frame(
+        buf: bytes | bytearray,
+        pos: int,
+        length: int,
+        shared: bool,
+        duration: float | None,
+        header: bool = False,
+    ) -> AudioFrame:
+        if shared:
+            assert isinstance(buf, bytes)
+            return AudioFrame(
+                data=memoryview(buf)[pos : pos + length],
+                duration=duration,
+                header=header,
+                source=buf,
+                offset=pos,
+            )
+        return AudioFrame(data=bytes(buf[pos : pos + length]), duration=duration, header=header)
+
+
+class MpegFrameParser(_ChunkParser):
+    """Incremental MPEG-1/2/2.5 Layer I/II/III frame splitter.
+
+    Non-audio data (ID3v2/ID3v1/APE tags, garbage) is skipped. A header is only
+    trusted when the next frame header also checks out, unless it ends the input.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._synced = False
+
+    def _parse(
+        self, buf: bytes | bytearray, pos: int, out: list[AudioFrame], shared: bool, final: bool
+    ) -> int:
+        n = len(buf)
+        while n - pos >= 4:
+            if buf[pos] == 0x49 and buf[pos : pos + 3] == b"ID3":
+                if n - pos < 10:
+                    break
+                size = _syncsafe(buf[pos + 6 : pos + 10]) + 10
+                if buf[pos + 5] & 0x10:
+                    size += 10  # footer present
+                if n - pos < size:
+                    # Tags (cover art) can be far longer than a chunk: skip, don't carry.
+                    return pos + self._skip_beyond(n - pos, size)
+                self.skipped_bytes += size
+                pos += size
+                continue
+
+            header = _mpeg_header(buf, pos)
+            if header is None:
+                nxt = buf.find(b"\xff", pos + 1)
+                skip = (nxt if nxt >= 0 else n) - pos
+                pos += skip
+                self._skip(skip)
+                continue
+            length, duration = header
+            # Until synced, also require the following header to be valid.
+            need = length if (self._synced or final) else length + 4
+            if n - pos < need:
+                break
+            if not self._synced and not final and _mpeg_header(buf, pos + length) is None:
+                # False sync inside tag/garbage: keep scanning.
+                pos += 1
+                self._skip(1)
+                continue
+
+            self._synced = True
+            out.append(self._frame(buf, pos, length, shared, duration))
+            pos += length
+        return pos
+
+    def _skip(self, count: int) -> None:
+        self.skipped_bytes += count
+        self._synced = False
+
+
+class OggPageParser(_ChunkParser):
+    """Incremental Ogg page splitter with per-page durations from granule positions.
+
+    Supports Opus (48 kHz granules, pre-skip) and Vorbis (rate from the identification
+    header). Pages of other codecs pass through with unknown duration.
+    """
+
+    # Largest possible page: header, 255 lacing values, 255 * 255 body bytes.
+    _bridge = _OGG_HEADER.size + 255 + 255 * 255
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._streams: dict[int, _OggStream] = {}
+
+    def _parse(
+        self, buf: bytes | bytearray, pos: int, out: list[AudioFrame], shared: bool, final: bool
+    ) -> int:
+        n = len(buf)
+        while n - pos >= _OGG_HEADER.size:
+            if buf[pos : pos + 4] != b"OggS":
+                nxt = buf.find(b"OggS", pos + 1)
+                skip = (nxt if nxt >= 0 else n - 3) - pos
+                pos += skip
+                self.skipped_bytes += skip
+                continue
+
+            _, version, header_type, granule, serial, _seq, _crc, nsegs = _OGG_HEADER.unpack_from(
+                buf, pos
+            )
+            if version != 0:
+                pos += 1
+                self.skipped_bytes += 1
+                continue
+            seg_start = pos + _OGG_HEADER.size
+            if n < seg_start + nsegs:
+                break
+            body_len = sum(buf[seg_start : seg_start + nsegs])
+            page_len = _OGG_HEADER.size + nsegs + body_len
+            if n - pos < page_len:
+                break
+
+            body_start = seg_start + nsegs
+            stream = self._streams.get(serial)
+            if stream is None or header_type & 0x02:
+                stream = _OggStream()
+                self._streams[serial] = stream
+            duration, is_header = stream.page(bytes(buf[body_start : body_start + 8]), granule)
+            if buf[body_start : body_start + 19].startswith(b"OpusHead"):
+                stream.set_opus_head(bytes(buf[body_start : body_start + 19]))
+            elif buf[body_start : body_start + 16].startswith(b"\x01vorbis"):
+                stream.set_vorbis_ident(bytes(buf[body_start : body_start + 16]))
+
+            out.append(self._frame(buf, pos, page_len, shared, duration, header=is_header))
+            pos += page_len
+        return pos
+
+
+class _OggStream:
+    def __init__(self) -> None:
+        self.rate: int | None = None
+        self.last_granule: int | None = None
+        self.header_packets = 0
+
+    def set_opus_head(self, head: bytes) -> None:
+        self.rate = 48000
+        pre_skip = struct.unpack_from("<H", head, 10)[0] if len(head) >= 12 else 0
+        self.last_granule = pre_skip
+        self.header_packets = 2  # OpusHead + OpusTags
+
+    def set_vorbis_ident(self, ident: bytes) -> None:
+        self.rate = struct.unpack_from("<I", ident, 12)[0] if len(ident) >= 16 else None
+        self.last_granule = 0
+        self.header_packets = 3  # identification, comment, setup
+
+    def page(self, body_prefix: bytes, granule: int) -> tuple[float | None, bool]:
+        if body_prefix.startswith((b"OpusHead", b"OpusTags")):
+            return 0.0, True
+        if body_prefix[:1] in (b"\x01", b"\x03", b"\x05") and body_prefix[1:7] == b"vorbis":
+            return 0.0, True
+        if self.rate is None:
+            return None, False
+        if granule == 0:
+            # Continuation of a header packet spanning several pages.
+            return 0.0, True
+        if granule == _OGG_NO_GRANULE:
+            # No packet ends on this page: its audio is accounted to the next one.
+            return 0.0, False
+        prev = self.last_granule if self.last_granule is not None else 0
+        self.last_granule = granule
+        return max(0, granule - prev) / float(self.rate), False
+
+
+def _syncsafe(b: bytes | bytearray) -> int:
+    return (b[0] & 0x7F) << 21 | (b[1] & 0x7F) << 14 | (b[2] & 0x7F) << 7 | (b[3] & 0x7F)
+
+
+def _mpeg_header(buf: bytes | bytearray, pos: int) -> tuple[int, float] | None:
+    """Return (frame_length, duration_seconds) if a valid MPEG audio header starts at pos."""
+
+    if len(buf) - pos < 4:
+        return None
+    b1 = buf[pos + 1]
+    if buf[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    if version == 1 or layer_bits == 0:
+        return None
+    layer = 4 - layer_bits
+    b2 = buf[pos + 2]
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x03
+    if bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    padding = (b2 >> 1) & 0x01
+
+    is_v1 = version == 3
+    bitrate = _MPEG_BITRATES[(is_v1, layer)][bitrate_index] * 1000
+    sample_rate = _MPEG_SAMPLE_RATES[version][rate_index]
+
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or is_v1) else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    if length < 4:
+        return None
+    return length, samples / float(sample_rate)
+
+
+@dataclass(frozen=True)
+class BroadcastUnit:
+    """Whole frames/pages sent to listeners as one piece.
+
+    `header` units carry codec setup pages only; audio units carry no setup pages.
+    `estimated` is set when part of `duration` came from a byte-rate estimate.
+    """
+
+    data: bytes | memoryview
+    duration: float
+    header: bool = False
+    estimated: bool = False
+
+
+class FrameChunker:
+    """Groups parsed frames into broadcast units of about `target_size` bytes.
+
+    A unit always holds at least one whole frame and never splits one, so every unit
+    boundary is a decoder sync point: a listener can start (or skip ahead) at any unit.
+    """
+
+    def __init__(self, target_size: int, fallback_bytes_per_second: float) -> None:
+        self._target = max(1, int(target_size))
+        self._fallback_bps = max(1.0, float(fallback_bytes_per_second))
+        self._frames: deque[AudioFrame] = deque()
+        self.pending_bytes = 0
+
+    def push(self, frames: list[AudioFrame]) -> None:
+        self._frames.extend(frames)
+        self.pending_bytes += sum(len(f.data) for f in frames)
+
+    def ready(self) -> bool:
+        return self.pending_bytes >= self._target
+
+    def pop(self) -> BroadcastUnit | None:
+        frames = self._frames
+        if not frames:
+            return None
+        header = frames[0].header
+        # Runs of frames that are adjacent in the same source chunk become one slice.
+        pieces: list[bytes | memoryview] = []
+        run_source: bytes | None = None
+        run_start = run_end = 0
+        size = 0
+        duration = 0.0
+        estimated = False
+        while frames and frames[0].header == header:
+            frame = frames[0]
+            length = len(frame.data)
+            if size and size + length > self._target:
+                break
+            frames.popleft()
+            size += length
+            if frame.duration is not None:
+                duration += frame.duration
+            else:
+                duration += length / self._fallback_bps
+                estimated = True
+            if frame.source is not None and frame.source is run_source and frame.offset == run_end:
+                run_end += length
+                continue
+            if run_source is not None:
+                pieces.append(memoryview(run_source)[run_start:run_end])
+            if frame.source is not None:
+                run_source, run_start, run_end = frame.source, frame.offset, frame.offset + length
+            else:
+                run_source = None
+                pieces.append(frame.data)
+        if run_source is not None:
+            pieces.append(memoryview(run_source)[run_start:run_end])
+        self.pending_bytes -= size
+        # Only units spanning two source chunks are copied.
+        data = pieces[0] if len(pieces) == 1 else b"".join(pieces)
+        return BroadcastUnit(data=data, duration=duration, header=header, estimated=estimated)
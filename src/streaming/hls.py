@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import math
+import struct
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any
+
+# Packed-audio segments carry their start time in this ID3 PRIV frame (HLS spec, 3.4).
+_TIMESTAMP_OWNER = b"com.apple.streaming.transportStreamTimestamp\x00"
+_PTS_CLOCK = 90000
+_PTS_WRAP = 1 << 33
+
+PLAYLIST_MIME_TYPE = "application/vnd.apple.mpegurl"
+# MPEG-1/2 Layer III in the RFC 6381 notation HLS players expect.
+MP3_CODECS = "mp4a.40.34"
+
+
+@dataclass(frozen=True)
+class HlsSegment:
+    seq: int
+    duration: float
+    data: bytes
+
+
+class HlsSegmenter:
+    """Cuts a broadcast output (MPEG audio) into HLS segments kept in memory.
+
+    Broadcast units already start on frame boundaries, so a segment is closed at the
+    first unit boundary after `segment_seconds` of audio. The live playlist lists the
+    last `window` segments; a few older ones are kept so clients that fetched the
+    previous playlist can still get them. Segments never change once published, which
+    is what lets a CDN or reverse proxy cache them.
+
+    Segment URIs carry `epoch` (the output's), so a cache never answers for a segment
+    of an earlier run with the same number. Numbers start at the current Unix second
+    and grow by one per segment, which lasts seconds of real-time audio, so a later
+    run starts above where an earlier one got to and EXT-X-MEDIA-SEQUENCE never goes
+    back across restarts; the first segment of a run is marked as a discontinuity.
+    """
+
+    def __init__(self, segment_seconds: float, window: int, epoch: str) -> None:
+        self._segment_seconds = max(1.0, float(segment_seconds))
+        self._window = max(3, int(window))
+        self._segments: deque[HlsSegment] = deque(maxlen=self._window + 3)
+        self._pending: list[bytes | memoryview] = []
+        self._pending_duration = 0.0
+        self.epoch = epoch
+        self._first_seq = int(time.time())
+        self._next_seq = self._first_seq
+        # Audio published so far (segment start timestamps).
+        self._elapsed_s = 0.0
+        # EXT-X-TARGETDURATION must not shrink during a live session.
+        self._target_duration = math.ceil(self._segment_seconds)
+        self._bytes_total = 0
+
+    @property
+    def target_duration(self) -> int:
+        return self._target_duration
+
+    def push(self, chunk: bytes | memoryview, duration: float, header: bool = False) -> None:
+        self._pending.append(chunk)
+        self._pending_duration += duration
+        if self._pending_duration >= self._segment_seconds:
+            self._cut()
+
+    def segment(self, seq: int) -> HlsSegment | None:
+        if not self._segments:
+            return None
+        index = seq - self._segments[0].seq
+        if index < 0 or index >= len(self._segments):
+            return None
+        return self._segments[index]
+
+    def playlist(self) -> str | None:
+        """Live media playlist; None until the first segment exists."""
+
+        segments = list(self._segments)[-self._window :]
+        if not segments:
+            return None
+        # Counted from the first sequence number as well, so it never goes back either:
+        # one more once this run's first segment has left the playlist.
+        discontinuity_seq = self._first_seq + (segments[0].seq > self._first_seq)
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            f"#EXT-X-TARGETDURATION:{self._target_duration}",
+            f"#EXT-X-MEDIA-SEQUENCE:{segments[0].seq}",
+            f"#EXT-X-DISCONTINUITY-SEQUENCE:{discontinuity_seq}",
+        ]
+        for seg in segments:
+            if seg.seq == self._first_seq:
+                # Audio and timestamps of this run start here.
+                lines.append("#EXT-X-DISCONTINUITY")
+            lines.append(f"#EXTINF:{seg.duration:.3f},")
+            lines.append(f"{self.epoch}/{seg.seq}.mp3")
+        return "\n".join(lines) + "\n"
+
+    def bandwidth(self) -> int | None:
+        """Peak bits per second over the kept segments (EXT-X-STREAM-INF BANDWIDTH)."""
+
+        rates = [8 * len(seg.data) / seg.duration for seg in self._segments if seg.duration > 0]
+        return int(max(rates)) if rates else None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "segments": len(self._segments),
+            "newest_seq": self._segments[-1].seq if self._segments else None,
+            "target_duration": self._target_duration,
+            "memory_bytes": sum(len(seg.data) for seg in self._segments),
+            "bytes_total": self._bytes_total,
+        }
+
+    def _cut(self) -> None:
+        duration = self._pending_duration
+        data = _timestamp_tag(self._elapsed_s) + b"".join(self._pending)
+        self._segments.append(HlsSegment(seq=self._next_seq, duration=duration, data=data))
+        self._next_seq += 1
+        self._elapsed_s += duration
+        self._bytes_total += len(data)
+        self._target_duration = max(self._target_duration, round(duration))
+        self._pending = []
+        self._pending_duration = 0.0
+
+
+def master_playlist(variants: list[tuple[str, int]]) -> str:
+    """Multivariant playlist for (media playlist URI, bandwidth in bits/s) pairs."""
+
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for uri, bandwidth in variants:
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},CODECS="{MP3_CODECS}"')
+        lines.append(uri)
+    return "\n".join(lines) + "\n"
+
+
+def _timestamp_tag(seconds: float) -> bytes:
+    pts = int(round(seconds * _PTS_CLOCK)) % _PTS_WRAP
+    frame_data = _TIMESTAMP_OWNER + struct.pack(">Q", pts)
+    frame = b"PRIV" + _syncsafe(len(frame_data)) + b"\x00\x00" + frame_data
+    return b"ID3\x04\x00\x00" + _syncsafe(len(frame)) + frame
+
+
+def _syncsafe(n: int) -> bytes:
+    return bytes(((n >> 21) & 0x7F, (n >> 14) & 0x7F, (n >> 7) & 0x7F, n & 0x7F))
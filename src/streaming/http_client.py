@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator, Awaitable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import TypeVar
+from urllib.parse import urlsplit
+
+# Minimal HTTP/1.1 GET client for talking to another yurets instance (edge relay).
+# Only what that needs: one request per connection, chunked or Content-Length bodies.
+
+T = TypeVar("T")
+
+
+class HttpError(Exception):
+    pass
+
+
+@dataclass
+class HttpResponse:
+    status: int
+    headers: dict[str, str]
+    body: AsyncIterator[bytes]
+
+    async def read(self) -> bytes:
+        return b"".join([part async for part in self.body])
+
+
+@asynccontextmanager
+async def http_get(url: str, timeout: float) -> AsyncIterator[HttpResponse]:
+    """GET `url`; `timeout` bounds connecting and every single read, not the whole body."""
+
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise HttpError(f"Unsupported URL: {url!r}")
+    tls = parts.scheme == "https"
+    port = parts.port or (443 if tls else 80)
+    target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, port, ssl=tls or None), timeout=timeout
+        )
+    except (OSError, asyncio.TimeoutError) as e:
+        raise HttpError(f"Cannot connect to {parts.netloc}: {e}") from e
+    try:
+        writer.write(
+            (
+                f"GET {target} HTTP/1.1\r\n"
+                f"Host: {parts.netloc}\r\n"
+                "User-Agent: yurets-relay\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode("latin-1")
+        )
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=timeout)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, OSError) as e:
+            raise HttpError(f"Bad response from {parts.netloc}: {e}") from e
+        except asyncio.TimeoutError as e:
+            raise HttpError(f"No response from {parts.netloc}") from e
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        try:
+            status = int(status_line.split()[1])
+        except (IndexError, ValueError) as e:
+            raise HttpError(f"Bad status line: {status_line!r}") from e
+        headers: dict[str, str] = {}
+        for line in header_lines:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = _read_chunked(reader, timeout)
+        else:
+            length = headers.get("content-length")
+            body = _read_plain(reader, int(length) if length else None, timeout)
+        yield HttpResponse(status=status, headers=headers, body=body)
+    finally:
+        writer.close()
+
+
+async def _read_plain(
+    reader: asyncio.StreamReader, length: int | None, timeout: float
+) -> AsyncIterator[bytes]:
+    remaining = length
+    while remaining is None or remaining > 0:
+        size = 65536 if remaining is None else min(65536, remaining)
+        data = await _timed(reader.read(size), timeout)
+        if not data:
+            if remaining:
+                raise HttpError("Connection closed mid-body")
+            return
+        if remaining is not None:
+            remaining -= len(data)
+        yield data
+
+
+async def _read_chunked(reader: asyncio.StreamReader, timeout: float) -> AsyncIterator[bytes]:
+    while True:
+        line = await _timed(reader.readline(), timeout)
+        try:
+            size = int(line.split(b";", 1)[0].strip() or b"x", 16)
+        except ValueError as e:
+            raise HttpError(f"Bad chunk size line: {line!r}") from e
+        if size == 0:
+            return
+        try:
+            data = await _timed(reader.readexactly(size + 2), timeout)
+        except asyncio.IncompleteReadError as e:
+            raise HttpError("Connection closed mid-chunk") from e
+        yield data[:-2]
+
+
+async def _timed(aw: Awaitable[T], timeout: float) -> T:
+    try:
+        return await asyncio.wait_for(aw, timeout=timeout)
+    except asyncio.TimeoutError as e:
+        raise HttpError(f"No data for {timeout:g} s") from e
+    except (ConnectionError, OSError) as e:
+        raise HttpError(str(e) or type(e).__name__) from e
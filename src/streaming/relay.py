@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import struct
+import time as time_module
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+
+from src.models.now_playing import NowPlaying
+from src.services.now_playing import NowPlayingState
+from src.streaming.broadcast import BroadcastOutput, BroadcastReader, SubscriberLagged, listen
+from src.streaming.http_client import HttpError, http_get
+from src.streaming.shared_ring import SharedRingReader
+
+logger = logging.getLogger(__name__)
+
+# How often a worker looks for new chunks in a shared ring; units are ~0.25 s of audio.
+_POLL_INTERVAL_S = 0.02
+
+# Relay protocol (GET /relay/<mount>): a stream of frames, each a kind byte and a payload
+# length followed by the payload.
+RELAY_MIME_TYPE = "application/x-yurets-relay"
+_FRAME = struct.Struct(">cI")
+_KIND_HELLO = b"H"  # JSON: mount, mime_type, epoch, resumed
+_KIND_CHUNK = b"A"  # _CHUNK + chunk bytes
+_KIND_NOW_PLAYING = b"N"  # JSON: NowPlaying
+_KIND_PING = b"P"  # empty, sent while no audio flows
+# Chunk: seq in the sender's ring, duration, flags.
+_CHUNK = struct.Struct(">QdB")
+_CHUNK_HEADER = 1
+# Codec setup pages replayed to a fresh client: not a ring entry, no seq.
+_CHUNK_REPLAY = 2
+_PING_INTERVAL_S = 5.0
+_RECONNECT_MIN_S = 1.0
+_RECONNECT_MAX_S = 30.0
+
+
+class RelayedOutput:
+    """Local copy of a broadcast output produced by another process.
+
+    A pump republishes the remote chunks into a local `BroadcastOutput` once, and this
+    process' listeners read it exactly like listeners of the master do (burst on
+    connect, Ogg setup pages, the same slow-consumer policy).
+    """
+
+    def __init__(
+        self,
+        mime_type: str | None,
+        capacity: int,
+        burst_seconds: float,
+        on_change: Callable[[RelayedOutput], None] | None = None,
+        skip_lagging: bool = False,
+        max_lag_seconds: float = 0.0,
+        write_max_bytes: int = 65536,
+        write_latency_seconds: float = 0.0,
+    ) -> None:
+        self.mime_type = mime_type
+        self.output = BroadcastOutput(capacity)
+        self.listeners = 0
+        self.lagged_total = 0
+        self.skips_total = 0
+        self.skip_lagging = skip_lagging
+        self.max_lag_seconds = float(max_lag_seconds)
+        self.write_max_bytes = int(write_max_bytes)
+        self.write_latency_seconds = float(write_latency_seconds)
+        # Times the pump fell behind the remote ring and skipped to its head.
+        self.resyncs_total = 0
+        self.burst_seconds = float(burst_seconds)
+        self.on_change = on_change
+
+    def subscribe(self) -> AsyncIterator[bytes | memoryview]:
+        return listen(self.open_listener())
+
+    def open_listener(self) -> BroadcastReader:
+        """Register a listener; the reader must be closed when it is gone."""
+
+        reader = BroadcastReader(
+            self.output,
+            self.burst_seconds,
+            skip_lagging=self.skip_lagging,
+            max_lag_seconds=self.max_lag_seconds,
+            write_max_bytes=self.write_max_bytes,
+            write_latency_seconds=self.write_latency_seconds,
+            on_skip=self._skipped,
+            on_close=self._closed,
+        )
+        self._listeners_changed(+1)
+        return reader
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "listeners": self.listeners,
+            "lagged_total": self.lagged_total,
+            "skips_total": self.skips_total,
+            "resyncs_total": self.resyncs_total,
+            "head_seq": self.output.ring.head_seq,
+        }
+
+    def _skipped(self, reader: BroadcastReader) -> None:
+        self.skips_total += 1
+        self._listeners_changed(0)
+
+    def _closed(self, reader: BroadcastReader) -> None:
+        if reader.lagged:
+            self.lagged_total += 1
+        self._listeners_changed(-1)
+
+    def _listeners_changed(self, delta: int) -> None:
+        self.listeners += delta
+        if self.on_change is not None:
+            self.on_change(self)
+
+
+async def pump_shared_ring(reader: SharedRingReader, relay: RelayedOutput) -> None:
+    """Copy chunks from a shared-memory ring into `relay` until the ring is closed."""
+
+    output = relay.output
+    codec_headers, codec_headers_seq = reader.codec_headers()
+    # Start with a burst worth of backlog so the first listeners get one too.
+    cursor = reader.backlog_start(
+        relay.burst_seconds, floor=codec_headers_seq if codec_headers else 0
+    )
+    if codec_headers and cursor > codec_headers_seq:
+        # The setup pages aren't in the ring any more: replay them first.
+        output.publish(codec_headers, 0.0, header=True)
+
+    while True:
+        head = reader.head_seq
+        while cursor < head:
+            try:
+                chunk, duration, header = reader.read(cursor)
+            except SubscriberLagged:
+                relay.resyncs_total += 1
+                logger.warning("Relay fell behind the shared ring, skipping to its head")
+                cursor = reader.head_seq
+                break
+            output.publish(chunk, duration, header=header)
+            cursor += 1
+        if reader.closed and cursor >= reader.head_seq:
+            output.close()
+            return
+        await asyncio.sleep(_POLL_INTERVAL_S)
+
+
+def _frame(kind: bytes, payload: bytes | memoryview = b"") -> bytes:
+    return b"".join((_FRAME.pack(kind, len(payload)), payload))
+
+
+def _chunk_frame(seq: int, duration: float, flags: int, chunk: bytes | memoryview) -> bytes:
+    header = _CHUNK.pack(seq, duration, flags)
+    return b"".join((_FRAME.pack(_KIND_CHUNK, len(header) + len(chunk)), header, chunk))
+
+
+async def relay_frames(
+    output: BroadcastOutput,
+    now_playing: NowPlayingState,
+    position: Callable[[], int | None],
+    hello: dict[str, Any],
+    burst_seconds: float,
+    epoch: str | None = None,
+    resume_from: int | None = None,
+) -> AsyncIterator[bytes]:
+    """Serve an output to a downstream relay: audio and now-playing on one connection.
+
+    A client that reconnects with the epoch and next seq it saw continues exactly where
+    it stopped if that is still in the ring; otherwise it starts like a new listener
+    (burst, codec setup pages) and is told so in the hello frame.
+    """
+
+    ring = output.ring
+    resumed = (
+        epoch == output.epoch
+        and resume_from is not None
+        and ring.oldest_seq <= resume_from <= ring.head_seq
+    )
+    if resumed:
+        assert resume_from is not None
+        cursor, codec_headers = resume_from, b""
+    else:
+        cursor, codec_headers = output.join(burst_seconds)
+    info = {**hello, "epoch": output.epoch, "resumed": resumed}
+    yield _frame(_KIND_HELLO, json.dumps(info).encode("utf-8"))
+    if codec_headers:
+        yield _chunk_frame(0, 0.0, _CHUNK_HEADER | _CHUNK_REPLAY, codec_headers)
+
+    now_playing_version = -1
+    while True:
+        if now_playing.version != now_playing_version:
+            now_playing_version = now_playing.version
+            current = await now_playing.get()
+            if current is not None:
+                current = current.model_copy(update={"position_seconds": position()})
+                yield _frame(_KIND_NOW_PLAYING, current.model_dump_json().encode("utf-8"))
+        if cursor >= ring.head_seq:
+            if ring.closed:
+                return
+            try:
+                await asyncio.wait_for(ring.wait(cursor), timeout=_PING_INTERVAL_S)
+            except asyncio.TimeoutError:
+                yield _frame(_KIND_PING)
+            continue
+        try:
+            chunk, duration, header = ring.entry(cursor)
+        except SubscriberLagged:
+            # The client reconnects and starts over from the burst.
+            return
+        yield _chunk_frame(cursor, duration, _CHUNK_HEADER if header else 0, chunk)
+        cursor += 1
+
+
+class UpstreamRelay:
+    """One connection to an upstream /relay/<mount>, republished into a local output.
+
+    Reconnects with backoff and resumes from the last chunk received; now-playing
+    updates from upstream are applied to `now_playing`.
+    """
+
+    def __init__(
+        self, url: str, relay: RelayedOutput, now_playing: NowPlayingState, timeout: float
+    ) -> None:
+        self.url = url
+        self.relay = relay
+        self.now_playing = now_playing
+        self._timeout = max(_PING_INTERVAL_S * 2, float(timeout))
+        self._epoch: str | None = None
+        self._next_seq: int | None = None
+        # Upstream position at the last now-playing update, and when it arrived.
+        self._position: int | None = None
+        self._position_at: float | None = None
+
+        self.connected = False
+        self.connects_total = 0
+        self.resumes_total = 0
+        # Reconnects that could not resume (audio skipped or repeated at the edge).
+        self.discontinuities_total = 0
+        self.chunks_total = 0
+        self.bytes_total = 0
+        self.last_error: str | None = None
+        self._last_chunk_at: float | None = None
+
+    def position_seconds(self) -> int | None:
+        if self._position is None or self._position_at is None:
+            return None
+        return self._position + int(time_module.monotonic() - self._position_at)
+
+    async def run(self) -> None:
+        delay = _RECONNECT_MIN_S
+        while True:
+            chunks_before = self.chunks_total
+            try:
+                await self._session()
+                self.last_error = "upstream closed the stream"
+            except (HttpError, ValueError, KeyError, struct.error) as e:
+                self.last_error = str(e) or type(e).__name__
+            finally:
+                self.connected = False
+            logger.warning("Relay %s disconnected: %s", self.url, self.last_error)
+            delay = _RECONNECT_MIN_S if self.chunks_total > chunks_before else delay
+            await asyncio.sleep(delay)
+            delay = min(_RECONNECT_MAX_S, delay * 2)
+
+    def stats(self) -> dict[str, Any]:
+        now = time_module.monotonic()
+        return {
+            "url": self.url,
+            "connected": self.connected,
+            "connects_total": self.connects_total,
+            "resumes_total": self.resumes_total,
+            "discontinuities_total": self.discontinuities_total,
+            "chunks_total": self.chunks_total,
+            "bytes_total": self.bytes_total,
+            "last_chunk_ago_ms": (
+                int(1000 * (now - self._last_chunk_at)) if self._last_chunk_at is not None else None
+            ),
+            "last_error": self.last_error,
+        }
+
+    async def _session(self) -> None:
+        url = self.url
+        if self._epoch is not None and self._next_seq is not None:
+            url += f"?epoch={self._epoch}&from={self._next_seq}"
+        async with http_get(url, timeout=self._timeout) as resp:
+            if resp.status != 200:
+                raise HttpError(f"HTTP {resp.status} from {self.url}")
+            buf = bytearray()
+            async for data in resp.body:
+                buf += data
+                offset = 0
+                while len(buf) - offset >= _FRAME.size:
+                    kind, size = _FRAME.unpack_from(buf, offset)
+                    end = offset + _FRAME.size + size
+                    if len(buf) < end:
+                        break
+                    await self._handle(kind, bytes(buf[offset + _FRAME.size : end]))
+                    offset = end
+                del buf[:offset]
+
+    async def _handle(self, kind: bytes, payload: bytes) -> None:
+        if kind == _KIND_CHUNK:
+            seq, duration, flags = _CHUNK.unpack_from(payload)
+            chunk = payload[_CHUNK.size :]
+            self.relay.output.publish(chunk, duration, header=bool(flags & _CHUNK_HEADER))
+            if not flags & _CHUNK_REPLAY:
+                self._next_seq = seq + 1
+            self.chunks_total += 1
+            self.bytes_total += len(chunk)
+            self._last_chunk_at = time_module.monotonic()
+        elif kind == _KIND_NOW_PLAYING:
+            current = NowPlaying.model_validate_json(payload)
+            self._position = current.position_seconds
+            self._position_at = time_module.monotonic()
+            await self.now_playing.set(current)
+        elif kind == _KIND_HELLO:
+            info = json.loads(payload)
+            self.connected = True
+            self.connects_total += 1
+            if info.get("resumed"):
+                self.resumes_total += 1
+            else:
+                if self._epoch is not None:
+                    self.discontinuities_total += 1
+                self._next_seq = None
+            self._epoch = str(info["epoch"])
+            self.relay.mime_type = str(info["mime_type"])
+        # Pings only keep the read timeout from firing.
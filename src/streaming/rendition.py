@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time as time_module
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from src.streaming.broadcast import BroadcastOutput
+from src.streaming.frames import FrameChunker, frame_parser_for
+
+logger = logging.getLogger(__name__)
+
+# Master output waiting for the encoder, in broadcast units (about 0.25 s each).
+_INPUT_QUEUE_UNITS = 256
+_READ_SIZE = 65536
+# Delay before restarting an encoder that exited.
+_RESTART_DELAY_S = 1.0
+
+# codec -> (encoder options, output container)
+_CODECS: dict[str, tuple[tuple[str, ...], str]] = {
+    "mp3": (("-c:a", "libmp3lame", "-ar", "44100"), "mp3"),
+    "opus": (("-c:a", "libopus", "-ar", "48000"), "ogg"),
+}
+
+
+@dataclass(frozen=True)
+class RenditionSpec:
+    codec: Literal["mp3", "opus"]
+    kbps: int
+
+    @property
+    def name(self) -> str:
+        return f"{self.codec}-{self.kbps}"
+
+    @property
+    def mime_type(self) -> str:
+        return "audio/ogg" if self.codec == "opus" else "audio/mpeg"
+
+
+def parse_renditions(text: str) -> list[RenditionSpec]:
+    """Parse "mp3:64,mp3:128,opus:96" (codec:kbps, comma separated)."""
+
+    specs: list[RenditionSpec] = []
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        codec, _, kbps = item.partition(":")
+        codec = codec.strip().lower()
+        if codec not in _CODECS or not kbps.strip().isdigit():
+            raise ValueError(f"Invalid rendition {item!r}, expected mp3:<kbps> or opus:<kbps>")
+        spec = RenditionSpec(codec=codec, kbps=int(kbps))  # type: ignore[arg-type]
+        if spec.kbps < 8 or spec.kbps > 512:
+            raise ValueError(f"Invalid rendition bitrate: {item!r}")
+        if spec not in specs:
+            specs.append(spec)
+    return specs
+
+
+class Rendition:
+    """One long-lived ffmpeg encoder re-encoding the master output at a fixed bitrate.
+
+    The master feeds every broadcast unit in once, whatever the number of listeners; the
+    encoded output is split into frames/pages and published to this rendition's own
+    ring, which its subscribers read exactly like the main one. Encoding cost therefore
+    grows with the number of renditions, not listeners.
+
+    A full input queue (encoder stalled) drops input rather than slowing the master; an
+    encoder that exits is restarted.
+    """
+
+    def __init__(
+        self,
+        spec: RenditionSpec,
+        input_mime_type: str,
+        ffmpeg_path: str,
+        capacity: int,
+        chunk_size: int,
+    ) -> None:
+        self.spec = spec
+        self.output = BroadcastOutput(capacity)
+        self._input_format = "ogg" if input_mime_type == "audio/ogg" else "mp3"
+        self._ffmpeg_path = ffmpeg_path
+        self._chunk_size = max(1, int(chunk_size))
+        self._queue: asyncio.Queue[bytes | memoryview] = asyncio.Queue(maxsize=_INPUT_QUEUE_UNITS)
+        self._task: asyncio.Task[None] | None = None
+
+        self._starts_total = 0
+        self._failures_total = 0
+        self._dropped_units_total = 0
+        self._in_bytes_total = 0
+        self._out_bytes_total = 0
+        self._last_error: str | None = None
+        # Last line the encoder logged (decoder hiccups at track boundaries are normal).
+        self._last_log: str | None = None
+        self._last_output_at: float | None = None
+
+    @property
+    def name(self) -> str:
+        return self.spec.name
+
+    @property
+    def mime_type(self) -> str:
+        return self.spec.mime_type
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"yurets-rendition-{self.name}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.output.close()
+
+    def feed(self, chunk: bytes | memoryview) -> None:
+        if self._task is None:
+            return
+        try:
+            self._queue.put_nowait(chunk)
+        except asyncio.QueueFull:
+            self._dropped_units_total += 1
+
+    def stats(self) -> dict[str, Any]:
+        now = time_module.monotonic()
+        return {
+            "mime_type": self.mime_type,
+            "kbps": self.spec.kbps,
+            "running": self._task is not None and not self._task.done(),
+            "starts_total": self._starts_total,
+            "failures_total": self._failures_total,
+            "input_queue_units": self._queue.qsize(),
+            "dropped_units_total": self._dropped_units_total,
+            "in_bytes_total": self._in_bytes_total,
+            "out_bytes_total": self._out_bytes_total,
+            "last_output_ago_ms": (
+                int(1000 * (now - self._last_output_at))
+                if self._last_output_at is not None
+                else None
+            ),
+            "last_error": self._last_error,
+            "last_log": self._last_log,
+        }
+
+    def _command(self) -> list[str]:
+        encoder_args, container = _CODECS[self.spec.codec]
+        return [
+            self._ffmpeg_path,
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-fflags",
+            "+nobuffer",
+            "-f",
+            self._input_format,
+            "-i",
+            "pipe:0",
+            "-vn",
+            "-ac",
+            "2",
+            *encoder_args,
+            "-b:a",
+            f"{self.spec.kbps}k",
+            "-flush_packets",
+            "1",
+            "-f",
+            container,
+            "pipe:1",
+        ]
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._run_encoder()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._last_error = str(e) or type(e).__name__
+                logger.warning("Rendition %s encoder failed: %s", self.name, self._last_error)
+            self._failures_total += 1
+            await asyncio.sleep(_RESTART_DELAY_S)
+
+    async def _run_encoder(self) -> None:
+        # Input queued while no encoder ran would start the new one mid-way through.
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        proc = await asyncio.create_subprocess_exec(
+            *self._command(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        self._starts_total += 1
+        writer = asyncio.create_task(self._write_input(proc), name=f"yurets-enc-in-{self.name}")
+        log_reader = asyncio.create_task(self._read_log(proc), name=f"yurets-enc-log-{self.name}")
+        try:
+            await self._read_output(proc)
+        finally:
+            writer.cancel()
+            if proc.returncode is None:
+                proc.kill()
+            await proc.wait()
+            # Let the last log lines (usually the reason for the exit) come through.
+            try:
+                await asyncio.wait_for(log_reader, timeout=1.0)
+            except (asyncio.TimeoutError, OSError):
+                pass
+        raise RuntimeError(f"encoder exited with code {proc.returncode}: {self._last_log}")
+
+    async def _write_input(self, proc: asyncio.subprocess.Process) -> None:
+        assert proc.stdin is not None
+        try:
+            while True:
+                chunk = await self._queue.get()
+                proc.stdin.write(chunk)
+                self._in_bytes_total += len(chunk)
+                await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            # The reader notices the exit and restarts the encoder.
+            pass
+
+    async def _read_log(self, proc: asyncio.subprocess.Process) -> None:
+        # Drained continuously: a full stderr pipe would block the encoder.
+        assert proc.stderr is not None
+        async for line in proc.stderr:
+            text = line.decode("utf-8", "replace").strip()
+            if text:
+                self._last_log = text[:500]
+
+    async def _read_output(self, proc: asyncio.subprocess.Process) -> None:
+        assert proc.stdout is not None
+        parser = frame_parser_for(self.mime_type)
+        chunker = FrameChunker(
+            target_size=self._chunk_size,
+            fallback_bytes_per_second=self.spec.kbps * 1000.0 / 8.0,
+        )
+        while True:
+            data = await proc.stdout.read(_READ_SIZE)
+            if not data:
+                return
+            self._out_bytes_total += len(data)
+            self._last_output_at = time_module.monotonic()
+            chunker.push(parser.feed(data))
+            # Publish whatever is complete: the encoder already runs at the master's pace.
+            while chunker.pending_bytes:
+                unit = chunker.pop()
+                if unit is None:
+                    break
+                self.output.publish(unit.data, unit.duration, header=unit.header)
@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import struct
+from multiprocessing import shared_memory
+from typing import Any
+
+from src.settings import Settings
+from src.streaming.broadcast import SubscriberLagged
+from src.streaming.rendition import parse_renditions
+
+# Header: magic, slots, data capacity, head seq, reserved write position, closed flag,
+# codec headers generation / length / seq.
+_HEADER = struct.Struct("<4sIQQQIIIxxxxQ")
+_MAGIC = b"YRNG"
+# Slot: seq, absolute data position, length, flags, duration.
+_SLOT = struct.Struct("<QQIId")
+_FLAG_HEADER = 1
+# Slot seq while the writer fills the slot in.
+_SLOT_BUSY = (1 << 64) - 1
+# Room for the current Ogg setup pages (Vorbis comments with cover art are dropped).
+_CODEC_HEADERS_MAX = 262144
+
+_HEAD_OFFSET = 16
+_RESERVED_OFFSET = 24
+_CLOSED_OFFSET = 32
+_GEN_OFFSET = 36
+_CODEC_LEN_OFFSET = 40
+_CODEC_SEQ_OFFSET = 48
+
+# Per (worker, output): listeners, listeners dropped for lagging, lagging listeners skipped
+# forward.
+_COUNTERS = struct.Struct("<III")
+
+
+def fanout_outputs(settings: Settings) -> list[tuple[str, str]]:
+    """Every broadcast output of the process as (mount, variant), in a fixed order.
+
+    The variant is "main" or a rendition name, like the HLS variants. Master and
+    workers derive the same list from the same settings.
+    """
+
+    outputs: list[tuple[str, str]] = []
+    for mount, mount_settings in settings.mounts():
+        outputs.append((mount, "main"))
+        for spec in parse_renditions(mount_settings.renditions):
+            outputs.append((mount, spec.name))
+    return outputs
+
+
+class SharedRingWriter:
+    """Single-writer ring of broadcast chunks in shared memory.
+
+    Same model as `BroadcastRing`, but readable from other processes: chunk bytes go
+    into a circular data area at monotonically growing absolute positions, and a slot
+    table maps sequence numbers to (position, length, duration). Nothing is ever
+    locked; readers copy a chunk out and then check it wasn't overwritten meanwhile.
+    """
+
+    def __init__(self, name: str, slots: int, data_capacity: int) -> None:
+        self._slots = max(2, int(slots))
+        self._capacity = max(65536, int(data_capacity))
+        self._table_offset = _HEADER.size + _CODEC_HEADERS_MAX
+        self._data_offset = self._table_offset + self._slots * _SLOT.size
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=True, size=self._data_offset + self._capacity
+        )
+        self._buf = self.shm.buf
+        _HEADER.pack_into(self._buf, 0, _MAGIC, self._slots, self._capacity, 0, 0, 0, 0, 0, 0)
+        self._head = 0
+        self._write_abs = 0
+        self._codec_gen = 0
+        self._codec_headers = b""
+        self._last_was_header = False
+        self.oversized_total = 0
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def head_seq(self) -> int:
+        return self._head
+
+    def push(self, chunk: bytes | memoryview, duration: float, header: bool) -> None:
+        size = len(chunk)
+        if size > self._capacity // 4:
+            # Never happens with frame/page-sized units; keeps the ring invariants simple.
+            self.oversized_total += 1
+            return
+        seq = self._head
+        if header:
+            codec_headers = self._codec_headers + bytes(chunk) if self._last_was_header else chunk
+            self._store_codec_headers(bytes(codec_headers), seq)
+        self._last_was_header = header
+
+        pos = self._write_abs
+        phys = pos % self._capacity
+        if phys + size > self._capacity:
+            # Chunks are stored contiguously: skip the tail of the data area.
+            pos += self._capacity - phys
+            phys = 0
+        # Announce the region before overwriting it, so readers of older chunks notice.
+        struct.pack_into("<Q", self._buf, _RESERVED_OFFSET, pos + size)
+        start = self._data_offset + phys
+        self._buf[start : start + size] = chunk
+        slot = self._table_offset + (seq % self._slots) * _SLOT.size
+        flags = _FLAG_HEADER if header else 0
+        _SLOT.pack_into(self._buf, slot, _SLOT_BUSY, pos, size, flags, float(duration))
+        struct.pack_into("<Q", self._buf, slot, seq)
+        self._write_abs = pos + size
+        self._head = seq + 1
+        struct.pack_into("<Q", self._buf, _HEAD_OFFSET, self._head)
+
+    def close(self) -> None:
+        struct.pack_into("<I", self._buf, _CLOSED_OFFSET, 1)
+
+    def release(self) -> None:
+        self._buf = None  # type: ignore[assignment]
+        self.shm.close()
+        self.shm.unlink()
+
+    def _store_codec_headers(self, data: bytes, seq: int) -> None:
+        self._codec_headers = data
+        if len(data) > _CODEC_HEADERS_MAX:
+            data = b""
+        # Odd generation while the blob is being rewritten (seqlock).
+        self._codec_gen += 1
+        struct.pack_into("<I", self._buf, _GEN_OFFSET, self._codec_gen)
+        self._buf[_HEADER.size : _HEADER.size + len(data)] = data
+        struct.pack_into("<I", self._buf, _CODEC_LEN_OFFSET, len(data))
+        struct.pack_into("<Q", self._buf, _CODEC_SEQ_OFFSET, seq)
+        self._codec_gen += 1
+        struct.pack_into("<I", self._buf, _GEN_OFFSET, self._codec_gen)
+
+
+class SharedRingReader:
+    """Read side of a `SharedRingWriter`, attached by name from another process."""
+
+    def __init__(self, name: str) -> None:
+        self.shm = shared_memory.SharedMemory(name=name)
+        self._buf = self.shm.buf
+        magic, slots, capacity, *_ = _HEADER.unpack_from(self._buf, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"Not a broadcast ring: {name}")
+        self._slots = slots
+        self._capacity = capacity
+        self._table_offset = _HEADER.size + _CODEC_HEADERS_MAX
+        self._data_offset = self._table_offset + self._slots * _SLOT.size
+
+    @property
+    def head_seq(self) -> int:
+        return struct.unpack_from("<Q", self._buf, _HEAD_OFFSET)[0]
+
+    @property
+    def closed(self) -> bool:
+        return bool(struct.unpack_from("<I", self._buf, _CLOSED_OFFSET)[0])
+
+    def read(self, seq: int) -> tuple[bytes, float, bool]:
+        """Copy of chunk `seq` with its duration and header flag.
+
+        Raises SubscriberLagged if it was overwritten, IndexError if not published yet.
+        """
+
+        if seq >= self.head_seq:
+            raise IndexError(seq)
+        slot = self._table_offset + (seq % self._slots) * _SLOT.size
+        slot_seq, pos, size, flags, duration = _SLOT.unpack_from(self._buf, slot)
+        if slot_seq != seq:
+            raise SubscriberLagged(seq)
+        start = self._data_offset + pos % self._capacity
+        data = bytes(self._buf[start : start + size])
+        reserved = struct.unpack_from("<Q", self._buf, _RESERVED_OFFSET)[0]
+        if reserved > pos + self._capacity or _SLOT.unpack_from(self._buf, slot)[0] != seq:
+            raise SubscriberLagged(seq)
+        return data, duration, bool(flags & _FLAG_HEADER)
+
+    def backlog_start(self, seconds: float, floor: int = 0) -> int:
+        """Like `BroadcastRing.backlog_start`, over the chunks still intact."""
+
+        head = self.head_seq
+        reserved = struct.unpack_from("<Q", self._buf, _RESERVED_OFFSET)[0]
+        seq = head
+        covered = 0.0
+        while seq > floor and covered < seconds:
+            slot = self._table_offset + ((seq - 1) % self._slots) * _SLOT.size
+            slot_seq, pos, _size, _flags, duration = _SLOT.unpack_from(self._buf, slot)
+            if slot_seq != seq - 1 or reserved > pos + self._capacity:
+                break
+            seq -= 1
+            covered += duration
+        return seq
+
+    def codec_headers(self) -> tuple[bytes, int]:
+        """Current Ogg setup pages (possibly empty) and the seq of their first chunk."""
+
+        while True:
+            gen = struct.unpack_from("<I", self._buf, _GEN_OFFSET)[0]
+            if gen % 2:
+                continue
+            size = struct.unpack_from("<I", self._buf, _CODEC_LEN_OFFSET)[0]
+            seq = struct.unpack_from("<Q", self._buf, _CODEC_SEQ_OFFSET)[0]
+            data = bytes(self._buf[_HEADER.size : _HEADER.size + size])
+            if struct.unpack_from("<I", self._buf, _GEN_OFFSET)[0] == gen:
+                return data, seq
+
+    def release(self) -> None:
+        self._buf = None  # type: ignore[assignment]
+        self.shm.close()
+
+
+class SharedFanout:
+    """Shared-memory rings of every output plus per-worker listener counters.
+
+    Created by the master process (`create`), which publishes each output into its ring;
+    HTTP workers `attach` by prefix, read the rings and report their listeners back.
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        outputs: list[tuple[str, str]],
+        workers: int,
+        counters: shared_memory.SharedMemory,
+        writers: dict[tuple[str, str], SharedRingWriter] | None = None,
+        readers: dict[tuple[str, str], SharedRingReader] | None = None,
+    ) -> None:
+        self.prefix = prefix
+        self.outputs = outputs
+        self.workers = workers
+        self._index = {key: i for i, key in enumerate(outputs)}
+        self._counters = counters
+        self.writers = writers or {}
+        self.readers = readers or {}
+
+    @classmethod
+    def create(cls, prefix: str, settings: Settings, workers: int) -> SharedFanout:
+        outputs = fanout_outputs(settings)
+        slots = int(settings.subscriber_queue_chunks)
+        # Units hold whole frames/pages, so they can run past broadcast_chunk_size.
+        data_capacity = 2 * slots * int(settings.broadcast_chunk_size)
+        writers = {
+            key: SharedRingWriter(f"{prefix}_{i}", slots, data_capacity)
+            for i, key in enumerate(outputs)
+        }
+        counters = shared_memory.SharedMemory(
+            name=f"{prefix}_n", create=True, size=max(1, workers * len(outputs) * _COUNTERS.size)
+        )
+        counters.buf[:] = bytes(len(counters.buf))
+        return cls(prefix, outputs, workers, counters, writers=writers)
+
+    @classmethod
+    def attach(cls, prefix: str, settings: Settings, workers: int) -> SharedFanout:
+        outputs = fanout_outputs(settings)
+        readers = {key: SharedRingReader(f"{prefix}_{i}") for i, key in enumerate(outputs)}
+        counters = shared_memory.SharedMemory(name=f"{prefix}_n")
+        return cls(prefix, outputs, workers, counters, readers=readers)
+
+    def report(
+        self, worker: int, mount: str, variant: str, listeners: int, lagged: int, skips: int
+    ) -> None:
+        offset = (worker * len(self.outputs) + self._index[(mount, variant)]) * _COUNTERS.size
+        _COUNTERS.pack_into(self._counters.buf, offset, listeners, lagged, skips)
+
+    def counters(self, mount: str, variant: str) -> list[tuple[int, int, int]]:
+        """(listeners, lagged, skips) of one output, per worker."""
+
+        i = self._index.get((mount, variant))
+        if i is None:
+            return []
+        return [
+            _COUNTERS.unpack_from(
+                self._counters.buf, (worker * len(self.outputs) + i) * _COUNTERS.size
+            )
+            for worker in range(self.workers)
+        ]
+
+    def listeners(self, mount: str, variant: str | None = None) -> int:
+        variants = [v for m, v in self.outputs if m == mount] if variant is None else [variant]
+        return sum(n for v in variants for n, _, _ in self.counters(mount, v))
+
+    def stats(self, mount: str) -> dict[str, Any]:
+        out: dict[str, Any] = {}
+        for m, variant in self.outputs:
+            if m != mount:
+                continue
+            writer = self.writers.get((mount, variant))
+            counters = self.counters(mount, variant)
+            out[variant] = {
+                "head_seq": writer.head_seq if writer is not None else None,
+                "oversized_total": writer.oversized_total if writer is not None else None,
+                "listeners_per_worker": [n for n, _, _ in counters],
+                "lagged_total": sum(lagged for _, lagged, _ in counters),
+                "skips_total": sum(skips for _, _, skips in counters),
+            }
+        return out
+
+    def close(self) -> None:
+        for writer in self.writers.values():
+            writer.close()
+
+    def release(self) -> None:
+        for writer in self.writers.values():
+            writer.release()
+        for reader in self.readers.values():
+            reader.release()
+        self._counters.close()
+        if self.writers:
+            self._counters.unlink()
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import random
+from collections.abc import Sequence
 from dataclasses import dataclass
 from typing import AsyncIterator, Protocol
 
@@ -11,6 +12,19 @@ class TrackRef:
     duration_seconds: int | None
     ref: object
     byte_size: int | None = None
+    bitrate_kbps: int | None = None
+
+
+@dataclass(frozen=True)
+class TrackCatalog:
+    """Playable track keys of a source in a stable order.
+
+    `version` changes whenever the set of keys changes, so consumers can skip
+    re-reading an unchanged catalog. `keys` is only valid until the next await.
+    """
+
+    version: int
+    keys: Sequence[str]
 
 
 class MusicSource(Protocol):
@@ -18,4 +32,10 @@ class MusicSource(Protocol):
 
     async def next_track(self, mime_type: str, rng: random.Random | None = None) -> TrackRef: ...
 
+    async def catalog(self, mime_type: str) -> TrackCatalog: ...
+
+    def track_title(self, key: str) -> str: ...
+
+    async def resolve_track(self, key: str) -> TrackRef: ...
+
     def stream_track(self, track: TrackRef, chunk_size: int) -> AsyncIterator[bytes]: ...
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import time as time_module
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+# Smoothing factor for the latency moving average.
+_EWMA_ALPHA = 0.2
+
+
+class BoundedExecutor:
+    """Small dedicated thread pool for blocking calls (stat, mutagen, directory walks).
+
+    At most `max_workers` calls run at once; further callers wait on a semaphore
+    instead of piling up inside the pool, so queue depth is observable and the
+    default executor (used by aiofiles and friends) is never starved.
+    """
+
+    def __init__(self, max_workers: int, name: str) -> None:
+        self._max_workers = max(1, int(max_workers))
+        self._pool = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(self._max_workers)
+
+        self._queued = 0
+        self._queued_peak = 0
+        self._running = 0
+        self._completed_total = 0
+        self._failed_total = 0
+        self._wait_max_s = 0.0
+        self._run_max_s = 0.0
+        self._latency_last_s: float | None = None
+        self._latency_ewma_s: float | None = None
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        queued_at = time_module.monotonic()
+        self._queued += 1
+        if self._queued > self._queued_peak:
+            self._queued_peak = self._queued
+        waiting = True
+        try:
+            async with self._slots:
+                self._queued -= 1
+                waiting = False
+                started_at = time_module.monotonic()
+                self._wait_max_s = max(self._wait_max_s, started_at - queued_at)
+                self._running += 1
+                ok = False
+                try:
+                    loop = asyncio.get_running_loop()
+                    result = await loop.run_in_executor(self._pool, functools.partial(fn, *args))
+                    ok = True
+                    return result
+                finally:
+                    self._running -= 1
+                    done_at = time_module.monotonic()
+                    self._record(run_s=done_at - started_at, latency_s=done_at - queued_at, ok=ok)
+        finally:
+            if waiting:
+                self._queued -= 1
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "max_workers": self._max_workers,
+            "queued": self._queued,
+            "queued_peak": self._queued_peak,
+            "running": self._running,
+            "completed_total": self._completed_total,
+            "failed_total": self._failed_total,
+            "wait_max_ms": int(1000 * self._wait_max_s),
+            "run_max_ms": int(1000 * self._run_max_s),
+            "latency_last_ms": (
+                int(1000 * self._latency_last_s) if self._latency_last_s is not None else None
+            ),
+            "latency_avg_ms": (
+                int(1000 * self._latency_ewma_s) if self._latency_ewma_s is not None else None
+            ),
+        }
+
+    def _record(self, run_s: float, latency_s: float, ok: bool) -> None:
+        if ok:
+            self._completed_total += 1
+        else:
+            self._failed_total += 1
+        self._run_max_s = max(self._run_max_s, run_s)
+        self._latency_last_s = latency_s
+        if self._latency_ewma_s is None:
+            self._latency_ewma_s = latency_s
+        else:
+            self._latency_ewma_s += _EWMA_ALPHA * (latency_s - self._latency_ewma_s)
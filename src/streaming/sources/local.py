@@ -1,19 +1,28 @@
 from __future__ import annotations
 
+import asyncio
+import bisect
+import logging
+import os
 import random
-import time as time_module
 from dataclasses import dataclass
+from collections.abc import Callable, Coroutine
 from pathlib import Path
 from typing import Any, AsyncIterator
 
 import aiofiles
 
-from src.streaming.sources.base import TrackRef
+from src.streaming.sources.base import TrackCatalog, TrackRef
+from src.streaming.sources.executor import BoundedExecutor
+from src.streaming.sources.local_index import LocalTrackIndex, LocalTrackMeta
+from src.streaming.sources.local_watch import FileStat, LibraryWatcher
 
-try:
-    from mutagen import File as MutagenFile  # type: ignore
-except Exception:  # pragma: no cover
-    MutagenFile = None
+logger = logging.getLogger(__name__)
+
+# How many files to parse per index transaction while back-filling.
+_INDEX_BATCH = 64
+# Above this many added files, rebuild the sorted track list instead of inserting one by one.
+_BULK_INSERT = 256
 
 
 @dataclass
@@ -24,37 +33,65 @@ class _LocalTrack:
 class LocalLibrarySource:
     id = "local"
 
-    def __init__(self, music_dir: Path) -> None:
+    def __init__(
+        self,
+        music_dir: Path,
+        index: LocalTrackIndex | None = None,
+        watch_mode: str = "auto",
+        poll_interval: float = 10.0,
+        executor: BoundedExecutor | None = None,
+    ) -> None:
         self._music_dir = music_dir
+        self._index = index if index is not None else LocalTrackIndex(None)
+        # Every blocking stat/parse/walk goes through this pool, never the event loop.
+        self._executor = executor if executor is not None else BoundedExecutor(2, "yurets-local")
+        self._watch_mode = watch_mode
+        self._poll_interval = poll_interval
+        # Sorted (by str) so a seeded rng picks the same files regardless of scan order.
         self._cache: list[Path] = []
-        self._cache_ts: float = 0.0
+        self._cache_keys: list[str] = []
+        self._cache_version = 0
+        self._listeners: list[Callable[[], None]] = []
+        self._watcher: LibraryWatcher | None = None
+        self._watcher_lock = asyncio.Lock()
+        self._index_tasks: set[asyncio.Task[None]] = set()
+        # Back-fill batches run one at a time so on-demand lookups always find a free worker.
+        self._index_lock = asyncio.Lock()
 
     async def next_track(self, mime_type: str, rng: random.Random | None = None) -> TrackRef:
-        self._refresh_cache_if_needed(mime_type=mime_type)
-        if not self._cache:
-            if not self._music_dir.exists():
-                raise RuntimeError(
-                    f"Music directory does not exist: {self._music_dir}. "
-                    "If you're running in Docker, only mounted paths are visible inside the container "
-                    "(by default ./music -> /music)."
-                )
+        await self._require_tracks(mime_type=mime_type)
+        chooser = rng or random
+        return await self._resolve_path(chooser.choice(self._cache))
+
+    async def catalog(self, mime_type: str) -> TrackCatalog:
+        await self._require_tracks(mime_type=mime_type)
+        return TrackCatalog(version=self._cache_version, keys=self._cache_keys)
+
+    def track_title(self, key: str) -> str:
+        return Path(key).stem
+
+    async def resolve_track(self, key: str) -> TrackRef:
+        return await self._resolve_path(Path(key))
+
+    async def _resolve_path(self, path: Path) -> TrackRef:
+        meta = self._index.get(str(path))
+        if meta is None:
+            # Not indexed yet (new file, back-fill still running): index it now.
+            meta = await self._executor.run(self._index.refresh, path)
+        return _track_ref(path, meta)
+
+    async def _require_tracks(self, mime_type: str) -> None:
+        await self._ensure_watching(mime_type=mime_type)
+        if self._cache:
+            return
+        if not await self._executor.run(self._music_dir.exists):
             raise RuntimeError(
-                f"No audio files found in {self._music_dir} (expected .mp3, or .ogg/.opus for audio/ogg)"
+                f"Music directory does not exist: {self._music_dir}. "
+                "If you're running in Docker, only mounted paths are visible inside the container "
+                "(by default ./music -> /music)."
             )
-
-        chooser = rng or random
-        path = chooser.choice(self._cache)
-        title = path.stem
-        duration = _try_duration_seconds(path)
-        try:
-            byte_size = path.stat().st_size
-        except Exception:
-            byte_size = None
-        return TrackRef(
-            title=title,
-            duration_seconds=duration,
-            byte_size=(int(byte_size) if isinstance(byte_size, int) else None),
-            ref=_LocalTrack(path=path),
+        raise RuntimeError(
+            f"No audio files found in {self._music_dir} (expected .mp3, or .ogg/.opus for audio/ogg)"
         )
 
     async def stream_track(self, track: TrackRef, chunk_size: int) -> AsyncIterator[bytes]:
@@ -66,46 +103,121 @@ class LocalLibrarySource:
                     break
                 yield chunk
 
-    def _refresh_cache_if_needed(self, mime_type: str) -> None:
-        now = time_module.time()
-        if now - self._cache_ts < 10 and self._cache:
-            return
-
-        exts = _extensions_for_mime(mime_type)
-        if not self._music_dir.exists():
-            self._cache = []
-            self._cache_ts = now
-            return
+    async def close(self) -> None:
+        if self._watcher is not None:
+            await self._watcher.close()
+            self._watcher = None
+        for task in list(self._index_tasks):
+            task.cancel()
 
-        files: list[Path] = []
-        for path in self._music_dir.rglob("*"):
-            if path.is_file() and path.suffix.lower() in exts:
-                files.append(path)
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Call `callback` whenever the set of tracks changes."""
+        self._listeners.append(callback)
 
-        files.sort(key=str)
+    def watch_mode(self) -> str | None:
+        return self._watcher.mode if self._watcher is not None else None
 
-        self._cache = files
-        self._cache_ts = now
+    async def _ensure_watching(self, mime_type: str) -> None:
+        if self._watcher is not None:
+            return
+        async with self._watcher_lock:
+            if self._watcher is not None:
+                return
+            watcher = LibraryWatcher(
+                root=self._music_dir,
+                exts=_extensions_for_mime(mime_type),
+                on_change=self._apply_changes,
+                mode=self._watch_mode,
+                poll_interval=self._poll_interval,
+                run_blocking=self._executor.run,
+            )
+            # The initial walk runs off the event loop and reports every file as added.
+            await watcher.start()
+            self._watcher = watcher
+            # Index entries of files that disappeared while the server was down.
+            gone = await self._executor.run(self._unlisted_index_paths, set(self._cache_keys))
+            await self._forget_files(gone)
+
+    def _apply_changes(self, added: list[FileStat], removed: list[Path]) -> None:
+        size_before = len(self._cache_keys)
+        changed = False
+        for path in removed:
+            key = str(path)
+            i = bisect.bisect_left(self._cache_keys, key)
+            if i < len(self._cache_keys) and self._cache_keys[i] == key:
+                del self._cache_keys[i]
+                del self._cache[i]
+                changed = True
+        if removed:
+            # Before any re-index of the same paths below: both hold `_index_lock`.
+            self._spawn_index_task(self._forget_files([str(p) for p in removed]))
+
+        stale: list[tuple[Path, os.stat_result]] = []
+        if len(added) > _BULK_INSERT:
+            # Initial walk / resync: one sort beats thousands of list inserts.
+            merged = {key: path for key, path in zip(self._cache_keys, self._cache)}
+            merged.update((str(path), path) for path, _ in added)
+            self._cache_keys = sorted(merged)
+            self._cache = [merged[key] for key in self._cache_keys]
+            changed = changed or len(self._cache_keys) != size_before
+        for path, st in added:
+            key = str(path)
+            if len(added) <= _BULK_INSERT:
+                i = bisect.bisect_left(self._cache_keys, key)
+                if i == len(self._cache_keys) or self._cache_keys[i] != key:
+                    self._cache_keys.insert(i, key)
+                    self._cache.insert(i, path)
+                    changed = True
+            if not self._index.is_fresh(key, st.st_size, st.st_mtime_ns):
+                stale.append((path, st))
+        if changed:
+            self._cache_version += 1
+            for callback in self._listeners:
+                callback()
+
+        if stale:
+            self._spawn_index_task(self._index_files(stale))
+
+    def _spawn_index_task(self, coro: Coroutine[Any, Any, None]) -> None:
+        task = asyncio.create_task(coro, name="yurets-local-index")
+        self._index_tasks.add(task)
+        task.add_done_callback(self._index_tasks.discard)
+
+    def _unlisted_index_paths(self, known: set[str]) -> list[str]:
+        return [p for p in self._index.paths_under(self._music_dir) if p not in known]
+
+    async def _forget_files(self, keys: list[str]) -> None:
+        if not keys:
+            return
+        try:
+            async with self._index_lock:
+                await self._executor.run(self._index.forget, keys)
+        except Exception:
+            logger.exception("Local index update failed (music_dir=%s)", self._music_dir)
+
+    async def _index_files(self, items: list[tuple[Path, os.stat_result]]) -> None:
+        for i in range(0, len(items), _INDEX_BATCH):
+            batch = items[i : i + _INDEX_BATCH]
+            try:
+                async with self._index_lock:
+                    await self._executor.run(self._index.refresh_many, batch)
+            except Exception:
+                logger.exception("Local index update failed (music_dir=%s)", self._music_dir)
+                return
+
+
+def _track_ref(path: Path, meta: LocalTrackMeta | None) -> TrackRef:
+    duration = meta.duration_seconds if meta is not None else None
+    return TrackRef(
+        title=path.stem,
+        duration_seconds=(int(duration) if duration is not None else None),
+        byte_size=(meta.size if meta is not None else None),
+        bitrate_kbps=(meta.bitrate_kbps if meta is not None else None),
+        ref=_LocalTrack(path=path),
+    )
 
 
 def _extensions_for_mime(mime_type: str) -> set[str]:
     if mime_type == "audio/ogg":
         return {".ogg", ".opus"}
     return {".mp3"}
-
-
-def _try_duration_seconds(path: Path) -> int | None:
-    if MutagenFile is None:
-        return None
-    try:
-        mf = MutagenFile(path)  # type: ignore[misc]
-        mf_any: Any = mf  # type: ignore[assignment]
-        info: Any = getattr(mf_any, "info", None)  # type: ignore[arg-type]
-        if info is None:
-            return None
-        length = getattr(info, "length", None)
-        if length is None:
-            return None
-        return int(length)
-    except Exception:
-        return None
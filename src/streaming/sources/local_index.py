@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+try:
+    from mutagen import File as MutagenFile  # type: ignore
+except Exception:  # pragma: no cover
+    MutagenFile = None
+
+logger = logging.getLogger(__name__)
+
+# Tags worth keeping for display/diagnostics. Everything else is dropped to keep the index small.
+_TAG_KEYS = ("title", "artist", "album", "date", "genre")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    duration REAL,
+    bitrate_kbps INTEGER,
+    codec TEXT,
+    tags TEXT NOT NULL DEFAULT '{}'
+)
+"""
+
+
+@dataclass(frozen=True)
+class LocalTrackMeta:
+    path: str
+    size: int
+    mtime_ns: int
+    duration_seconds: float | None = None
+    bitrate_kbps: int | None = None
+    codec: str | None = None
+    tags: dict[str, str] = field(default_factory=dict)
+
+
+class LocalTrackIndex:
+    """Persistent metadata index for local audio files.
+
+    Backed by SQLite and mirrored in memory: lookups never touch the disk or parse
+    audio. Entries are keyed by absolute path and revalidated by (size, mtime), so
+    only new or changed files are parsed again, including across restarts.
+
+    `refresh()`/`refresh_many()`/`forget()` do blocking I/O and must be called off the
+    event loop, as should `paths_under()` on big libraries.
+    """
+
+    def __init__(self, db_path: str | None) -> None:
+        self._lock = threading.Lock()
+        self._conn = _open_db(db_path)
+        self._entries: dict[str, LocalTrackMeta] = {}
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, path: str) -> LocalTrackMeta | None:
+        return self._entries.get(path)
+
+    def is_fresh(self, path: str, size: int, mtime_ns: int) -> bool:
+        meta = self._entries.get(path)
+        return meta is not None and meta.size == size and meta.mtime_ns == mtime_ns
+
+    def paths_under(self, root: Path) -> list[str]:
+        prefix = str(root).rstrip(os.sep) + os.sep
+        # A snapshot: other pool threads may update the index meanwhile.
+        return [p for p in list(self._entries) if p.startswith(prefix)]
+
+    def refresh(self, path: Path, st: os.stat_result | None = None) -> LocalTrackMeta | None:
+        return next(iter(self.refresh_many([(path, st)])), None)
+
+    def refresh_many(
+        self, items: Iterable[tuple[Path, os.stat_result | None]]
+    ) -> list[LocalTrackMeta]:
+        """Parse the given files and upsert them into the index (one transaction)."""
+
+        out: list[LocalTrackMeta] = []
+        for path, st in items:
+            try:
+                st = st or path.stat()
+            except OSError:
+                continue
+            key = str(path)
+            if self.is_fresh(key, st.st_size, st.st_mtime_ns):
+                out.append(self._entries[key])
+                continue
+            out.append(_parse(key, st))
+
+        if out:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO tracks"
+                    " (path, size, mtime_ns, duration, bitrate_kbps, codec, tags)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            m.path,
+                            m.size,
+                            m.mtime_ns,
+                            m.duration_seconds,
+                            m.bitrate_kbps,
+                            m.codec,
+                            json.dumps(m.tags, ensure_ascii=False),
+                        )
+                        for m in out
+                    ],
+                )
+            for m in out:
+                self._entries[m.path] = m
+        return out
+
+    def forget(self, paths: Iterable[str]) -> None:
+        keys = [p for p in paths if p in self._entries]
+        if not keys:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM tracks WHERE path = ?", [(k,) for k in keys])
+        for k in keys:
+            self._entries.pop(k, None)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _load(self) -> None:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, size, mtime_ns, duration, bitrate_kbps, codec, tags FROM tracks"
+            ).fetchall()
+        for path, size, mtime_ns, duration, bitrate_kbps, codec, tags in rows:
+            try:
+                tag_map = json.loads(tags) if tags else {}
+            except ValueError:
+                tag_map = {}
+            self._entries[path] = LocalTrackMeta(
+                path=path,
+                size=int(size),
+                mtime_ns=int(mtime_ns),
+                duration_seconds=duration,
+                bitrate_kbps=bitrate_kbps,
+                codec=codec,
+                tags=tag_map,
+            )
+
+
+def _open_db(db_path: str | None) -> sqlite3.Connection:
+    target = (db_path or "").strip() or ":memory:"
+    if target != ":memory:":
+        try:
+            Path(target).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(target, check_same_thread=False)
+            conn.execute(_SCHEMA)
+            return conn
+        except (OSError, sqlite3.Error):
+            logger.warning(
+                "Local index at %s is not writable; falling back to in-memory index", target
+            )
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.execute(_SCHEMA)
+    return conn
+
+
+def _parse(path: str, st: os.stat_result) -> LocalTrackMeta:
+    duration: float | None = None
+    bitrate_kbps: int | None = None
+    codec: str | None = None
+    tags: dict[str, str] = {}
+
+    if MutagenFile is not None:
+        try:
+            mf: Any = MutagenFile(path, easy=True)  # type: ignore[misc]
+        except Exception:
+            mf = None
+        if mf is not None:
+            codec = type(mf).__name__.lower()
+            info: Any = getattr(mf, "info", None)
+            length = getattr(info, "length", None)
+            if isinstance(length, (int, float)) and length > 0:
+                duration = float(length)
+            bitrate = getattr(info, "bitrate", None)
+            if isinstance(bitrate, int) and bitrate > 0:
+                bitrate_kbps = int(round(bitrate / 1000))
+            raw_tags: Any = getattr(mf, "tags", None)
+            if raw_tags is not None:
+                for k in _TAG_KEYS:
+                    try:
+                        v = raw_tags.get(k)
+                    except Exception:
+                        v = None
+                    if isinstance(v, list) and v:
+                        v = v[0]
+                    if isinstance(v, str) and v.strip():
+                        tags[k] = v.strip()
+
+    return LocalTrackMeta(
+        path=path,
+        size=int(st.st_size),
+        mtime_ns=int(st.st_mtime_ns),
+        duration_seconds=duration,
+        bitrate_kbps=bitrate_kbps,
+        codec=codec,
+        tags=tags,
+    )
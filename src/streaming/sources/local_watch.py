@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import stat
+import struct
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+FileStat = tuple[Path, os.stat_result]
+ChangeCallback = Callable[[list[FileStat], list[Path]], None]
+RunBlocking = Callable[..., Awaitable[Any]]
+
+# inotify(7) constants.
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (
+    _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+    | _IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class LibraryWatcher:
+    """Keeps the set of audio files under `root` in sync with the filesystem.
+
+    The initial walk runs in a worker thread. After that changes are applied
+    incrementally and reported through `on_change(added, removed)`:
+
+    - "inotify": kernel events per directory (Linux only, local filesystems);
+    - "poll": every `poll_interval` seconds stat each known directory and rescan only
+      those whose mtime changed (works on NAS mounts where inotify sees nothing);
+    - "auto": inotify if available, otherwise poll.
+
+    `added` may contain files that are already known but changed on disk.
+    Blocking work goes through `run_blocking` (defaults to `asyncio.to_thread`).
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        exts: set[str],
+        on_change: ChangeCallback,
+        mode: str = "auto",
+        poll_interval: float = 10.0,
+        run_blocking: RunBlocking | None = None,
+    ) -> None:
+        self._root = root
+        self._run_blocking: RunBlocking = run_blocking or asyncio.to_thread
+        self._exts = exts
+        self._on_change = on_change
+        self._requested_mode = mode
+        self._poll_interval = max(0.5, float(poll_interval))
+
+        self._dir_mtimes: dict[Path, int] = {}
+        self._dir_files: dict[Path, dict[Path, int]] = {}
+        self._dir_children: dict[Path, set[Path]] = {}
+
+        self._inotify: _Inotify | None = None
+        self._inotify_failed = False
+        self._wd_dirs: dict[int, Path] = {}
+        self._dir_wds: dict[Path, int] = {}
+        self._raw_events: list[bytes] = []
+        self._wakeup = asyncio.Event()
+
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def mode(self) -> str:
+        return "inotify" if self._inotify is not None else "poll"
+
+    def file_count(self) -> int:
+        return sum(len(files) for files in self._dir_files.values())
+
+    async def start(self) -> None:
+        if self._requested_mode in {"auto", "inotify"}:
+            try:
+                self._inotify = _Inotify()
+            except OSError as exc:
+                logger.warning("inotify unavailable (%s); polling %s instead", exc, self._root)
+
+        added, _ = await self._run_blocking(self._walk_root)
+        if self._inotify is not None and self._inotify_failed:
+            self._switch_to_polling()
+        if self._inotify is not None:
+            asyncio.get_running_loop().add_reader(self._inotify.fd, self._on_inotify_readable)
+        self._on_change(added, [])
+
+        self._task = asyncio.create_task(self._run(), name=f"yurets-library-watch:{self._root}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._close_inotify()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self._inotify is not None:
+                    await self._wait_inotify()
+                    raw = b"".join(self._raw_events)
+                    self._raw_events.clear()
+                    added, removed = await self._run_blocking(self._apply_events, raw)
+                    if self._inotify_failed:
+                        self._switch_to_polling()
+                else:
+                    await asyncio.sleep(self._poll_interval)
+                    added, removed = await self._run_blocking(self._poll_once)
+                if added or removed:
+                    self._on_change(added, removed)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Library watcher error (root=%s)", self._root)
+                await asyncio.sleep(self._poll_interval)
+
+    async def _wait_inotify(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self._poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    def _on_inotify_readable(self) -> None:
+        if self._inotify is None:
+            return
+        self._raw_events.extend(self._inotify.read_available())
+        self._wakeup.set()
+
+    def _switch_to_polling(self) -> None:
+        logger.warning("inotify watch limit reached; polling %s instead", self._root)
+        self._close_inotify()
+
+    def _close_inotify(self) -> None:
+        if self._inotify is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(self._inotify.fd)
+        except RuntimeError:
+            pass
+        self._inotify.close()
+        self._inotify = None
+        self._wd_dirs.clear()
+        self._dir_wds.clear()
+
+    # --- blocking helpers (run in a worker thread) ---
+
+    def _walk_root(self) -> tuple[list[FileStat], list[Path]]:
+        added: list[FileStat] = []
+        removed: list[Path] = []
+        if self._root in self._dir_mtimes:
+            self._drop_tree(self._root, removed)
+        self._add_tree(self._root, added)
+        return added, removed
+
+    def _poll_once(self) -> tuple[list[FileStat], list[Path]]:
+        added: list[FileStat] = []
+        removed: list[Path] = []
+
+        if self._root not in self._dir_mtimes:
+            self._add_tree(self._root, added)
+            return added, removed
+
+        for d in list(self._dir_mtimes):
+            if d not in self._dir_mtimes:
+                # Dropped together with its parent during this pass.
+                continue
+            try:
+                mtime_ns = os.stat(d).st_mtime_ns
+            except OSError:
+                self._drop_tree(d, removed)
+                continue
+            if mtime_ns != self._dir_mtimes[d]:
+                self._rescan_dir(d, added, removed)
+        return added, removed
+
+    def _apply_events(self, raw: bytes) -> tuple[list[FileStat], list[Path]]:
+        added: list[FileStat] = []
+        removed: list[Path] = []
+        overflow = False
+
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(raw):
+            wd, mask, _cookie, name_len = _EVENT_HEADER.unpack_from(raw, offset)
+            offset += _EVENT_HEADER.size
+            name = raw[offset : offset + name_len].split(b"\0", 1)[0]
+            offset += name_len
+
+            if mask & _IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            d = self._wd_dirs.get(wd)
+            if d is None:
+                continue
+            if mask & _IN_IGNORED:
+                self._wd_dirs.pop(wd, None)
+                self._dir_wds.pop(d, None)
+                continue
+            if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                if d in self._dir_mtimes:
+                    self._drop_tree(d, removed)
+                continue
+            if not name:
+                continue
+
+            path = d / os.fsdecode(name)
+            if mask & _IN_ISDIR:
+                if mask & (_IN_DELETE | _IN_MOVED_FROM) and path in self._dir_mtimes:
+                    self._drop_tree(path, removed)
+                if mask & (_IN_CREATE | _IN_MOVED_TO) and d in self._dir_mtimes:
+                    self._add_tree(path, added)
+                    self._dir_children.setdefault(d, set()).add(path)
+                continue
+
+            files = self._dir_files.get(d)
+            if files is None:
+                continue
+            if mask & (_IN_DELETE | _IN_MOVED_FROM) and path in files:
+                del files[path]
+                removed.append(path)
+            if mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO) and path.suffix.lower() in self._exts:
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                if stat.S_ISREG(st.st_mode):
+                    files[path] = st.st_mtime_ns
+                    added.append((path, st))
+
+        if overflow:
+            # Events were lost: resync against a fresh walk.
+            before = {p for files in self._dir_files.values() for p in files}
+            fresh: list[FileStat] = []
+            dropped: list[Path] = []
+            if self._root in self._dir_mtimes:
+                self._drop_tree(self._root, dropped)
+            self._add_tree(self._root, fresh)
+            after = {p for p, _ in fresh}
+            return fresh, [p for p in before if p not in after]
+
+        if self._root not in self._dir_mtimes and self._root.is_dir():
+            # Library root came back (e.g. remounted).
+            self._add_tree(self._root, added)
+        return added, removed
+
+    def _add_tree(self, top: Path, added: list[FileStat]) -> None:
+        pending = [top]
+        while pending:
+            d = pending.pop()
+            self._watch_dir(d)
+            scanned = self._scan_dir(d)
+            if scanned is None:
+                self._unwatch_dir(d)
+                continue
+            mtime_ns, files, subdirs = scanned
+            self._dir_mtimes[d] = mtime_ns
+            self._dir_files[d] = {p: st.st_mtime_ns for p, st in files}
+            self._dir_children[d] = set(subdirs)
+            added.extend(files)
+            pending.extend(subdirs)
+
+    def _drop_tree(self, top: Path, removed: list[Path]) -> None:
+        pending = [top]
+        while pending:
+            d = pending.pop()
+            self._dir_mtimes.pop(d, None)
+            removed.extend(self._dir_files.pop(d, {}))
+            pending.extend(self._dir_children.pop(d, ()))
+            self._unwatch_dir(d)
+        parent = self._dir_children.get(top.parent)
+        if parent is not None:
+            parent.discard(top)
+
+    def _rescan_dir(self, d: Path, added: list[FileStat], removed: list[Path]) -> None:
+        scanned = self._scan_dir(d)
+        if scanned is None:
+            self._drop_tree(d, removed)
+            return
+        mtime_ns, files, subdirs = scanned
+        self._dir_mtimes[d] = mtime_ns
+
+        old_files = self._dir_files.get(d, {})
+        new_files = {p: st.st_mtime_ns for p, st in files}
+        removed.extend(p for p in old_files if p not in new_files)
+        added.extend((p, st) for p, st in files if old_files.get(p) != st.st_mtime_ns)
+        self._dir_files[d] = new_files
+
+        old_children = self._dir_children.get(d, set())
+        new_children = set(subdirs)
+        for gone in old_children - new_children:
+            self._drop_tree(gone, removed)
+        for fresh in new_children - old_children:
+            self._add_tree(fresh, added)
+        self._dir_children[d] = new_children
+
+    def _scan_dir(self, d: Path) -> tuple[int, list[FileStat], list[Path]] | None:
+        try:
+            mtime_ns = os.stat(d).st_mtime_ns
+            entries = list(os.scandir(d))
+        except OSError:
+            return None
+
+        files: list[FileStat] = []
+        subdirs: list[Path] = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(Path(entry.path))
+                    continue
+                if os.path.splitext(entry.name)[1].lower() not in self._exts:
+                    continue
+                st = entry.stat()
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                files.append((Path(entry.path), st))
+        return mtime_ns, files, subdirs
+
+    def _watch_dir(self, d: Path) -> None:
+        if self._inotify is None or self._inotify_failed or d in self._dir_wds:
+            return
+        try:
+            wd = self._inotify.add_watch(d, _WATCH_MASK)
+        except OSError as exc:
+            if exc.errno == 28:  # ENOSPC: max_user_watches exhausted
+                self._inotify_failed = True
+            return
+        self._wd_dirs[wd] = d
+        self._dir_wds[d] = wd
+
+    def _unwatch_dir(self, d: Path) -> None:
+        wd = self._dir_wds.pop(d, None)
+        if wd is None:
+            return
+        self._wd_dirs.pop(wd, None)
+        if self._inotify is not None:
+            self._inotify.rm_watch(wd)
+
+
+class _Inotify:
+    """Minimal ctypes binding for Linux inotify(7)."""
+
+    def __init__(self) -> None:
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        try:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            self._add = libc.inotify_add_watch
+            self._rm = libc.inotify_rm_watch
+            init1 = libc.inotify_init1
+        except (OSError, AttributeError) as exc:
+            raise OSError("inotify is not supported on this platform") from exc
+        self._add.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        fd = init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.fd = int(fd)
+
+    def add_watch(self, path: Path, mask: int) -> int:
+        wd = self._add(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        return int(wd)
+
+    def rm_watch(self, wd: int) -> None:
+        self._rm(self.fd, wd)
+
+    def read_available(self) -> list[bytes]:
+        out: list[bytes] = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except (BlockingIOError, InterruptedError):
+                break
+            if not data:
+                break
+            out.append(data)
+        return out
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from src.settings import Settings
+from src.streaming.sources.executor import BoundedExecutor
+from src.streaming.sources.local import LocalLibrarySource
+from src.streaming.sources.local_index import LocalTrackIndex
+from src.streaming.sources.telegram import TelegramChannelSource, TelegramSession
+
+# (source id, key, mime type): a library or channel as seen by one stream format.
+SourceKey = tuple[str, str, str]
+
+
+class SourcePool:
+    """Sources and their heavy state, shared by every station (mount) of the process.
+
+    One Telegram session (with its media cache, downloader and channel index), one local
+    metadata index with its executor, and one source object per (library or channel,
+    stream format): two mounts playing the same folder share its watcher and catalog.
+    Sources are closed once no station references them any more.
+    """
+
+    def __init__(self, settings: Settings) -> None:
+        self.local_index = LocalTrackIndex(settings.local_index_path)
+        self.local_executor = BoundedExecutor(
+            max_workers=settings.local_metadata_workers, name="yurets-local-meta"
+        )
+        self.telegram_session = TelegramSession(settings=settings.telegram())
+        self._watch_mode = settings.local_watch_mode
+        self._poll_interval = settings.local_poll_interval_seconds
+        self._local_sources: dict[SourceKey, LocalLibrarySource] = {}
+        self._telegram_sources: dict[SourceKey, TelegramChannelSource] = {}
+        self._telegram_lock = asyncio.Lock()
+        self._listeners: dict[SourceKey, list[Callable[[], None]]] = {}
+        # Per station: callable returning the source keys it still needs.
+        self._users: list[Callable[[], set[SourceKey]]] = []
+
+    def register(self, referenced: Callable[[], set[SourceKey]]) -> None:
+        self._users.append(referenced)
+
+    async def start_telegram(self) -> None:
+        async with self._telegram_lock:
+            await self.telegram_session.startup()
+
+    def local_source(
+        self, music_dir: Path, mime_type: str, on_change: Callable[[], None]
+    ) -> LocalLibrarySource:
+        key: SourceKey = ("local", str(music_dir), mime_type)
+        src = self._local_sources.get(key)
+        if src is None:
+            src = LocalLibrarySource(
+                music_dir=music_dir,
+                index=self.local_index,
+                watch_mode=self._watch_mode,
+                poll_interval=self._poll_interval,
+                executor=self.local_executor,
+            )
+            self._local_sources[key] = src
+        self._listen(key, src, on_change)
+        return src
+
+    def telegram_source(
+        self, channel: str, mime_type: str, on_change: Callable[[], None]
+    ) -> TelegramChannelSource:
+        key: SourceKey = ("telegram", channel, mime_type)
+        src = self._telegram_sources.get(key)
+        if src is None:
+            src = TelegramChannelSource(session=self.telegram_session, channel=channel)
+            self._telegram_sources[key] = src
+        self._listen(key, src, on_change)
+        return src
+
+    def _listen(
+        self,
+        key: SourceKey,
+        src: LocalLibrarySource | TelegramChannelSource,
+        on_change: Callable[[], None],
+    ) -> None:
+        registered = self._listeners.setdefault(key, [])
+        if on_change not in registered:
+            registered.append(on_change)
+            src.add_listener(on_change)
+
+    async def release_unused(self) -> list[SourceKey]:
+        """Close sources no station references; returns their keys."""
+
+        keep: set[SourceKey] = set()
+        for referenced in self._users:
+            keep |= referenced()
+        released: list[SourceKey] = []
+        for key, local_source in list(self._local_sources.items()):
+            if key not in keep:
+                del self._local_sources[key]
+                self._listeners.pop(key, None)
+                released.append(key)
+                await local_source.close()
+        for key, tg_source in list(self._telegram_sources.items()):
+            if key not in keep:
+                del self._telegram_sources[key]
+                self._listeners.pop(key, None)
+                released.append(key)
+                tg_source.close()
+        return released
+
+    def local_stats(self) -> dict[str, Any]:
+        return {
+            "executor": self.local_executor.stats(),
+            "indexed_tracks": len(self.local_index),
+            "watch_modes": {key[1]: src.watch_mode() for key, src in self._local_sources.items()},
+        }
+
+    def telegram_channel_stats(self) -> dict[str, Any]:
+        return {key[1]: src.sync_stats() for key, src in self._telegram_sources.items()}
+
+    async def close(self) -> None:
+        for local_source in list(self._local_sources.values()):
+            await local_source.close()
+        for tg_source in list(self._telegram_sources.values()):
+            tg_source.close()
+        self._local_sources.clear()
+        self._telegram_sources.clear()
+        await self.telegram_session.shutdown()
+        self.local_executor.shutdown()
+        self.local_index.close()
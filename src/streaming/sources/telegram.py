@@ -1,28 +1,55 @@
 from __future__ import annotations
 
+import asyncio
+import bisect
+import logging
 import random
 import sys
 import time as time_module
+from collections.abc import Callable, Iterable
 from dataclasses import dataclass
+from pathlib import Path
 from typing import Any, AsyncIterator, cast
 
-from telethon import TelegramClient  # type: ignore[import-untyped]
+import aiofiles
+from telethon import TelegramClient, errors, events, types  # type: ignore[import-untyped]
 
 from src.settings import TelegramSettings
-from src.streaming.sources.base import TrackRef
+from src.streaming.sources.base import TrackCatalog, TrackRef
+from src.streaming.sources.telegram_cache import TelegramMediaCache, cache_key_for
+from src.streaming.sources.telegram_download import ParallelDownloader
+from src.streaming.sources.telegram_index import (
+    ChannelSyncState,
+    TelegramChannelIndex,
+    TelegramTrackMeta,
+)
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass(frozen=True)
 class _TelegramTrack:
     client: TelegramClient
     media: object
+    # (document id, access hash) key for the on-disk media cache, if the media has one.
+    cache_key: str | None = None
+    # Message carrying the document, used to refresh an expired file reference.
+    msg_id: int = 0
 
 
 class TelegramSession:
     def __init__(self, settings: TelegramSettings) -> None:
         self._settings = settings
         self._client: TelegramClient | None = None
+        self._index: TelegramChannelIndex | None = None
         self._channel_labels: dict[str, str] = {}
+        self.media_cache = TelegramMediaCache(
+            cache_dir=Path(settings.cache_dir),
+            max_bytes=(settings.cache_max_mb * 1024 * 1024 if settings.cache_dir else 0),
+        )
+        self.downloader = ParallelDownloader(
+            max_parallel=settings.download_parallel, part_size=settings.download_part_size
+        )
 
     def configured(self) -> bool:
         return bool(self._settings.api_id and self._settings.api_hash)
@@ -34,6 +61,31 @@ class TelegramSession:
     def fetch_limit(self) -> int:
         return self._settings.fetch_limit
 
+    @property
+    def catchup_interval(self) -> float:
+        return self._settings.catchup_interval
+
+    @property
+    def full_refresh_interval(self) -> float:
+        return self._settings.full_refresh_interval
+
+    @property
+    def full_history(self) -> bool:
+        return self._settings.full_history
+
+    @property
+    def backfill_pause(self) -> float:
+        return self._settings.backfill_pause
+
+    @property
+    def index(self) -> TelegramChannelIndex:
+        if self._index is None:
+            raise RuntimeError("Telegram session is not started")
+        return self._index
+
+    def indexed_tracks(self) -> int:
+        return len(self._index) if self._index is not None else 0
+
     @property
     def client(self) -> TelegramClient:
         if self._client is None:
@@ -41,9 +93,13 @@ class TelegramSession:
         return self._client
 
     async def startup(self) -> None:
-        if not self.configured():
+        if not self.configured() or self._client is not None:
             return
 
+        await self.media_cache.open()
+        if self._index is None:
+            self._index = TelegramChannelIndex(self._settings.index_path)
+
         api_id = cast(int, self._settings.api_id)
         api_hash = cast(str, self._settings.api_hash)
         client = TelegramClient(self._settings.session, api_id, api_hash)
@@ -74,6 +130,9 @@ class TelegramSession:
         if self._client is not None:
             await self._client.disconnect()  # type: ignore[misc]
             self._client = None
+        if self._index is not None:
+            self._index.close()
+            self._index = None
         self._channel_labels.clear()
 
     async def display_name(self, channel: str) -> str:
@@ -114,8 +173,29 @@ class TelegramChannelSource:
     def __init__(self, session: TelegramSession, channel: str) -> None:
         self._session = session
         self._channel = channel
-        self._candidates: list[TrackRef] = []
-        self._cache_ts: float = 0.0
+        # Keyed by message id; keys sorted by id so a seeded shuffle is reproducible.
+        self._by_key: dict[str, TrackRef] = {}
+        self._keys: list[str] = []
+        self._keys_version = 0
+        self._listeners: list[Callable[[], None]] = []
+
+        # Incremental sync: tracks come from the persistent channel index, then
+        # new/edited/deleted message events keep them current, plus a cheap `min_id`
+        # catch-up for anything missed while disconnected. Older history is back-filled
+        # in pages in the background.
+        self._exts: set[str] | None = None
+        self._client: TelegramClient | None = None
+        self._handlers: list[tuple[Callable[..., Any], object]] = []
+        self._backfill_task: asyncio.Task[None] | None = None
+        self._max_id = 0
+        self._full_sync_at: float | None = None
+        self._catchup_at = 0.0
+        self._was_connected = True
+        self._full_syncs_total = 0
+        self._catchups_total = 0
+        self._events_total = 0
+        self._backfill_pages_total = 0
+        self._references_refreshed_total = 0
 
     @property
     def channel(self) -> str:
@@ -133,57 +213,388 @@ class TelegramChannelSource:
         if not self._channel:
             raise RuntimeError("Telegram channel key is missing in schedule")
 
-        await self._refresh_candidates_if_needed(mime_type=mime_type)
-        if not self._candidates:
+        await self._sync(mime_type=mime_type)
+        if not self._keys:
             raise RuntimeError("No suitable audio messages found in Telegram channel")
 
         chooser = rng or random
-        return chooser.choice(self._candidates)
+        return self._by_key[chooser.choice(self._keys)]
+
+    async def catalog(self, mime_type: str) -> TrackCatalog:
+        if not self.enabled():
+            raise RuntimeError("Telegram session is not configured")
+        if not self._channel:
+            raise RuntimeError("Telegram channel key is missing in schedule")
+
+        await self._sync(mime_type=mime_type)
+        if not self._keys:
+            raise RuntimeError("No suitable audio messages found in Telegram channel")
+        return TrackCatalog(version=self._keys_version, keys=self._keys)
+
+    def track_title(self, key: str) -> str:
+        track = self._by_key.get(key)
+        return track.title if track is not None else key
+
+    async def resolve_track(self, key: str) -> TrackRef:
+        track = self._by_key.get(key)
+        if track is None:
+            raise RuntimeError(f"Telegram message {key} is no longer available")
+        return track
 
     async def stream_track(self, track: TrackRef, chunk_size: int) -> AsyncIterator[bytes]:
         tg: _TelegramTrack = track.ref  # type: ignore[assignment]
+        started = False
+        try:
+            async for chunk in self._stream_cached(track, chunk_size):
+                started = True
+                yield chunk
+            return
+        except errors.FileReferenceExpiredError:
+            if started or not tg.msg_id:
+                raise
+        # File references expire (indexed tracks may be days old); the message itself
+        # carries a fresh one.
+        track = await self._refresh_reference(tg)
+        async for chunk in self._stream_cached(track, chunk_size):
+            yield chunk
+
+    async def _stream_cached(self, track: TrackRef, chunk_size: int) -> AsyncIterator[bytes]:
+        tg: _TelegramTrack = track.ref  # type: ignore[assignment]
+        cache = self._session.media_cache
+        if tg.cache_key is None:
+            async for chunk in self._download(tg, track.byte_size, chunk_size):
+                yield chunk
+            return
+
+        path = cache.lookup(tg.cache_key)
+        if path is not None:
+            try:
+                f = await aiofiles.open(path, "rb")
+            except OSError:
+                # Removed behind our back: forget it and download again.
+                cache.forget(tg.cache_key)
+            else:
+                try:
+                    await cache.touch(path)
+                    while True:
+                        chunk = await f.read(chunk_size)
+                        if not chunk:
+                            break
+                        cache.count_hit_bytes(len(chunk))
+                        yield chunk
+                finally:
+                    await f.close()
+                return
+
+        # Miss: stream from Telegram and fill the cache on the way. The file is published
+        # only if the download ran to the end (not when the track was cut short).
+        fill = cache.start_fill(tg.cache_key, expected_size=track.byte_size)
+        if fill is None:
+            async for chunk in self._download(tg, track.byte_size, chunk_size):
+                yield chunk
+            return
+        completed = False
+        try:
+            async for chunk in self._download(tg, track.byte_size, chunk_size):
+                await fill.write(chunk)
+                yield chunk
+            completed = True
+        finally:
+            if completed:
+                await fill.commit()
+            else:
+                await fill.abort()
+
+    async def _download(
+        self, tg: _TelegramTrack, size: int | None, chunk_size: int
+    ) -> AsyncIterator[bytes]:
+        downloader = self._session.downloader
+        if downloader.enabled and size:
+            # Several ranges in flight at once; needs the size to split the document.
+            async for chunk in downloader.stream(tg.client, tg.media, size, chunk_size):
+                yield chunk
+            return
         async for chunk in tg.client.iter_download(tg.media, chunk_size=chunk_size):  # type: ignore[arg-type]
             if not chunk:
                 continue
-            yield bytes(chunk)  # type: ignore[arg-type]
+            yield chunk  # type: ignore[misc]
 
-    async def _refresh_candidates_if_needed(self, mime_type: str) -> None:
-        now = time_module.time()
-        if now - self._cache_ts < 15 and self._candidates:
-            return
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Call `callback` whenever the set of tracks changes."""
+        self._listeners.append(callback)
 
-        exts = _extensions_for_mime(mime_type)
+    def close(self) -> None:
+        if self._client is not None:
+            for callback, event in self._handlers:
+                self._client.remove_event_handler(callback, event)
+        self._handlers.clear()
+        self._client = None
+        if self._backfill_task is not None:
+            self._backfill_task.cancel()
+            self._backfill_task = None
+
+    def sync_stats(self) -> dict[str, Any]:
+        return {
+            "tracks": len(self._keys),
+            "max_message_id": self._max_id,
+            "full_syncs_total": self._full_syncs_total,
+            "catchups_total": self._catchups_total,
+            "events_total": self._events_total,
+            "backfill_pages_total": self._backfill_pages_total,
+            "backfill_running": self._backfill_task is not None and not self._backfill_task.done(),
+            "references_refreshed_total": self._references_refreshed_total,
+        }
+
+    async def _sync(self, mime_type: str) -> None:
         client = self._session.client
-        channel = self._channel
-
-        candidates: list[TrackRef] = []
-
-        async for msg in client.iter_messages(channel, limit=self._session.fetch_limit):  # type: ignore[misc]
+        now = time_module.monotonic()
+        if self._client is not client or self._exts != _extensions_for_mime(mime_type):
+            # First use, new session or different format: load the index and subscribe.
+            self.close()
+            self._exts = _extensions_for_mime(mime_type)
+            self._load_index(client)
+            if self._session.index.state(self._channel).max_id:
+                # Known channel: only fetch what was posted since the last run.
+                await self._catch_up(client)
+                self._full_sync_at = now
+            else:
+                await self._full_sync(client)
+            self._subscribe(client)
+            if self._session.full_history:
+                self._backfill_task = asyncio.create_task(
+                    self._backfill(client), name="yurets-tg-backfill"
+                )
+            return
+        if self._full_sync_at is None or now - self._full_sync_at >= (
+            self._session.full_refresh_interval
+        ):
+            # Rare safety net for edits/deletions whose events never arrived.
+            await self._full_sync(client)
+            return
+        connected = bool(client.is_connected())
+        reconnected = connected and not self._was_connected
+        self._was_connected = connected
+        if reconnected or now - self._catchup_at >= self._session.catchup_interval:
+            await self._catch_up(client)
+
+    def _load_index(self, client: TelegramClient) -> None:
+        index = self._session.index
+        self._by_key = {}
+        self._keys = []
+        self._max_id = index.state(self._channel).max_id
+        self._apply(client, index.tracks(self._channel).values(), [])
+        self._changed()
+
+    async def _full_sync(self, client: TelegramClient) -> None:
+        metas: list[TelegramTrackMeta] = []
+        seen: set[int] = set()
+        async for msg in client.iter_messages(self._channel, limit=self._session.fetch_limit):  # type: ignore[misc]
+            msg = cast(Any, msg)
+            seen.add(int(msg.id))
+            meta = _meta_from_message(msg)
+            if meta is not None:
+                metas.append(meta)
+
+        # Deletions can only be detected inside the fetched window.
+        gone: list[int] = []
+        if seen:
+            lowest = min(seen)
+            self._max_id = max(self._max_id, max(seen))
+            gone = [
+                i
+                for i in self._session.index.tracks(self._channel)
+                if i >= lowest and i not in seen
+            ]
+        await self._store(metas, gone)
+        now = time_module.monotonic()
+        self._full_sync_at = now
+        self._catchup_at = now
+        self._full_syncs_total += 1
+        if self._apply(client, metas, gone):
+            self._changed()
+
+    async def _catch_up(self, client: TelegramClient) -> None:
+        # Only messages newer than the newest one seen: usually an empty response.
+        metas: list[TelegramTrackMeta] = []
+        async for msg in client.iter_messages(self._channel, min_id=self._max_id):  # type: ignore[misc]
             msg = cast(Any, msg)
-            if not getattr(msg, "file", None):
+            self._max_id = max(self._max_id, int(msg.id))
+            meta = _meta_from_message(msg)
+            if meta is not None:
+                metas.append(meta)
+        await self._store(metas, [])
+        self._catchup_at = time_module.monotonic()
+        self._catchups_total += 1
+        if self._apply(client, metas, []):
+            self._changed()
+
+    async def _backfill(self, client: TelegramClient) -> None:
+        """Walk the channel history from the newest message down, one page at a time.
+
+        Progress is stored in the index, so a restart resumes where it stopped instead
+        of walking the history again.
+        """
+
+        page_size = max(1, self._session.fetch_limit)
+        state = self._session.index.state(self._channel)
+        before_id = state.backfill_before_id
+        done = state.backfill_done
+        while not done:
+            try:
+                page = [
+                    cast(Any, msg)
+                    async for msg in client.iter_messages(  # type: ignore[misc]
+                        self._channel, limit=page_size, offset_id=before_id
+                    )
+                ]
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Telegram history back-fill failed (%s): %s", self._channel, e)
+                await asyncio.sleep(60.0)
                 continue
 
-            name = getattr(msg.file, "name", None) or ""
-            if not any(name.lower().endswith(ext) for ext in exts):
+            metas = [m for m in map(_meta_from_message, page) if m is not None]
+            if page:
+                before_id = min(int(msg.id) for msg in page)
+                self._max_id = max(self._max_id, max(int(msg.id) for msg in page))
+            done = len(page) < page_size
+            await self._store(metas, [], backfill_before_id=before_id, backfill_done=done)
+            self._backfill_pages_total += 1
+            if self._apply(client, metas, []):
+                self._changed()
+            if not done:
+                await asyncio.sleep(self._session.backfill_pause)
+
+    async def _refresh_reference(self, tg: _TelegramTrack) -> TrackRef:
+        msg = await tg.client.get_messages(self._channel, ids=tg.msg_id)
+        meta = _meta_from_message(cast(Any, msg)) if msg is not None else None
+        if meta is None:
+            await self._store([], [tg.msg_id])
+            if self._apply(tg.client, [], [tg.msg_id]):
+                self._changed()
+            raise RuntimeError(f"Telegram message {tg.msg_id} is no longer available")
+        self._references_refreshed_total += 1
+        await self._store([meta], [])
+        self._apply(tg.client, [meta], [])
+        return self._track_from_meta(tg.client, meta)
+
+    def _subscribe(self, client: TelegramClient) -> None:
+        self._client = client
+        handlers: list[tuple[Callable[..., Any], object]] = [
+            (self._on_new_message, events.NewMessage(chats=self._channel)),
+            (self._on_new_message, events.MessageEdited(chats=self._channel)),
+            (self._on_deleted, events.MessageDeleted(chats=self._channel)),
+        ]
+        for callback, event in handlers:
+            client.add_event_handler(callback, event)
+        self._handlers = handlers
+
+    async def _on_new_message(self, event: Any) -> None:
+        self._events_total += 1
+        client = self._client
+        if client is None:
+            return
+        msg = event.message
+        self._max_id = max(self._max_id, int(msg.id))
+        meta = _meta_from_message(msg)
+        # An edit may turn an audio message into something else.
+        metas, gone = ([meta], []) if meta is not None else ([], [int(msg.id)])
+        await self._store(metas, gone)
+        if self._apply(client, metas, gone):
+            self._changed()
+
+    async def _on_deleted(self, event: Any) -> None:
+        self._events_total += 1
+        gone = [int(i) for i in getattr(event, "deleted_ids", None) or []]
+        await self._store([], gone)
+        if self._client is not None and self._apply(self._client, [], gone):
+            self._changed()
+
+    async def _store(
+        self,
+        metas: list[TelegramTrackMeta],
+        gone: list[int],
+        backfill_before_id: int | None = None,
+        backfill_done: bool | None = None,
+    ) -> None:
+        index = self._session.index
+        current = index.state(self._channel)
+        state = ChannelSyncState(
+            max_id=max(current.max_id, self._max_id),
+            backfill_before_id=(
+                current.backfill_before_id if backfill_before_id is None else backfill_before_id
+            ),
+            backfill_done=current.backfill_done if backfill_done is None else backfill_done,
+        )
+        await asyncio.to_thread(index.upsert, self._channel, metas, state)
+        if gone:
+            await asyncio.to_thread(index.forget, self._channel, gone)
+
+    def _apply(
+        self, client: TelegramClient, metas: Iterable[TelegramTrackMeta], gone: list[int]
+    ) -> bool:
+        """Update the track set in place; True if the set of keys changed."""
+
+        changed = False
+        for msg_id in gone:
+            changed = self._remove_key(str(msg_id)) or changed
+        exts = tuple(self._exts or ())
+        for meta in metas:
+            key = str(meta.msg_id)
+            if not meta.file_name.lower().endswith(exts):
+                changed = self._remove_key(key) or changed
                 continue
-
-            duration = _extract_duration_seconds(msg)
-            byte_size = getattr(getattr(msg, "file", None), "size", None)
-
-            title = name or (getattr(msg, "message", None) or f"Telegram track {msg.id}")
-            candidates.append(
-                TrackRef(
-                    title=title,
-                    duration_seconds=(
-                        int(duration) if isinstance(duration, (int, float)) else None
-                    ),
-                    byte_size=(int(byte_size) if isinstance(byte_size, (int, float)) else None),
-                    ref=_TelegramTrack(client=client, media=msg.media),
-                )
-            )
-
-        self._candidates = candidates
-        self._cache_ts = now
+            track = self._track_from_meta(client, meta)
+            if key in self._by_key:
+                self._by_key[key] = track
+                continue
+            self._by_key[key] = track
+            bisect.insort(self._keys, key, key=int)
+            changed = True
+        if not self._session.full_history:
+            # Without the history index, rotate over the newest fetch_limit tracks only.
+            while len(self._keys) > max(1, self._session.fetch_limit):
+                del self._by_key[self._keys.pop(0)]
+                changed = True
+        return changed
+
+    def _remove_key(self, key: str) -> bool:
+        if self._by_key.pop(key, None) is None:
+            return False
+        i = bisect.bisect_left(self._keys, int(key), key=int)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+        return True
+
+    def _changed(self) -> None:
+        self._keys_version += 1
+        for callback in self._listeners:
+            callback()
+
+    @staticmethod
+    def _track_from_meta(client: TelegramClient, meta: TelegramTrackMeta) -> TrackRef:
+        document = types.Document(
+            id=meta.doc_id,
+            access_hash=meta.access_hash,
+            file_reference=meta.file_reference,
+            date=None,
+            mime_type=meta.mime_type,
+            size=meta.size or 0,
+            dc_id=meta.dc_id,
+            attributes=[],
+        )
+        return TrackRef(
+            title=meta.title,
+            duration_seconds=meta.duration_seconds,
+            byte_size=meta.size,
+            ref=_TelegramTrack(
+                client=client,
+                media=document,
+                cache_key=cache_key_for(document),
+                msg_id=meta.msg_id,
+            ),
+        )
 
 
 def _extensions_for_mime(mime_type: str) -> set[str]:
@@ -192,6 +603,43 @@ def _extensions_for_mime(mime_type: str) -> set[str]:
     return {".mp3"}
 
 
+def _meta_from_message(msg: Any) -> TelegramTrackMeta | None:
+    """Index entry for an audio document message, or None for anything else."""
+
+    if not getattr(msg, "file", None):
+        return None
+    name = getattr(msg.file, "name", None) or ""
+    if not name.lower().endswith((".mp3", ".ogg", ".opus")):
+        return None
+    doc = getattr(msg, "document", None)
+    doc_id = getattr(doc, "id", None)
+    access_hash = getattr(doc, "access_hash", None)
+    file_reference = getattr(doc, "file_reference", None)
+    dc_id = getattr(doc, "dc_id", None)
+    if not (
+        isinstance(doc_id, int)
+        and isinstance(access_hash, int)
+        and isinstance(file_reference, bytes)
+        and isinstance(dc_id, int)
+    ):
+        return None
+
+    duration = _extract_duration_seconds(msg)
+    byte_size = getattr(msg.file, "size", None)
+    return TelegramTrackMeta(
+        msg_id=int(msg.id),
+        title=name or (getattr(msg, "message", None) or f"Telegram track {msg.id}"),
+        file_name=name,
+        size=(int(byte_size) if isinstance(byte_size, (int, float)) else None),
+        duration_seconds=(int(duration) if isinstance(duration, (int, float)) else None),
+        mime_type=str(getattr(doc, "mime_type", None) or "application/octet-stream"),
+        doc_id=doc_id,
+        access_hash=access_hash,
+        file_reference=file_reference,
+        dc_id=dc_id,
+    )
+
+
 def _extract_duration_seconds(msg: Any) -> int | None:
     """Best-effort duration extraction for Telegram audio documents.
 
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+import aiofiles
+
+logger = logging.getLogger(__name__)
+
+_SUFFIX = ".bin"
+_TMP_SUFFIX = ".part"
+
+
+class TelegramMediaCache:
+    """Content-addressed on-disk cache of downloaded Telegram documents.
+
+    Files are named after (document id, access hash), so a document is stored once no
+    matter which message points at it. Downloads are written to a temp file and renamed
+    into place only when complete, so a partial file is never served. The total size is
+    capped; least recently used files are evicted first (recency survives restarts via
+    file mtimes, which are bumped on every hit).
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int) -> None:
+        self._dir = cache_dir
+        self._max_bytes = max(0, int(max_bytes))
+        # name -> size, oldest first.
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+        self._enabled = False
+
+        self._hits_total = 0
+        self._misses_total = 0
+        self._fills_total = 0
+        self._fills_aborted_total = 0
+        self._evictions_total = 0
+        self._hit_bytes_total = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    async def open(self) -> None:
+        if self._max_bytes <= 0 or self._enabled:
+            return
+        try:
+            entries = await asyncio.to_thread(self._scan)
+        except OSError as e:
+            logger.warning("Telegram media cache disabled (dir=%s): %s", self._dir, e)
+            return
+        for name, size in entries:
+            self._entries[name] = size
+            self._total_bytes += size
+        self._enabled = True
+        await self._evict()
+
+    def lookup(self, key: str) -> Path | None:
+        """Path of the cached file for `key`, marking it as recently used."""
+
+        name = _file_name(key)
+        if not self._enabled or name not in self._entries:
+            self._misses_total += 1
+            return None
+        self._entries.move_to_end(name)
+        self._hits_total += 1
+        return self._dir / name
+
+    def forget(self, key: str) -> None:
+        """Drop an entry whose file turned out to be missing or unreadable."""
+
+        size = self._entries.pop(_file_name(key), None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def count_hit_bytes(self, size: int) -> None:
+        self._hit_bytes_total += size
+
+    async def touch(self, path: Path) -> None:
+        try:
+            await asyncio.to_thread(os.utime, path)
+        except OSError:
+            pass
+
+    def start_fill(self, key: str, expected_size: int | None) -> CacheFill | None:
+        if not self._enabled:
+            return None
+        if expected_size is not None and expected_size > self._max_bytes:
+            return None
+        tmp = self._dir / f"{_file_name(key)}.{uuid.uuid4().hex}{_TMP_SUFFIX}"
+        return CacheFill(self, key, tmp, expected_size)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self._enabled,
+            "dir": str(self._dir),
+            "files": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self._max_bytes,
+            "hits_total": self._hits_total,
+            "misses_total": self._misses_total,
+            "hit_bytes_total": self._hit_bytes_total,
+            "fills_total": self._fills_total,
+            "fills_aborted_total": self._fills_aborted_total,
+            "evictions_total": self._evictions_total,
+        }
+
+    async def _commit(self, key: str, tmp: Path, size: int) -> None:
+        name = _file_name(key)
+        await asyncio.to_thread(os.replace, tmp, self._dir / name)
+        old = self._entries.pop(name, None)
+        if old is not None:
+            self._total_bytes -= old
+        self._entries[name] = size
+        self._total_bytes += size
+        self._fills_total += 1
+        await self._evict()
+
+    async def _evict(self) -> None:
+        victims: list[Path] = []
+        while self._total_bytes > self._max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._evictions_total += 1
+            victims.append(self._dir / name)
+        if victims:
+            # A file still being streamed stays readable after unlink (POSIX).
+            await asyncio.to_thread(_unlink_all, victims)
+
+    def _scan(self) -> list[tuple[str, int]]:
+        self._dir.mkdir(parents=True, exist_ok=True)
+        found: list[tuple[int, str, int]] = []
+        leftovers: list[Path] = []
+        with os.scandir(self._dir) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith(_TMP_SUFFIX):
+                    # Interrupted download from a previous run.
+                    leftovers.append(Path(entry.path))
+                    continue
+                if entry.name.endswith(_SUFFIX):
+                    st = entry.stat()
+                    found.append((st.st_mtime_ns, entry.name, st.st_size))
+        _unlink_all(leftovers)
+        found.sort()
+        return [(name, size) for _, name, size in found]
+
+
+class CacheFill:
+    """Writes one download into the cache as it streams; `commit` publishes it atomically."""
+
+    def __init__(
+        self, cache: TelegramMediaCache, key: str, tmp: Path, expected_size: int | None
+    ) -> None:
+        self._cache = cache
+        self._key = key
+        self._tmp = tmp
+        self._expected_size = expected_size
+        self._file: Any = None
+        self._size = 0
+        self._failed = False
+
+    async def write(self, data: bytes) -> None:
+        if self._failed:
+            return
+        try:
+            if self._file is None:
+                self._file = await aiofiles.open(self._tmp, "wb")
+            await self._file.write(data)
+            self._size += len(data)
+        except OSError as e:
+            # Never let a full or broken cache disk interrupt playback.
+            logger.warning("Telegram media cache write failed (%s): %s", self._tmp, e)
+            self._failed = True
+        if self._size > self._cache._max_bytes:
+            self._failed = True
+
+    async def commit(self) -> None:
+        complete = not self._failed and (
+            self._expected_size is None or self._size == self._expected_size
+        )
+        if not complete or self._size == 0:
+            await self.abort()
+            return
+        try:
+            await self._file.flush()
+            await asyncio.to_thread(os.fsync, self._file.fileno())
+            await self._file.close()
+            self._file = None
+            await self._cache._commit(self._key, self._tmp, self._size)
+        except OSError as e:
+            logger.warning("Telegram media cache commit failed (%s): %s", self._tmp, e)
+            await self.abort()
+
+    async def abort(self) -> None:
+        self._cache._fills_aborted_total += 1
+        if self._file is not None:
+            try:
+                await self._file.close()
+            except OSError:
+                pass
+            self._file = None
+        await asyncio.to_thread(_unlink_all, [self._tmp])
+
+
+def cache_key_for(document: Any) -> str | None:
+    """Cache key of a Telegram document, or None if it lacks id/access_hash."""
+
+    doc_id = getattr(document, "id", None)
+    access_hash = getattr(document, "access_hash", None)
+    if not isinstance(doc_id, int) or not isinstance(access_hash, int):
+        return None
+    return f"{doc_id}:{access_hash}"
+
+
+def _file_name(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:40] + _SUFFIX
+
+
+def _unlink_all(paths: list[Path]) -> None:
+    for path in paths:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Failed to remove cached file %s: %s", path, e)
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time as time_module
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from typing import Any
+
+from telethon import errors  # type: ignore[import-untyped]
+
+logger = logging.getLogger(__name__)
+
+# Completed parts per throughput sample used to adapt the parallelism.
+_WINDOW_PARTS = 4
+# Relative throughput change treated as noise when adapting.
+_RATE_TOLERANCE = 0.1
+# Attempts per part before the whole download fails.
+_PART_ATTEMPTS = 3
+
+
+@dataclass
+class _Part:
+    offset: int
+    length: int
+    chunks: asyncio.Queue[bytes | BaseException | None] = field(default_factory=asyncio.Queue)
+    task: asyncio.Task[None] | None = None
+    done: bool = False
+
+
+class ParallelDownloader:
+    """Downloads a Telegram document as byte ranges ("parts") fetched concurrently.
+
+    Parts are consecutive, `part_size` bytes each, and handed out strictly in order; the
+    part at the head is streamed chunk by chunk as it arrives, so the first bytes are not
+    delayed by the parallelism. Concurrent range requests share Telethon's connection to
+    the media DC, which pipelines them instead of waiting for one round-trip at a time.
+
+    How many parts are in flight adapts to observed throughput (hill climbing between 1
+    and `max_parallel`): more while throughput keeps improving, fewer once it drops.
+    The level carries over from track to track.
+    """
+
+    def __init__(self, max_parallel: int, part_size: int) -> None:
+        self._max_parallel = max(1, int(max_parallel))
+        self._part_size = max(1, int(part_size))
+        self._target = min(2, self._max_parallel)
+        self._direction = 1
+        self._last_rate: float | None = None
+
+        self._in_flight = 0
+        self._downloads_total = 0
+        self._parts_total = 0
+        self._retries_total = 0
+        self._bytes_total = 0
+        self._rate_last_bps: float | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_parallel > 1
+
+    async def stream(
+        self, client: Any, media: object, size: int, request_size: int
+    ) -> AsyncIterator[bytes]:
+        # Telegram serves ranges in multiples of the request size.
+        part_size = max(1, self._part_size // request_size) * request_size
+        parts: list[_Part] = [
+            _Part(offset=offset, length=min(part_size, size - offset))
+            for offset in range(0, size, part_size)
+        ]
+        self._downloads_total += 1
+        next_index = 0
+        head = 0
+        window_started_at = time_module.monotonic()
+        window_bytes = 0
+        window_parts = 0
+        # A window during which the consumer (not the network) limited us says nothing
+        # about the right parallelism.
+        window_throttled = False
+        # Set once the consumer is gone: done callbacks of parts that finished meanwhile
+        # still run afterwards and must not start new ones.
+        closed = False
+
+        def fill() -> None:
+            nonlocal next_index, window_throttled
+            if closed:
+                return
+            while next_index < len(parts) and self._running(parts, head) < self._target:
+                if next_index >= head + 2 * self._target:
+                    window_throttled = True
+                    return
+                part = parts[next_index]
+                part.task = asyncio.create_task(
+                    self._fetch(client, media, size, request_size, part),
+                    name="yurets-tg-part",
+                )
+                part.task.add_done_callback(lambda task, part=part: on_done(part, task))
+                next_index += 1
+
+        def on_done(part: _Part, task: asyncio.Task[None]) -> None:
+            nonlocal window_started_at, window_bytes, window_parts, window_throttled
+            if task.cancelled():
+                return
+            window_parts += 1
+            window_bytes += part.length
+            if window_parts >= _WINDOW_PARTS:
+                now = time_module.monotonic()
+                if not window_throttled and now > window_started_at:
+                    self._adapt(window_bytes / (now - window_started_at))
+                window_started_at = now
+                window_bytes = 0
+                window_parts = 0
+                window_throttled = False
+            fill()
+
+        try:
+            fill()
+            while head < len(parts):
+                part = parts[head]
+                while True:
+                    item = await part.chunks.get()
+                    if item is None:
+                        break
+                    if isinstance(item, BaseException):
+                        raise item
+                    yield item
+                head += 1
+                fill()
+        finally:
+            closed = True
+            for part in parts:
+                if part.task is not None and not part.task.done():
+                    part.task.cancel()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "max_parallel": self._max_parallel,
+            "parallel_target": self._target,
+            "in_flight": self._in_flight,
+            "part_size": self._part_size,
+            "downloads_total": self._downloads_total,
+            "parts_total": self._parts_total,
+            "retries_total": self._retries_total,
+            "bytes_total": self._bytes_total,
+            "rate_last_kbps": (
+                int(self._rate_last_bps * 8 / 1000) if self._rate_last_bps is not None else None
+            ),
+        }
+
+    @staticmethod
+    def _running(parts: list[_Part], head: int) -> int:
+        return sum(1 for p in parts[head:] if p.task is not None and not p.done)
+
+    async def _fetch(
+        self, client: Any, media: object, size: int, request_size: int, part: _Part
+    ) -> None:
+        self._in_flight += 1
+        received = 0
+        attempt = 0
+        try:
+            while received < part.length:
+                left = part.length - received
+                it = client.iter_download(
+                    media,
+                    offset=part.offset + received,
+                    limit=(left + request_size - 1) // request_size,
+                    chunk_size=request_size,
+                    request_size=request_size,
+                    file_size=size,
+                )
+                try:
+                    async for chunk in it:
+                        if not chunk:
+                            continue
+                        left = part.length - received
+                        data = chunk if len(chunk) <= left else chunk[:left]
+                        received += len(data)
+                        part.chunks.put_nowait(data)
+                    if received < part.length:
+                        # Short read: the document is smaller than announced.
+                        break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    attempt += 1
+                    # An expired file reference needs a fresh message, not a retry.
+                    expired = isinstance(e, errors.FileReferenceExpiredError)
+                    if expired or attempt >= _PART_ATTEMPTS:
+                        part.chunks.put_nowait(e)
+                        return
+                    self._retries_total += 1
+                    logger.warning(
+                        "Telegram part download failed (offset=%s, attempt=%s): %s",
+                        part.offset + received,
+                        attempt,
+                        e,
+                    )
+                    await asyncio.sleep(0.5 * attempt)
+                finally:
+                    # Telethon only returns the borrowed DC connection on a short read.
+                    close = getattr(it, "close", None)
+                    if close is not None:
+                        await close()
+            self._parts_total += 1
+            self._bytes_total += received
+            part.chunks.put_nowait(None)
+        finally:
+            part.done = True
+            self._in_flight -= 1
+
+    def _adapt(self, rate_bps: float) -> None:
+        self._rate_last_bps = rate_bps
+        prev = self._last_rate
+        self._last_rate = rate_bps
+        if prev is not None:
+            if rate_bps < prev * (1.0 - _RATE_TOLERANCE):
+                self._direction = -self._direction
+            elif rate_bps <= prev * (1.0 + _RATE_TOLERANCE):
+                return
+        self._target = min(self._max_parallel, max(1, self._target + self._direction))
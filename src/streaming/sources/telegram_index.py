@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    """
+CREATE TABLE IF NOT EXISTS tg_tracks (
+    channel TEXT NOT NULL,
+    msg_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    size INTEGER,
+    duration INTEGER,
+    mime_type TEXT NOT NULL,
+    doc_id INTEGER NOT NULL,
+    access_hash INTEGER NOT NULL,
+    file_reference BLOB NOT NULL,
+    dc_id INTEGER NOT NULL,
+    PRIMARY KEY (channel, msg_id)
+)
+""",
+    """
+CREATE TABLE IF NOT EXISTS tg_channels (
+    channel TEXT PRIMARY KEY,
+    max_id INTEGER NOT NULL DEFAULT 0,
+    backfill_before_id INTEGER NOT NULL DEFAULT 0,
+    backfill_done INTEGER NOT NULL DEFAULT 0
+)
+""",
+)
+
+
+@dataclass(frozen=True)
+class TelegramTrackMeta:
+    msg_id: int
+    title: str
+    file_name: str
+    size: int | None
+    duration_seconds: int | None
+    mime_type: str
+    doc_id: int
+    access_hash: int
+    # Expires after a while; refreshed by re-fetching the message.
+    file_reference: bytes
+    dc_id: int
+
+
+@dataclass(frozen=True)
+class ChannelSyncState:
+    # Newest message id seen (catch-up starts after it).
+    max_id: int = 0
+    # History back-fill continues with messages older than this id (0 = from the newest).
+    backfill_before_id: int = 0
+    backfill_done: bool = False
+
+
+class TelegramChannelIndex:
+    """Persistent index of audio documents per Telegram channel.
+
+    Backed by SQLite and mirrored in memory, like the local track index: after a
+    restart a channel's tracks are available immediately, and only messages newer than
+    the stored `max_id` (plus the unfinished part of the history back-fill) are fetched.
+
+    Writes do blocking I/O and must be called off the event loop.
+    """
+
+    def __init__(self, db_path: str | None) -> None:
+        self._lock = threading.Lock()
+        self._conn = _open_db(db_path)
+        self._tracks: dict[str, dict[int, TelegramTrackMeta]] = {}
+        self._states: dict[str, ChannelSyncState] = {}
+        self._load()
+
+    def __len__(self) -> int:
+        return sum(len(tracks) for tracks in self._tracks.values())
+
+    def tracks(self, channel: str) -> dict[int, TelegramTrackMeta]:
+        return dict(self._tracks.get(channel, {}))
+
+    def state(self, channel: str) -> ChannelSyncState:
+        return self._states.get(channel, ChannelSyncState())
+
+    def upsert(
+        self,
+        channel: str,
+        metas: Iterable[TelegramTrackMeta],
+        state: ChannelSyncState | None = None,
+    ) -> None:
+        """Store tracks (and optionally the sync state) in one transaction."""
+
+        items = list(metas)
+        if not items and state is None:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tg_tracks"
+                " (channel, msg_id, title, file_name, size, duration, mime_type,"
+                " doc_id, access_hash, file_reference, dc_id)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        channel,
+                        m.msg_id,
+                        m.title,
+                        m.file_name,
+                        m.size,
+                        m.duration_seconds,
+                        m.mime_type,
+                        m.doc_id,
+                        m.access_hash,
+                        m.file_reference,
+                        m.dc_id,
+                    )
+                    for m in items
+                ],
+            )
+            if state is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO tg_channels"
+                    " (channel, max_id, backfill_before_id, backfill_done) VALUES (?, ?, ?, ?)",
+                    (channel, state.max_id, state.backfill_before_id, int(state.backfill_done)),
+                )
+        tracks = self._tracks.setdefault(channel, {})
+        for m in items:
+            tracks[m.msg_id] = m
+        if state is not None:
+            self._states[channel] = state
+
+    def forget(self, channel: str, msg_ids: Iterable[int]) -> None:
+        tracks = self._tracks.get(channel, {})
+        ids = [i for i in msg_ids if i in tracks]
+        if not ids:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM tg_tracks WHERE channel = ? AND msg_id = ?",
+                [(channel, i) for i in ids],
+            )
+        for i in ids:
+            tracks.pop(i, None)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _load(self) -> None:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT channel, msg_id, title, file_name, size, duration, mime_type,"
+                " doc_id, access_hash, file_reference, dc_id FROM tg_tracks"
+            ).fetchall()
+            states = self._conn.execute(
+                "SELECT channel, max_id, backfill_before_id, backfill_done FROM tg_channels"
+            ).fetchall()
+        for (
+            channel,
+            msg_id,
+            title,
+            file_name,
+            size,
+            duration,
+            mime_type,
+            doc_id,
+            access_hash,
+            file_reference,
+            dc_id,
+        ) in rows:
+            self._tracks.setdefault(channel, {})[int(msg_id)] = TelegramTrackMeta(
+                msg_id=int(msg_id),
+                title=title,
+                file_name=file_name,
+                size=size,
+                duration_seconds=duration,
+                mime_type=mime_type,
+                doc_id=int(doc_id),
+                access_hash=int(access_hash),
+                file_reference=bytes(file_reference),
+                dc_id=int(dc_id),
+            )
+        for channel, max_id, before_id, done in states:
+            self._states[channel] = ChannelSyncState(
+                max_id=int(max_id), backfill_before_id=int(before_id), backfill_done=bool(done)
+            )
+
+
+def _open_db(db_path: str | None) -> sqlite3.Connection:
+    target = (db_path or "").strip() or ":memory:"
+    if target != ":memory:":
+        try:
+            Path(target).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(target, check_same_thread=False)
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            return conn
+        except (OSError, sqlite3.Error):
+            logger.warning(
+                "Telegram index at %s is not writable; falling back to in-memory index", target
+            )
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    for statement in _SCHEMA:
+        conn.execute(statement)
+    return conn
@@ -3,11 +3,11 @@ from __future__ import annotations
 import asyncio
 import hashlib
 import logging
-import random
 import re
 import time as time_module
 from collections import deque
 from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
 from typing import Any
@@ -16,47 +16,194 @@ from zoneinfo import ZoneInfo
 from src.models.now_playing import NowPlaying
 from src.services.now_playing import NowPlayingState
 from src.services.scheduler import Scheduler
-from src.settings import Settings
+from src.settings import ScheduleSlot, Settings, parse_schedule
+from src.streaming.broadcast import BroadcastOutput, BroadcastReader, listen
+from src.streaming.deck import TrackDeck
+from src.streaming.frames import AudioFrame, BroadcastUnit, FrameChunker, frame_parser_for
+from src.streaming.hls import HlsSegmenter, master_playlist
+from src.streaming.relay import relay_frames
+from src.streaming.rendition import Rendition, parse_renditions
+from src.streaming.shared_ring import SharedFanout
+from src.streaming.sources.base import TrackCatalog
 from src.streaming.sources.local import LocalLibrarySource
-from src.streaming.sources.telegram import TelegramChannelSource, TelegramSession
+from src.streaming.sources.pool import SourceKey, SourcePool
+from src.streaming.sources.telegram import TelegramChannelSource
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_LOCAL_ROOT = Path("/music")
 
-_SENTINEL = object()
+# Upper bound for preview sizes served from the materialized per-slot plan.
+PREVIEW_MAX_TRACKS = 200
+
+# Most lagging listeners listed one by one in the diagnostics.
+_DIAGNOSTICS_LISTENERS = 20
+
+
+@dataclass
+class _TrackFeed:
+    """A picked track whose source is being read into a frame buffer ahead of playback."""
+
+    slot_source: str
+    slot_key: str
+    plan_key: tuple[str, str]
+    label: str
+    track: Any
+    pace_mode: str
+    kbps_used: int | None
+    bytes_per_second: float
+    queue: asyncio.Queue[list[AudioFrame] | None]
+    task: asyncio.Task[None] = field(init=False)
+    # Set once the producer finished (end of track or error).
+    done: bool = False
+    buffered_audio_s: float = 0.0
+    skipped_bytes: int = 0
+    source_gap_max_s: float = 0.0
+    source_gap_over_250ms: int = 0
+    buffer_last_chunks: int = 0
+    buffer_peak_chunks: int = 0
+
+
+@dataclass(frozen=True)
+class _CompiledSchedule:
+    timezone_name: str
+    tz: Any
+    scheduler: Scheduler
+
+
+@dataclass
+class _SlotPlan:
+    label: str
+    # Titles the next picks from this slot would play, in order.
+    titles: list[str]
+    error: str | None = None
 
 
 class Streamer:
-    def __init__(self, settings: Settings) -> None:
+    """One station (mount): schedule, master task, broadcast ring and its listeners.
+
+    Stations of one process share a `SourcePool`; a streamer created without one owns
+    a private pool. In split mode (see `src.serve`) every output is also mirrored into
+    `fanout`, where HTTP worker processes read it.
+    """
+
+    def __init__(
+        self,
+        settings: Settings,
+        pool: SourcePool | None = None,
+        mount: str = "main",
+        fanout: SharedFanout | None = None,
+    ) -> None:
         self._settings = settings
-        self._schedule_tz_name = settings.schedule_timezone()
-        self._schedule_tz = self._build_tz(self._schedule_tz_name)
+        self.mount = mount
+        self._fanout = fanout
+        self._owns_pool = pool is None
+        self._pool = pool if pool is not None else SourcePool(settings)
+        self._pool.register(self._referenced_sources)
         self.now_playing = NowPlayingState()
-        self.scheduler = Scheduler(slots=settings.schedule())
 
-        self._local_sources: dict[Path, LocalLibrarySource] = {}
-        self.telegram_session = TelegramSession(settings=settings.telegram())
-        self._telegram_sources: dict[str, TelegramChannelSource] = {}
+        # Hot reload (see `reload_schedule`): a validated schedule waits here until the
+        # master picks the next track.
+        self._schedule_file = (
+            Path(settings.schedule_file) if settings.schedule_file.strip() else None
+        )
+        self._schedule_file_mtime: int | None = None
+        self._pending_schedule: _CompiledSchedule | None = None
+        self._schedule_watch_task: asyncio.Task[None] | None = None
+        self._schedule_reloads_total = 0
+        self._schedule_reload_last_error: str | None = None
+        compiled = self._compile_schedule(settings.schedule_timezone(), settings.schedule())
+        if self._schedule_file is not None:
+            try:
+                compiled = self._read_schedule_file()
+            except (OSError, ValueError) as e:
+                logger.error(
+                    "Schedule file %s ignored (mount=%s): %s", self._schedule_file, mount, e
+                )
+                self._schedule_reload_last_error = str(e)
+        self._schedule_tz_name = compiled.timezone_name
+        self._schedule_tz = compiled.tz
+        self.scheduler = compiled.scheduler
+
+        self.telegram_session = self._pool.telegram_session
 
         self._master_task: asyncio.Task[None] | None = None
-        self._subscribers: dict[int, asyncio.Queue[object]] = {}
+        self._output = BroadcastOutput(capacity=int(settings.subscriber_queue_chunks))
+        # Re-encoded copies of the master output, by name (see Settings.renditions).
+        self._renditions: dict[str, Rendition] = {
+            spec.name: Rendition(
+                spec,
+                input_mime_type=settings.stream_mime_type,
+                ffmpeg_path=settings.ffmpeg_path,
+                capacity=int(settings.subscriber_queue_chunks),
+                chunk_size=int(settings.broadcast_chunk_size),
+            )
+            for spec in parse_renditions(settings.renditions)
+        }
+        # HLS variants by name ("main" or a rendition); packed audio needs MPEG outputs.
+        self._hls: dict[str, HlsSegmenter] = {}
+        if settings.hls_enabled:
+            outputs = {"main": (self._output, settings.stream_mime_type)}
+            outputs.update({name: (r.output, r.mime_type) for name, r in self._renditions.items()})
+            for name, (output, mime_type) in outputs.items():
+                if mime_type != "audio/mpeg":
+                    continue
+                segmenter = HlsSegmenter(
+                    settings.hls_segment_seconds, settings.hls_window_segments, output.epoch
+                )
+                output.sinks.append(segmenter)
+                self._hls[name] = segmenter
+        if fanout is not None:
+            self._output.sinks.append(fanout.writers[(mount, "main")])
+            for name, r in self._renditions.items():
+                r.output.sinks.append(fanout.writers[(mount, name)])
+        self._subscribers: dict[int, BroadcastReader] = {}
         self._subscriber_seq = 0
+        # Edge relays connected to /relay/<mount> (see `relay_frames`).
+        self._relay_clients = 0
+        self._relay_clients_total = 0
 
         self._current_day: date | None = None
-        self._slot_rngs: dict[tuple[str, str], random.Random] = {}
+        self._slot_decks: dict[tuple[str, str], TrackDeck] = {}
 
-        # No-repeat window within a day (radio-like behavior).
-        self._no_repeat_window = 50
+        # No-repeat window (radio-like behavior), see Settings.no_repeat_window.
+        self._no_repeat_window = max(0, int(settings.no_repeat_window))
         self._recent_titles: deque[str] = deque()
 
+        # Materialized look-ahead per (source, key), rebuilt lazily after a pick, a library
+        # change or a new day. Preview responses are memoized until the next rebuild.
+        self._plans: dict[tuple[str, str], _SlotPlan] = {}
+        self._plans_dirty = True
+        self._plans_lock = asyncio.Lock()
+        self._plans_rebuilt_total = 0
+        self._preview_memo: dict[tuple[object, ...], Any] = {}
+
         self._track_started_at: float | None = None
+        # Current track and the prefetched next one (see `_run_master`).
+        self._feed: _TrackFeed | None = None
+        self._next_feed: _TrackFeed | None = None
+        self._track_ended_at: float | None = None
+        self._boundary_gap_last_s: float | None = None
+        self._boundary_gap_max_s = 0.0
+        self._prefetch_late_total = 0
+        # Tracks cut short because the schedule switched to another slot.
+        self._slot_cuts_total = 0
 
         self._stats_started_at = time_module.monotonic()
         self._subscribers_created_total = 0
         self._subscribers_dropped_total = 0
         self._subscribers_peak = 0
-        self._subscriber_queue_full_total = 0
+        self._subscriber_lagged_total = 0
+        # Of listeners already gone; live ones keep their own counters.
+        self._subscriber_skips_closed = 0
+        self._subscriber_skipped_chunks_closed = 0
+        self._subscriber_writes_closed = 0
+        self._subscriber_write_bytes_closed = 0
+        self._burst_seconds_total = 0.0
+        self._first_audio_count = 0
+        self._first_audio_last_s: float | None = None
+        self._first_audio_max_s = 0.0
+        self._first_audio_sum_s = 0.0
 
         self._broadcast_chunks_total = 0
         self._broadcast_bytes_total = 0
@@ -76,24 +223,32 @@ class Streamer:
         self._track_bytes_per_second: float | None = None
         self._track_sent_bytes = 0
         self._track_sent_chunks = 0
+        self._track_audio_s = 0.0
         self._track_sleep_total_s = 0.0
         self._track_late_max_s = 0.0
-        self._track_source_gap_max_s = 0.0
-        self._track_source_gap_over_250ms = 0
         self._track_starve_max_s = 0.0
         self._track_starve_over_250ms = 0
-        self._track_buffer_peak_chunks = 0
-        self._track_buffer_last_chunks = 0
 
     async def startup(self) -> None:
         # Start Telegram session only if schedule uses it.
-        if any(slot.source == "telegram" for slot in self._settings.schedule()):
-            await self.telegram_session.startup()
+        if any(slot.source == "telegram" for slot in self.scheduler.slots):
+            await self._pool.start_telegram()
 
+        for rendition in self._renditions.values():
+            rendition.start()
         if self._master_task is None:
-            self._master_task = asyncio.create_task(self._run_master(), name="yurets-master-stream")
+            self._master_task = asyncio.create_task(
+                self._run_master(), name=f"yurets-master-stream-{self.mount}"
+            )
+        if self._schedule_file is not None and self._schedule_watch_task is None:
+            self._schedule_watch_task = asyncio.create_task(
+                self._watch_schedule_file(), name="yurets-schedule-watch"
+            )
 
     async def shutdown(self) -> None:
+        if self._schedule_watch_task is not None:
+            self._schedule_watch_task.cancel()
+            self._schedule_watch_task = None
         if self._master_task is not None:
             self._master_task.cancel()
             try:
@@ -103,18 +258,157 @@ class Streamer:
             finally:
                 self._master_task = None
 
-        # Close subscribers
-        for q in list(self._subscribers.values()):
+        # Close subscribers: every reader sees the closed ring and finishes.
+        self._output.close()
+        for rendition in self._renditions.values():
+            await rendition.close()
+        self._subscribers.clear()
+
+        if self._owns_pool:
+            await self._pool.close()
+
+    def _choose_slot(self, at: datetime | None = None):
+        return self.scheduler.choose_slot(at or datetime.now(self._schedule_tz))
+
+    @property
+    def mime_type(self) -> str:
+        return self._settings.stream_mime_type
+
+    @property
+    def has_schedule_file(self) -> bool:
+        return self._schedule_file is not None
+
+    @property
+    def schedule_timezone_name(self) -> str:
+        return self._schedule_tz_name
+
+    @property
+    def schedule_tz(self) -> Any:
+        return self._schedule_tz
+
+    def reload_schedule(self, text: str | None = None) -> dict[str, object]:
+        """Validate a new schedule and queue it for the next track boundary.
+
+        `text` is a schedule JSON document; None re-reads `schedule_file`. Raises
+        ValueError (nothing changes) if the schedule is invalid. Sources, decks, caches
+        and the Telegram session still referenced by the new schedule are kept.
+        """
+
+        try:
+            if text is None:
+                if self._schedule_file is None:
+                    raise ValueError("No schedule file configured (YURETS_SCHEDULE_FILE)")
+                compiled = self._read_schedule_file()
+            else:
+                compiled = self._parse_schedule_text(text)
+        except (OSError, ValueError) as e:
+            self._schedule_reload_last_error = str(e)
+            raise ValueError(str(e)) from e
+        self._pending_schedule = compiled
+        self._schedule_reload_last_error = None
+        logger.info(
+            "Schedule reload queued (mount=%s, %s slots, timezone=%s)",
+            self.mount,
+            len(compiled.scheduler.slots),
+            compiled.timezone_name,
+        )
+        return {
+            "status": "pending",
+            "timezone": compiled.timezone_name,
+            "slots": len(compiled.scheduler.slots),
+        }
+
+    def request_reload(self) -> None:
+        """SIGHUP handler: re-read the schedule file."""
+        try:
+            self.reload_schedule()
+        except ValueError as e:
+            logger.error("Schedule reload failed (mount=%s): %s", self.mount, e)
+
+    def _read_schedule_file(self) -> _CompiledSchedule:
+        assert self._schedule_file is not None
+        mtime = self._schedule_file.stat().st_mtime_ns
+        text = self._schedule_file.read_text(encoding="utf-8")
+        # Remembered even if invalid: the watcher retries only after the next edit.
+        self._schedule_file_mtime = mtime
+        return self._parse_schedule_text(text)
+
+    def _parse_schedule_text(self, text: str) -> _CompiledSchedule:
+        try:
+            tz_name, slots = parse_schedule(text)
+        except ValueError as e:
+            # json.JSONDecodeError and pydantic.ValidationError are both ValueErrors.
+            raise ValueError(f"Invalid schedule: {e}") from e
+        for slot in slots:
+            if slot.source not in ("local", "telegram"):
+                raise ValueError(f"Unknown source: {slot.source!r}")
+            if not (slot.key or "").strip():
+                raise ValueError(f"Schedule slot for {slot.source} must include key")
+        return self._compile_schedule(tz_name, slots)
+
+    def _compile_schedule(self, tz_name: str, slots: list[ScheduleSlot]) -> _CompiledSchedule:
+        try:
+            tz = self._build_tz(tz_name)
+        except Exception as e:
+            raise ValueError(f"Unknown timezone: {tz_name!r}") from e
+        return _CompiledSchedule(timezone_name=tz_name, tz=tz, scheduler=Scheduler(slots=slots))
+
+    async def _watch_schedule_file(self) -> None:
+        assert self._schedule_file is not None
+        interval = max(0.5, float(self._settings.schedule_file_poll_seconds))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                mtime = self._schedule_file.stat().st_mtime_ns
+            except OSError:
+                continue
+            if mtime != self._schedule_file_mtime:
+                self.request_reload()
+
+    async def _apply_pending_schedule(self) -> None:
+        """Swap in a reloaded schedule; called by the master right before it picks a track."""
+
+        compiled = self._pending_schedule
+        if compiled is None:
+            return
+        self._pending_schedule = None
+        slots = compiled.scheduler.slots
+        if any(slot.source == "telegram" for slot in slots) and not self.telegram_session.enabled():
             try:
-                q.put_nowait(_SENTINEL)
+                await self._pool.start_telegram()
             except Exception:
-                pass
-        self._subscribers.clear()
+                logger.exception("Telegram session failed to start after schedule reload")
+
+        self._schedule_tz_name = compiled.timezone_name
+        self._schedule_tz = compiled.tz
+        self.scheduler = compiled.scheduler
+        self._schedule_reloads_total += 1
+        released = await self._pool.release_unused()
+        if released:
+            logger.info("Closed sources no longer scheduled: %s", [key[1] for key in released])
+        self._invalidate_plans()
+        logger.info(
+            "Schedule reloaded (mount=%s, %s slots, timezone=%s)",
+            self.mount,
+            len(slots),
+            compiled.timezone_name,
+        )
 
-        await self.telegram_session.shutdown()
+    def _referenced_sources(self) -> set[SourceKey]:
+        """Sources this station still needs: its schedule plus the tracks in flight."""
 
-    def _choose_slot(self):
-        return self.scheduler.choose_slot(datetime.now(self._schedule_tz))
+        mime_type = self._settings.stream_mime_type
+        keys: set[SourceKey] = {
+            (slot.source, self._source_key(slot), mime_type) for slot in self.scheduler.slots
+        }
+        for feed in (self._feed, self._next_feed):
+            if feed is not None:
+                keys.add((feed.slot_source, feed.slot_key, mime_type))
+        return keys
+
+    def next_schedule_transition(self) -> datetime | None:
+        """When the active schedule slot changes next (schedule timezone)."""
+        return self.scheduler.next_transition(datetime.now(self._schedule_tz))
 
     @staticmethod
     def _build_tz(name: str):
@@ -131,248 +425,436 @@ class Streamer:
         return ZoneInfo(name)
 
     def _get_local_source(self, music_dir: Path) -> LocalLibrarySource:
-        src = self._local_sources.get(music_dir)
-        if src is None:
-            src = LocalLibrarySource(music_dir=music_dir)
-            self._local_sources[music_dir] = src
-        return src
+        return self._pool.local_source(
+            music_dir, self._settings.stream_mime_type, on_change=self._invalidate_plans
+        )
 
     def _get_telegram_source(self, channel: str) -> TelegramChannelSource:
-        src = self._telegram_sources.get(channel)
-        if src is None:
-            src = TelegramChannelSource(session=self.telegram_session, channel=channel)
-            self._telegram_sources[channel] = src
-        return src
+        return self._pool.telegram_source(
+            channel, self._settings.stream_mime_type, on_change=self._invalidate_plans
+        )
+
+    def listener_count(self) -> int:
+        remote = self._fanout.listeners(self.mount) if self._fanout is not None else 0
+        return len(self._subscribers) + remote
+
+    def renditions(self) -> dict[str, str]:
+        """Available renditions: name -> mime type."""
+        return {name: r.mime_type for name, r in self._renditions.items()}
+
+    def rendition_mime_type(self, rendition: str | None) -> str:
+        if rendition is None:
+            return self.mime_type
+        return self._renditions[rendition].mime_type
+
+    def hls_variants(self) -> list[str]:
+        return list(self._hls)
+
+    def hls_segmenter(self, variant: str) -> HlsSegmenter | None:
+        return self._hls.get(variant)
+
+    def hls_master_playlist(self) -> str | None:
+        """Multivariant playlist of the HLS variants that have segments; None if none."""
+
+        variants: list[tuple[str, int]] = []
+        for name, segmenter in self._hls.items():
+            bandwidth = segmenter.bandwidth()
+            if bandwidth is not None:
+                variants.append((f"{name}/live.m3u8", bandwidth))
+        return master_playlist(variants) if variants else None
+
+    def subscribe(self, rendition: str | None = None) -> AsyncIterator[bytes | memoryview]:
+        """A listener of the master stream or a rendition as a body iterator."""
 
-    def subscribe(self) -> AsyncIterator[bytes]:
-        """Subscribe to the master stream.
+        return listen(self.open_listener(rendition))
+
+    def open_listener(self, rendition: str | None = None) -> BroadcastReader:
+        """Register a listener of the master stream or a rendition (KeyError if unknown).
 
         All clients receive the same chunks in real time.
-        New clients join mid-track (typical radio behavior).
+        New clients join mid-track (typical radio behavior), always on a frame/page
+        boundary, with a burst of recent audio; Ogg listeners first get the codec setup
+        pages. Listeners that fall behind are handled by `slow_subscriber_policy`.
+        The reader must be closed when the listener is gone.
         """
 
+        output = self._output if rendition is None else self._renditions[rendition].output
+        ring = output.ring
         self._subscriber_seq += 1
         subscriber_id = self._subscriber_seq
         self._subscribers_created_total += 1
-        q: asyncio.Queue[object] = asyncio.Queue(
-            maxsize=int(self._settings.subscriber_queue_chunks)
+        sub = BroadcastReader(
+            output,
+            float(self._settings.burst_on_connect_seconds),
+            skip_lagging=self._settings.slow_subscriber_policy == "skip",
+            max_lag_seconds=float(self._settings.slow_subscriber_disconnect_seconds),
+            write_max_bytes=int(self._settings.subscriber_write_max_bytes),
+            write_latency_seconds=float(self._settings.subscriber_write_latency_seconds),
+            on_first_audio=self._record_first_audio,
+            on_close=lambda reader: self._close_subscriber(subscriber_id, reader),
         )
-        self._subscribers[subscriber_id] = q
+        self._burst_seconds_total += ring.span_seconds(sub.cursor, ring.head_seq)
+        self._subscribers[subscriber_id] = sub
         if len(self._subscribers) > self._subscribers_peak:
             self._subscribers_peak = len(self._subscribers)
+        return sub
+
+    def relay_frames(
+        self, epoch: str | None = None, resume_from: int | None = None
+    ) -> AsyncIterator[bytes]:
+        """The master output and now-playing updates for a downstream edge relay."""
+
+        frames = relay_frames(
+            self._output,
+            self.now_playing,
+            self.current_position_seconds,
+            hello={"mount": self.mount, "mime_type": self.mime_type},
+            burst_seconds=float(self._settings.burst_on_connect_seconds),
+            epoch=epoch,
+            resume_from=resume_from,
+        )
 
         async def _gen() -> AsyncIterator[bytes]:
+            self._relay_clients += 1
+            self._relay_clients_total += 1
             try:
-                while True:
-                    item = await q.get()
-                    if item is _SENTINEL:
-                        return
-                    if isinstance(item, (bytes, bytearray)):
-                        yield bytes(item)
+                async for frame in frames:
+                    yield frame
             finally:
-                self._subscribers.pop(subscriber_id, None)
+                self._relay_clients -= 1
 
         return _gen()
 
     async def _run_master(self) -> None:
-        """Background task that selects tracks and broadcasts bytes to subscribers."""
+        """Background task that selects tracks and broadcasts bytes to subscribers.
 
-        while True:
-            source_label = "unknown"
-            try:
-                self._master_loops_total += 1
-                slot = self._choose_slot()
-                if slot is None:
-                    raise RuntimeError("Schedule is empty")
-
-                self._ensure_day_state()
-
-                if slot.source == "telegram":
-                    channel = (slot.key or "").strip()
-                    if not channel:
-                        raise RuntimeError("Schedule slot for telegram must include key=<channel>")
-                    tg_source = self._get_telegram_source(channel)
-                    source = tg_source
-                    source_label = await tg_source.display_name()
-                    rng = self._rng_for(slot_source=slot.source, key=channel)
-
-                    self._track_source_kind = "telegram"
-                    self._track_key = channel
-
-                elif slot.source == "local":
-                    music_key = (slot.key or "").strip()
-                    if not music_key:
-                        raise RuntimeError("Schedule slot for local must include key=<path>")
-
-                    key_path = Path(music_key)
-                    music_dir = (
-                        key_path if key_path.is_absolute() else (DEFAULT_LOCAL_ROOT / key_path)
+        Pipelined: while a track plays, the next one is picked and its source opened
+        `prefetch_lead_seconds` before the end, so its first frames are already buffered
+        at the boundary and tracks follow each other without a gap.
+        """
+
+        pending: asyncio.Task[_TrackFeed] | None = None
+        try:
+            while True:
+                source_label = "unknown"
+                try:
+                    self._master_loops_total += 1
+                    if pending is None:
+                        if self._track_ended_at is not None:
+                            # The previous track ended before its successor was prefetched.
+                            self._prefetch_late_total += 1
+                        pending = asyncio.create_task(
+                            self._prepare_feed(lead_s=0.0), name="yurets-track-prefetch"
+                        )
+                    task, pending = pending, None
+                    feed = await task
+                    source_label = feed.label
+                    pending = await self._play_feed(feed)
+                except asyncio.CancelledError:
+                    return
+                except Exception:
+                    logger.exception(
+                        "Master source error (mount=%s, source_label=%s)", self.mount, source_label
                     )
-                    source = self._get_local_source(music_dir)
-                    source_label = str(music_dir.name)
-                    rng = self._rng_for(slot_source=slot.source, key=str(music_dir))
-
-                    self._track_source_kind = "local"
-                    self._track_key = str(music_dir)
-
-                else:
-                    raise RuntimeError(f"Unknown source: {slot.source!r}")
-
-                track = await self._pick_next_track_no_repeat(source=source, rng=rng)
-                self._remember_played(track.title)
-
-                self._track_started_at = time_module.monotonic()
-
-                self._track_label = source_label
-                self._track_title = track.title
-                self._track_sent_bytes = 0
-                self._track_sent_chunks = 0
-                self._track_sleep_total_s = 0.0
-                self._track_late_max_s = 0.0
-                self._track_source_gap_max_s = 0.0
-                self._track_source_gap_over_250ms = 0
-                self._track_starve_max_s = 0.0
-                self._track_starve_over_250ms = 0
-                self._track_buffer_peak_chunks = 0
-                self._track_buffer_last_chunks = 0
-
-                await self.now_playing.set(
-                    NowPlaying(
-                        title=track.title,
-                        source=source_label,
-                        duration_seconds=track.duration_seconds,
-                        position_seconds=0,
-                        mime_type=self._settings.stream_mime_type,
+                    self._track_started_at = None
+                    self._track_ended_at = None
+                    self._last_master_error = "master_error"
+                    self._last_master_error_at = time_module.monotonic()
+                    await self.now_playing.set(
+                        NowPlaying(
+                            title="(ошибка источника)",
+                            source=source_label,
+                            duration_seconds=None,
+                            position_seconds=None,
+                            mime_type=self._settings.stream_mime_type,
+                        )
                     )
-                )
+                    await asyncio.sleep(1.0)
+        finally:
+            await self._discard_pending_feed(pending)
 
-                # Pace the broadcast to (roughly) real time.
-                bytes_per_second: float | None = None
-                if (
-                    track.byte_size is not None
-                    and track.duration_seconds is not None
-                    and track.duration_seconds > 0
-                    and track.byte_size > 0
-                ):
-                    bytes_per_second = float(track.byte_size) / float(track.duration_seconds)
-                    self._track_pace_mode = "duration"
-                    self._track_kbps_used = None
-
-                if bytes_per_second is None:
-                    # Fallback pacing when we don't know real duration.
-                    # Try to infer kbps from the filename/title (often contains "(320)").
-                    # If we under-estimate bitrate here, clients will eventually underrun and stutter.
-                    title_kbps = self._infer_kbps_from_title(track.title)
-                    kbps = title_kbps or int(self._settings.assumed_bitrate_kbps)
-                    # kbps -> bytes/sec
-                    bytes_per_second = max(1.0, float(kbps) * 1000.0 / 8.0)
-                    self._track_pace_mode = "title_kbps" if title_kbps else "assumed_kbps"
-                    self._track_kbps_used = int(kbps)
-
-                self._track_bytes_per_second = float(bytes_per_second)
-
-                # Pre-buffer source as fast as possible (especially important for Telegram),
-                # then broadcast in real time from the buffer.
-                buffer_q: asyncio.Queue[bytes | None] = asyncio.Queue(
-                    maxsize=int(self._settings.track_buffer_chunks)
-                )
+    async def _prepare_feed(self, lead_s: float) -> _TrackFeed:
+        """Pick the track that starts in `lead_s` seconds and start buffering its frames."""
+
+        await self._apply_pending_schedule()
+        slot = self._choose_slot(datetime.now(self._schedule_tz) + timedelta(seconds=lead_s))
+        if slot is None:
+            raise RuntimeError("Schedule is empty")
 
-                async def _producer() -> None:
-                    last_at = time_module.monotonic()
-                    try:
-                        source_chunk_size = self._settings.chunk_size
-                        if getattr(source, "kind", None) == "telegram":
-                            source_chunk_size = self._settings.telegram_download_chunk_size
-
-                        async for raw in source.stream_track(track, source_chunk_size):
-                            now = time_module.monotonic()
-                            gap = now - last_at
-                            last_at = now
-                            if gap > self._track_source_gap_max_s:
-                                self._track_source_gap_max_s = gap
-                            if gap >= 0.25:
-                                self._track_source_gap_over_250ms += 1
-
-                            await buffer_q.put(raw)
-                            qsz = buffer_q.qsize()
-                            self._track_buffer_last_chunks = qsz
-                            if qsz > self._track_buffer_peak_chunks:
-                                self._track_buffer_peak_chunks = qsz
-                    finally:
-                        try:
-                            await buffer_q.put(None)
-                        except Exception:
-                            pass
-
-                producer_task = asyncio.create_task(_producer(), name="yurets-track-producer")
-
-                t0 = self._track_started_at
-                sent = 0
-                carry = b""
-                bchunk = int(self._settings.broadcast_chunk_size)
+        self._ensure_day_state()
 
-                try:
-                    while True:
-                        if not carry:
-                            wait0 = time_module.monotonic()
-                            item = await buffer_q.get()
-                            waited = time_module.monotonic() - wait0
-                            if waited > self._track_starve_max_s:
-                                self._track_starve_max_s = waited
-                            if waited >= 0.25:
-                                self._track_starve_over_250ms += 1
-
-                            if item is None:
-                                break
-                            carry = item
-                            self._track_buffer_last_chunks = buffer_q.qsize()
-
-                        chunk = carry[:bchunk]
-                        carry = carry[bchunk:]
-
-                        if not chunk:
-                            continue
-
-                        self._broadcast(chunk)
-                        sent += len(chunk)
-
-                        self._track_sent_bytes += len(chunk)
-                        self._track_sent_chunks += 1
-
-                        target_elapsed = sent / bytes_per_second
-                        actual_elapsed = time_module.monotonic() - t0
-                        late = actual_elapsed - target_elapsed
-                        if late > self._track_late_max_s:
-                            self._track_late_max_s = late
-                        if target_elapsed > actual_elapsed:
-                            sleep_s = target_elapsed - actual_elapsed
-                            self._track_sleep_total_s += sleep_s
-                            await asyncio.sleep(sleep_s)
-                finally:
-                    producer_task.cancel()
-                    try:
-                        await producer_task
-                    except asyncio.CancelledError:
-                        pass
-
-                await asyncio.sleep(0.05)
-            except asyncio.CancelledError:
-                return
+        source, deck, source_label, slot_key = await self._open_slot(slot)
+        track = await self._pick_next_track_no_repeat(source=source, deck=deck)
+        self._remember_played(track.title)
+        self._invalidate_plans()
+
+        bytes_per_second, pace_mode, kbps_used = self._estimate_pace(track)
+        feed = _TrackFeed(
+            slot_source=slot.source,
+            slot_key=slot_key,
+            plan_key=_plan_key(slot),
+            label=source_label,
+            track=track,
+            pace_mode=pace_mode,
+            kbps_used=kbps_used,
+            bytes_per_second=bytes_per_second,
+            queue=asyncio.Queue(maxsize=int(self._settings.track_buffer_chunks)),
+        )
+        feed.task = asyncio.create_task(
+            self._produce_frames(feed, source), name="yurets-track-producer"
+        )
+        self._next_feed = feed
+        return feed
+
+    def _estimate_pace(self, track: Any) -> tuple[float, str, int | None]:
+        """Byte-rate estimate as (bytes_per_second, pace_mode, kbps_used).
+
+        Frames carry their own durations; this estimate only paces data whose duration
+        the parser cannot determine.
+        """
+
+        if (
+            track.byte_size is not None
+            and track.duration_seconds is not None
+            and track.duration_seconds > 0
+            and track.byte_size > 0
+        ):
+            return float(track.byte_size) / float(track.duration_seconds), "duration", None
+
+        if track.bitrate_kbps:
+            # Bitrate from the file header (local metadata index).
+            kbps = int(track.bitrate_kbps)
+            return max(1.0, float(kbps) * 1000.0 / 8.0), "header_kbps", kbps
+
+        # Fallback pacing when we don't know real duration.
+        # Try to infer kbps from the filename/title (often contains "(320)").
+        # If we under-estimate bitrate here, clients will eventually underrun and stutter.
+        title_kbps = self._infer_kbps_from_title(track.title)
+        kbps = title_kbps or int(self._settings.assumed_bitrate_kbps)
+        # kbps -> bytes/sec
+        pace_mode = "title_kbps" if title_kbps else "assumed_kbps"
+        return max(1.0, float(kbps) * 1000.0 / 8.0), pace_mode, int(kbps)
+
+    async def _produce_frames(self, feed: _TrackFeed, source: Any) -> None:
+        # Pre-buffer source as fast as possible (especially important for Telegram),
+        # then broadcast in real time from the buffer. Raw bytes are split into
+        # frames/pages so the broadcaster can pace on real audio time.
+        parser = frame_parser_for(self._settings.stream_mime_type)
+        buffer_q = feed.queue
+        last_at = time_module.monotonic()
+        try:
+            source_chunk_size = self._settings.chunk_size
+            if getattr(source, "id", None) == "telegram":
+                source_chunk_size = self._settings.telegram_download_chunk_size
+
+            async for raw in source.stream_track(feed.track, source_chunk_size):
+                now = time_module.monotonic()
+                gap = now - last_at
+                last_at = now
+                if gap > feed.source_gap_max_s:
+                    feed.source_gap_max_s = gap
+                if gap >= 0.25:
+                    feed.source_gap_over_250ms += 1
+
+                frames = parser.feed(raw)
+                if not frames:
+                    continue
+                await self._queue_frames(feed, frames)
+
+            tail = parser.flush()
+            if tail:
+                await self._queue_frames(feed, tail)
+        finally:
+            feed.skipped_bytes = parser.skipped_bytes
+            feed.done = True
+            try:
+                await buffer_q.put(None)
             except Exception:
-                logger.exception("Master source error (source_label=%s)", source_label)
-                self._track_started_at = None
-                self._last_master_error = "master_error"
-                self._last_master_error_at = time_module.monotonic()
-                await self.now_playing.set(
-                    NowPlaying(
-                        title="(ошибка источника)",
-                        source=source_label,
-                        duration_seconds=None,
-                        position_seconds=None,
-                        mime_type=self._settings.stream_mime_type,
-                    )
-                )
-                await asyncio.sleep(1.0)
+                pass
+
+    async def _queue_frames(self, feed: _TrackFeed, frames: list[AudioFrame]) -> None:
+        await feed.queue.put(frames)
+        for frame in frames:
+            if frame.duration is not None:
+                feed.buffered_audio_s += frame.duration
+            else:
+                feed.buffered_audio_s += len(frame.data) / feed.bytes_per_second
+        qsz = feed.queue.qsize()
+        feed.buffer_last_chunks = qsz
+        if qsz > feed.buffer_peak_chunks:
+            feed.buffer_peak_chunks = qsz
+
+    async def _play_feed(self, feed: _TrackFeed) -> asyncio.Task[_TrackFeed] | None:
+        """Broadcast one track in real time; returns the prefetch of the next one, if started."""
+
+        track = feed.track
+        self._feed = feed
+        if self._next_feed is feed:
+            self._next_feed = None
+
+        self._track_source_kind = feed.slot_source
+        self._track_key = feed.slot_key
+        self._track_label = feed.label
+        self._track_title = track.title
+        self._track_pace_mode = feed.pace_mode
+        self._track_kbps_used = feed.kbps_used
+        self._track_bytes_per_second = float(feed.bytes_per_second)
+        self._track_sent_bytes = 0
+        self._track_sent_chunks = 0
+        self._track_audio_s = 0.0
+        self._track_sleep_total_s = 0.0
+        self._track_late_max_s = 0.0
+        self._track_starve_max_s = 0.0
+        self._track_starve_over_250ms = 0
+
+        await self.now_playing.set(
+            NowPlaying(
+                title=track.title,
+                source=feed.label,
+                duration_seconds=track.duration_seconds,
+                position_seconds=0,
+                mime_type=self._settings.stream_mime_type,
+            )
+        )
+
+        t0 = time_module.monotonic()
+        self._track_started_at = t0
+        buffer_q = feed.queue
+        chunker = FrameChunker(
+            target_size=int(self._settings.broadcast_chunk_size),
+            fallback_bytes_per_second=feed.bytes_per_second,
+        )
+        eof = False
+        estimate_mode = feed.pace_mode
+        lead_s = max(0.0, float(self._settings.prefetch_lead_seconds))
+        next_task: asyncio.Task[_TrackFeed] | None = None
+        # The schedule leaves this slot mid-track: cut the track there, with the next
+        # slot's first track prefetched as if this one ended then.
+        slot_end_s = self._slot_end_s(feed)
+        cut_at = t0 + slot_end_s if slot_end_s is not None else None
+
+        try:
+            while not (eof and not chunker.pending_bytes):
+                # Refill up to one broadcast unit; block only when nothing is pending.
+                while not eof and not chunker.ready():
+                    if chunker.pending_bytes and buffer_q.empty():
+                        break
+                    wait0 = time_module.monotonic()
+                    item = await buffer_q.get()
+                    waited = time_module.monotonic() - wait0
+                    if waited > self._track_starve_max_s:
+                        self._track_starve_max_s = waited
+                    if waited >= 0.25:
+                        self._track_starve_over_250ms += 1
+
+                    if item is None:
+                        eof = True
+                        break
+                    chunker.push(item)
+                    feed.buffer_last_chunks = buffer_q.qsize()
+
+                unit = chunker.pop()
+                if unit is None:
+                    continue
+                if not unit.header:
+                    self._track_pace_mode = "frames" if not unit.estimated else estimate_mode
+
+                if self._track_ended_at is not None:
+                    # Silence between the end of the previous track and this one.
+                    gap = time_module.monotonic() - self._track_ended_at
+                    self._track_ended_at = None
+                    self._boundary_gap_last_s = gap
+                    if gap > self._boundary_gap_max_s:
+                        self._boundary_gap_max_s = gap
+
+                self._broadcast(unit)
+                self._track_sent_bytes += len(unit.data)
+                self._track_sent_chunks += 1
+                self._track_audio_s += unit.duration
+
+                target_elapsed = self._track_audio_s
+                actual_elapsed = time_module.monotonic() - t0
+                late = actual_elapsed - target_elapsed
+                if late > self._track_late_max_s:
+                    self._track_late_max_s = late
+                if target_elapsed > actual_elapsed:
+                    sleep_s = target_elapsed - actual_elapsed
+                    self._track_sleep_total_s += sleep_s
+                    await asyncio.sleep(sleep_s)
+
+                if next_task is not None and self._pending_schedule is not None:
+                    # Picked under the old schedule: pick again under the reloaded one.
+                    await self._discard_pending_feed(next_task)
+                    next_task = None
+                if next_task is None:
+                    remaining = self._remaining_audio_s(feed)
+                    if cut_at is not None:
+                        until_cut = max(0.0, cut_at - time_module.monotonic())
+                        remaining = until_cut if remaining is None else min(remaining, until_cut)
+                    if remaining is not None and remaining <= lead_s:
+                        next_task = asyncio.create_task(
+                            self._prepare_feed(lead_s=remaining), name="yurets-track-prefetch"
+                        )
+                if cut_at is not None and time_module.monotonic() >= cut_at:
+                    self._slot_cuts_total += 1
+                    break
+        except BaseException:
+            await self._discard_pending_feed(next_task)
+            next_task = None
+            raise
+        finally:
+            feed.task.cancel()
+            try:
+                await feed.task
+            except asyncio.CancelledError:
+                pass
+            except BaseException:
+                # The producer failed (e.g. mid-download) after its frames played out:
+                # the prefetch would otherwise keep the next track's source open.
+                await self._discard_pending_feed(next_task)
+                raise
+
+        self._track_ended_at = time_module.monotonic()
+        return next_task
+
+    def _slot_end_s(self, feed: _TrackFeed) -> float | None:
+        """Seconds until the schedule switches away from `feed`'s slot, or None."""
+
+        now = datetime.now(self._schedule_tz)
+        transition = self.scheduler.next_transition(now)
+        if transition is None:
+            return None
+        slot = self._choose_slot(transition)
+        if slot is None or _plan_key(slot) == feed.plan_key:
+            return None
+        return (transition - now).total_seconds()
+
+    def _remaining_audio_s(self, feed: _TrackFeed) -> float | None:
+        """Audio seconds left in the current track, or None while it cannot be known yet."""
+
+        if feed.done:
+            return max(0.0, feed.buffered_audio_s - self._track_audio_s)
+        duration = feed.track.duration_seconds
+        if duration:
+            return max(0.0, float(duration) - self._track_audio_s)
+        return None
+
+    async def _discard_pending_feed(self, task: asyncio.Task[_TrackFeed] | None) -> None:
+        if task is None:
+            return
+        task.cancel()
+        try:
+            feed = await task
+        except (asyncio.CancelledError, Exception):
+            return
+        if self._next_feed is feed:
+            self._next_feed = None
+        if feed.task is not None:
+            feed.task.cancel()
+            try:
+                await feed.task
+            except (asyncio.CancelledError, Exception):
+                pass
 
     def current_position_seconds(self) -> int | None:
         if self._track_started_at is None:
@@ -383,166 +865,186 @@ class Streamer:
     async def preview_tracks(self, count_per_slot: int) -> list[dict[str, object]]:
         """Preview upcoming deterministic picks per slot.
 
-        Uses a copy of each slot RNG state so the live stream is not affected.
+        Served from the materialized per-slot plan (see `_ensure_plans`), so repeated
+        polling neither touches the sources nor consumes the live decks.
         """
 
-        self._ensure_day_state()
+        await self._ensure_plans()
+        count = max(0, min(int(count_per_slot), PREVIEW_MAX_TRACKS))
+        memo_key: tuple[object, ...] = ("preview", count)
+        cached = self._preview_memo.get(memo_key)
+        if cached is not None:
+            return cached
 
         out: list[dict[str, object]] = []
-        for slot in self._settings.schedule():
-            slot_key = (slot.key or "").strip()
-            if slot.source == "telegram":
-                if not slot_key:
-                    out.append({"slot": slot.model_dump(), "error": "missing key"})
-                    continue
-                source = self._get_telegram_source(slot_key)
-                label = await source.display_name() if source.enabled() else slot_key
-                live_rng = self._rng_for(slot_source=slot.source, key=slot_key)
-            elif slot.source == "local":
-                if not slot_key:
-                    out.append({"slot": slot.model_dump(), "error": "missing key"})
-                    continue
-                key_path = Path(slot_key)
-                music_dir = key_path if key_path.is_absolute() else (DEFAULT_LOCAL_ROOT / key_path)
-                source = self._get_local_source(music_dir)
-                label = music_dir.name
-                live_rng = self._rng_for(slot_source=slot.source, key=str(music_dir))
-            else:
-                out.append({"slot": slot.model_dump(), "error": f"unknown source: {slot.source!r}"})
-                continue
-
-            rng_copy = random.Random()
-            rng_copy.setstate(live_rng.getstate())
-
-            tracks: list[str] = []
-            seen: set[str] = set()
-            err: str | None = None
-            try:
-                want = max(0, int(count_per_slot))
-                # Random choice is with replacement; to present a usable "queue" we
-                # skip duplicates and try a few extra draws.
-                max_attempts = max(want + 20, want * 10)
-                for _ in range(max_attempts):
-                    tr = await source.next_track(
-                        mime_type=self._settings.stream_mime_type, rng=rng_copy
-                    )
-                    title = tr.title
-                    if title in seen:
-                        continue
-                    seen.add(title)
-                    tracks.append(title)
-                    if len(tracks) >= want:
-                        break
-            except Exception as exc:
-                err = str(exc)
-
+        for slot in self.scheduler.slots:
+            plan = self._plans.get(_plan_key(slot))
             out.append(
                 {
-                    "slot": {
-                        "start": slot.start.isoformat(),
-                        "end": slot.end.isoformat(),
-                        "source": slot.source,
-                        "key": slot.key,
-                        "label": label,
-                    },
-                    "tracks": tracks,
-                    "error": err,
+                    "slot": _slot_view(slot, plan),
+                    "tracks": plan.titles[:count] if plan is not None else [],
+                    "error": plan.error if plan is not None else None,
                 }
             )
 
+        self._preview_memo[memo_key] = out
         return out
 
     async def queue_preview(self, count: int) -> dict[str, object]:
         """Preview upcoming tracks for the currently active slot.
 
-        Uses a copy of the slot RNG so the live stream is not affected.
+        The active slot's plan from `preview_tracks`, after the prefetched next track.
         """
 
         slot = self._choose_slot()
         if slot is None:
             return {"slot": None, "tracks": [], "error": "schedule is empty"}
 
-        self._ensure_day_state()
-
-        slot_key = (slot.key or "").strip()
-        try:
-            if slot.source == "telegram":
-                if not slot_key:
-                    return {"slot": slot.model_dump(), "tracks": [], "error": "missing key"}
-                source = self._get_telegram_source(slot_key)
-                label = await source.display_name() if source.enabled() else slot_key
-                live_rng = self._rng_for(slot_source=slot.source, key=slot_key)
-            elif slot.source == "local":
-                if not slot_key:
-                    return {"slot": slot.model_dump(), "tracks": [], "error": "missing key"}
-                key_path = Path(slot_key)
-                music_dir = key_path if key_path.is_absolute() else (DEFAULT_LOCAL_ROOT / key_path)
-                source = self._get_local_source(music_dir)
-                label = music_dir.name
-                live_rng = self._rng_for(slot_source=slot.source, key=str(music_dir))
-            else:
-                return {
-                    "slot": slot.model_dump(),
-                    "tracks": [],
-                    "error": f"unknown source: {slot.source!r}",
-                }
+        await self._ensure_plans()
+        want = max(0, min(int(count), PREVIEW_MAX_TRACKS))
+        # The prefetched next track has already left the deck, so the plan lacks it.
+        next_feed = self._next_feed
+        next_title = (
+            next_feed.track.title
+            if next_feed is not None and next_feed.plan_key == _plan_key(slot)
+            else None
+        )
+        memo_key: tuple[object, ...] = (
+            "queue",
+            slot.source,
+            slot.key,
+            slot.start,
+            slot.end,
+            want,
+            next_title,
+        )
+        cached = self._preview_memo.get(memo_key)
+        if cached is not None:
+            return cached
+
+        plan = self._plans.get(_plan_key(slot))
+        tracks: list[str] = [next_title] if next_title and want else []
+        if plan is not None and plan.error is None:
+            tracks.extend(plan.titles[: want - len(tracks)])
+
+        out: dict[str, object] = {
+            "slot": _slot_view(slot, plan),
+            "tracks": tracks,
+            "error": plan.error if plan is not None else None,
+        }
+        self._preview_memo[memo_key] = out
+        return out
 
-            rng_copy = random.Random()
-            rng_copy.setstate(live_rng.getstate())
+    def _invalidate_plans(self) -> None:
+        self._plans_dirty = True
 
-            current = await self.now_playing.get()
-            current_title = current.title if current is not None else None
+    async def _ensure_plans(self) -> None:
+        """Rebuild the per-slot look-ahead if something changed since the last build."""
 
-            tracks: list[str] = []
-            # Match live no-repeat behavior for the next picks.
-            seen: set[str] = set(self._recent_titles)
-            if current_title:
-                seen.add(str(current_title))
+        self._ensure_day_state()
+        if not self._plans_dirty:
+            return
+        async with self._plans_lock:
+            if not self._plans_dirty:
+                return
+            # Cleared before awaiting: a change during the rebuild marks it dirty again.
+            self._plans_dirty = False
 
-            want = max(0, int(count))
-            # Generate extra to avoid duplicates.
-            max_attempts = max(want + 20, want * 10)
-            for _ in range(max_attempts):
-                tr = await source.next_track(
-                    mime_type=self._settings.stream_mime_type, rng=rng_copy
-                )
-                title = tr.title
-                if title in seen:
+            plans: dict[tuple[str, str], _SlotPlan] = {}
+            for slot in self.scheduler.slots:
+                plan_key = _plan_key(slot)
+                if plan_key in plans:
                     continue
-                seen.add(title)
-                tracks.append(title)
-                if len(tracks) >= want:
-                    break
+                try:
+                    source, deck, label, _ = await self._open_slot(slot)
+                except Exception as exc:
+                    plans[plan_key] = _SlotPlan(label=plan_key[1], titles=[], error=str(exc))
+                    continue
+                try:
+                    catalog = await source.catalog(mime_type=self._settings.stream_mime_type)
+                    titles = self._simulate_picks(source, deck, catalog, PREVIEW_MAX_TRACKS)
+                    plans[plan_key] = _SlotPlan(label=label, titles=titles)
+                except Exception as exc:
+                    plans[plan_key] = _SlotPlan(label=label, titles=[], error=str(exc))
+
+            self._plans = plans
+            self._plans_rebuilt_total += 1
+            self._preview_memo.clear()
+
+    def _simulate_picks(
+        self, source: Any, deck: TrackDeck, catalog: TrackCatalog, count: int
+    ) -> list[str]:
+        """Titles the next `count` picks from `deck` would play, drawn from a copy of it.
+
+        Same skip/defer rules as `_pick_next_track_no_repeat`, with every simulated pick
+        entering the no-repeat window in turn; the live deck is left as it is.
+        """
+
+        scratch = deck.copy()
+        scratch.sync(catalog)
+        window = self._no_repeat_window
+        recent: deque[str] = deque(self._recent_titles, maxlen=window)
+        # At the next pick the last picked track is the one playing.
+        last = self._recent_titles[-1] if self._recent_titles else self._track_title
+        avoid: set[str] = set()
+
+        def _skip(key: str) -> bool:
+            return source.track_title(key) in avoid
+
+        titles: list[str] = []
+        while len(titles) < count:
+            avoid.clear()
+            avoid.update(recent)
+            if last:
+                avoid.add(last)
+            key = scratch.draw(skip=_skip, defer_by=max(1, window))
+            if key is None:
+                break
+            last = source.track_title(key)
+            titles.append(last)
+            recent.append(last)
+        return titles
+
+    async def _open_slot(self, slot: Any) -> tuple[Any, TrackDeck, str, str]:
+        """Resolve a schedule slot to (source, deck, label, key)."""
+
+        if slot.source == "telegram":
+            channel = (slot.key or "").strip()
+            if not channel:
+                raise RuntimeError("Schedule slot for telegram must include key=<channel>")
+            tg_source = self._get_telegram_source(channel)
+            label = await tg_source.display_name()
+            return tg_source, self._deck_for(slot_source=slot.source, key=channel), label, channel
+
+        if slot.source == "local":
+            music_key = (slot.key or "").strip()
+            if not music_key:
+                raise RuntimeError("Schedule slot for local must include key=<path>")
+            music_dir = Path(self._source_key(slot))
+            local_source = self._get_local_source(music_dir)
+            deck = self._deck_for(slot_source=slot.source, key=str(music_dir))
+            return local_source, deck, str(music_dir.name), str(music_dir)
+
+        raise RuntimeError(f"Unknown source: {slot.source!r}")
+
+    @staticmethod
+    def _source_key(slot: Any) -> str:
+        """Source identity of a slot: the channel, or the resolved music directory."""
 
-            return {
-                "slot": {
-                    "start": slot.start.isoformat(),
-                    "end": slot.end.isoformat(),
-                    "source": slot.source,
-                    "key": slot.key,
-                    "label": label,
-                },
-                "tracks": tracks,
-                "error": None,
-            }
-        except Exception as exc:
-            return {
-                "slot": {
-                    "start": slot.start.isoformat(),
-                    "end": slot.end.isoformat(),
-                    "source": slot.source,
-                    "key": slot.key,
-                },
-                "tracks": [],
-                "error": str(exc),
-            }
+        key = (slot.key or "").strip()
+        if slot.source == "local" and key:
+            key_path = Path(key)
+            return str(key_path if key_path.is_absolute() else (DEFAULT_LOCAL_ROOT / key_path))
+        return key
 
     def _ensure_day_state(self) -> None:
         today = datetime.now(self._schedule_tz).date()
         if self._current_day != today:
             self._current_day = today
-            self._slot_rngs.clear()
-            self._recent_titles.clear()
+            self._slot_decks.clear()
+            self._invalidate_plans()
+            if self._settings.no_repeat_window_scope == "day":
+                self._recent_titles.clear()
 
     def _remember_played(self, title: str) -> None:
         if not title:
@@ -554,8 +1056,8 @@ class Streamer:
             except Exception:
                 break
 
-    async def _pick_next_track_no_repeat(self, source: Any, rng: random.Random) -> Any:
-        """Pick a track trying to avoid repeats within the day window."""
+    async def _pick_next_track_no_repeat(self, source: Any, deck: TrackDeck) -> Any:
+        """Take the next card from the slot deck, deferring titles played recently."""
 
         avoid: set[str] = set(self._recent_titles)
 
@@ -564,65 +1066,117 @@ class Streamer:
         if current is not None and current.title:
             avoid.add(str(current.title))
 
-        last = None
-        # Try a bounded number of times to find a non-repeated title.
-        # If the pool is small, we'll fall back to whatever we got.
-        for _ in range(250):
-            tr = await source.next_track(mime_type=self._settings.stream_mime_type, rng=rng)
-            last = tr
-            if not getattr(tr, "title", None):
-                return tr
-            if tr.title not in avoid:
-                return tr
-
-        # Fallback: accept a repeat.
-        if last is None:
-            return await source.next_track(mime_type=self._settings.stream_mime_type, rng=rng)
-        return last
-
-    def _broadcast(self, chunk: bytes) -> None:
-        # Protect memory: if a subscriber is slow, drop the subscriber.
-        # Dropping bytes in the middle of MP3/OGG corrupts the stream and causes audible stutter.
+        deck.sync(await source.catalog(mime_type=self._settings.stream_mime_type))
+        key = deck.draw(
+            skip=lambda k: source.track_title(k) in avoid,
+            defer_by=max(1, self._no_repeat_window),
+        )
+        if key is None:
+            raise RuntimeError("Source has no tracks")
+        return await source.resolve_track(key)
+
+    def _broadcast(self, unit: BroadcastUnit) -> None:
+        # O(1) regardless of listener count: the unit goes into the shared ring once
+        # and subscribers pick it up via their own cursors. Memory is bounded by the
+        # ring capacity; slow subscribers are detected by cursor lag on read.
+        # Each rendition's encoder also gets the unit exactly once.
+        chunk = unit.data
         self._broadcast_chunks_total += 1
         self._broadcast_bytes_total += len(chunk)
         self._last_broadcast_at = time_module.monotonic()
-        for sid, q in list(self._subscribers.items()):
-            try:
-                q.put_nowait(chunk)
-            except asyncio.QueueFull:
-                self._subscriber_queue_full_total += 1
-                self._close_subscriber(sid, reason="queue_full")
-            except Exception:
-                self._close_subscriber(sid, reason="exception")
-
-    def _close_subscriber(self, sid: int, reason: str) -> None:
-        q = self._subscribers.pop(sid, None)
-        if q is None:
-            return
-        self._subscribers_dropped_total += 1
-        try:
-            while True:
-                q.get_nowait()
-        except Exception:
-            pass
-        try:
-            q.put_nowait(_SENTINEL)
-        except Exception:
-            pass
+        self._output.publish(chunk, unit.duration, header=unit.header)
+        for rendition in self._renditions.values():
+            rendition.feed(chunk)
+
+    def _record_first_audio(self, seconds: float) -> None:
+        self._first_audio_count += 1
+        self._first_audio_last_s = seconds
+        self._first_audio_sum_s += seconds
+        if seconds > self._first_audio_max_s:
+            self._first_audio_max_s = seconds
+
+    def _close_subscriber(self, sid: int, sub: BroadcastReader) -> None:
+        self._subscribers.pop(sid, None)
+        self._subscriber_skips_closed += sub.skips
+        self._subscriber_skipped_chunks_closed += sub.skipped_chunks
+        self._subscriber_writes_closed += sub.writes
+        self._subscriber_write_bytes_closed += sub.write_bytes
+        if sub.lagged:
+            # Lagging for too long (or the policy is "disconnect"): the listener
+            # reconnects and starts over from the burst.
+            self._subscriber_lagged_total += 1
+            self._subscribers_dropped_total += 1
+            logger.debug("Subscriber %s closed (reason=lagged)", sid)
 
     def diagnostics(self) -> dict[str, Any]:
         now = time_module.monotonic()
         track_age_s = (now - self._track_started_at) if self._track_started_at else None
+        lag_max = max((sub.lag() for sub in self._subscribers.values()), default=0)
+        writes = self._subscriber_writes_closed + sum(
+            sub.writes for sub in self._subscribers.values()
+        )
+        write_bytes = self._subscriber_write_bytes_closed + sum(
+            sub.write_bytes for sub in self._subscribers.values()
+        )
+        lagging = sorted(
+            self._subscribers.items(), key=lambda item: (item[1].lag(), item[1].skips)
+        )[-_DIAGNOSTICS_LISTENERS:]
+        feed = self._feed
+        next_feed = self._next_feed
+        next_transition = self.next_schedule_transition()
 
         return {
+            "mount": self.mount,
+            "mime_type": self.mime_type,
             "uptime_seconds": int(max(0.0, now - self._stats_started_at)),
             "subscribers": {
                 "current": len(self._subscribers),
                 "peak": self._subscribers_peak,
                 "created_total": self._subscribers_created_total,
                 "dropped_total": self._subscribers_dropped_total,
-                "queue_full_total": self._subscriber_queue_full_total,
-                "queue_max_chunks": int(self._settings.subscriber_queue_chunks),
+                "lagged_total": self._subscriber_lagged_total,
+                "lag_max_chunks": lag_max,
+                "slow_policy": self._settings.slow_subscriber_policy,
+                "skips_total": self._subscriber_skips_closed
+                + sum(sub.skips for sub in self._subscribers.values()),
+                "skipped_chunks_total": self._subscriber_skipped_chunks_closed
+                + sum(sub.skipped_chunks for sub in self._subscribers.values()),
+                "writes_total": writes,
+                "write_avg_bytes": write_bytes // writes if writes else None,
+                # The most lagging listeners, worst first.
+                "listeners": [
+                    {
+                        "id": sid,
+                        "connected_seconds": int(now - sub.joined_at),
+                        "lag_chunks": sub.lag(),
+                        "skips": sub.skips,
+                        "skipped_chunks": sub.skipped_chunks,
+                        "lagging_seconds": (
+                            int(now - sub.lagging_since) if sub.lagging_since is not None else 0
+                        ),
+                    }
+                    for sid, sub in reversed(lagging)
+                ],
+                "ring_capacity_chunks": self._output.ring.capacity,
+                "ring_head_seq": self._output.ring.head_seq,
+                "burst_on_connect_seconds": float(self._settings.burst_on_connect_seconds),
+                "burst_avg_seconds": (
+                    round(self._burst_seconds_total / self._subscribers_created_total, 3)
+                    if self._subscribers_created_total
+                    else None
+                ),
+                "first_audio_count": self._first_audio_count,
+                "first_audio_last_ms": (
+                    int(1000 * self._first_audio_last_s)
+                    if self._first_audio_last_s is not None
+                    else None
+                ),
+                "first_audio_avg_ms": (
+                    int(1000 * self._first_audio_sum_s / self._first_audio_count)
+                    if self._first_audio_count
+                    else None
+                ),
+                "first_audio_max_ms": int(1000 * self._first_audio_max_s),
             },
             "broadcast": {
                 "chunks_total": self._broadcast_chunks_total,
@@ -634,10 +1188,12 @@ class Streamer:
                 ),
                 "source_chunk_size": int(self._settings.chunk_size),
                 "broadcast_chunk_size": int(self._settings.broadcast_chunk_size),
+                "codec_header_bytes": len(self._output.codec_headers),
                 "track_buffer_chunks": int(self._settings.track_buffer_chunks),
             },
             "master": {
                 "loops_total": self._master_loops_total,
+                "plans_rebuilt_total": self._plans_rebuilt_total,
                 "last_error": self._last_master_error,
                 "last_error_ago_ms": (
                     int(1000 * (now - self._last_master_error_at))
@@ -645,6 +1201,25 @@ class Streamer:
                     else None
                 ),
             },
+            "schedule": {
+                "timezone": self._schedule_tz_name,
+                "slots": len(self.scheduler.slots),
+                "next_transition_at": (
+                    next_transition.isoformat() if next_transition is not None else None
+                ),
+                "file": str(self._schedule_file) if self._schedule_file is not None else None,
+                "reloads_total": self._schedule_reloads_total,
+                "reload_pending": self._pending_schedule is not None,
+                "slot_cuts_total": self._slot_cuts_total,
+                "reload_last_error": self._schedule_reload_last_error,
+            },
+            "local_metadata": self._pool.local_stats(),
+            "telegram_cache": self.telegram_session.media_cache.stats(),
+            "telegram_download": self.telegram_session.downloader.stats(),
+            "telegram_sync": {
+                "indexed_tracks": self.telegram_session.indexed_tracks(),
+                "channels": self._pool.telegram_channel_stats(),
+            },
             "track": {
                 "age_seconds": (int(track_age_s) if track_age_s is not None else None),
                 "source": self._track_source_kind,
@@ -656,28 +1231,66 @@ class Streamer:
                 "bytes_per_second": self._track_bytes_per_second,
                 "sent_bytes": self._track_sent_bytes,
                 "sent_chunks": self._track_sent_chunks,
+                "audio_seconds": round(self._track_audio_s, 3),
+                "skipped_bytes": feed.skipped_bytes if feed is not None else 0,
                 "sleep_total_ms": int(1000 * self._track_sleep_total_s),
                 "late_max_ms": int(1000 * self._track_late_max_s),
-                "source_gap_max_ms": int(1000 * self._track_source_gap_max_s),
-                "source_gap_over_250ms": self._track_source_gap_over_250ms,
+                "source_gap_max_ms": int(1000 * feed.source_gap_max_s) if feed is not None else 0,
+                "source_gap_over_250ms": feed.source_gap_over_250ms if feed is not None else 0,
                 "starve_max_ms": int(1000 * self._track_starve_max_s),
                 "starve_over_250ms": self._track_starve_over_250ms,
-                "buffer_last_chunks": self._track_buffer_last_chunks,
-                "buffer_peak_chunks": self._track_buffer_peak_chunks,
+                "buffer_last_chunks": feed.buffer_last_chunks if feed is not None else 0,
+                "buffer_peak_chunks": feed.buffer_peak_chunks if feed is not None else 0,
+            },
+            "renditions": {
+                name: {
+                    **r.stats(),
+                    "listeners": sum(
+                        1 for sub in self._subscribers.values() if sub.output is r.output
+                    )
+                    + (self._fanout.listeners(self.mount, name) if self._fanout is not None else 0),
+                }
+                for name, r in self._renditions.items()
+            },
+            "hls": {name: segmenter.stats() for name, segmenter in self._hls.items()},
+            "fanout": self._fanout.stats(self.mount) if self._fanout is not None else None,
+            "relay_clients": {
+                "current": self._relay_clients,
+                "connected_total": self._relay_clients_total,
+            },
+            "prefetch": {
+                "lead_seconds": float(self._settings.prefetch_lead_seconds),
+                "next_title": next_feed.track.title if next_feed is not None else None,
+                "next_buffered_seconds": (
+                    round(next_feed.buffered_audio_s, 3) if next_feed is not None else None
+                ),
+                "late_total": self._prefetch_late_total,
+                "boundary_gap_last_ms": (
+                    int(1000 * self._boundary_gap_last_s)
+                    if self._boundary_gap_last_s is not None
+                    else None
+                ),
+                "boundary_gap_max_ms": int(1000 * self._boundary_gap_max_s),
             },
         }
 
-    def _rng_for(self, slot_source: str, key: str) -> random.Random:
+    def _deck_for(self, slot_source: str, key: str) -> TrackDeck:
         day = self._current_day or datetime.now(self._schedule_tz).date()
         cache_key = (slot_source, key)
-        rng = self._slot_rngs.get(cache_key)
-        if rng is not None:
-            return rng
-
-        seed = self._stable_seed(str(day.isoformat()), slot_source, key, key)
-        rng = random.Random(seed)
-        self._slot_rngs[cache_key] = rng
-        return rng
+        deck = self._slot_decks.get(cache_key)
+        if deck is not None:
+            return deck
+
+        # Same per-day seed the slot RNG always used: cycle 0 of the deck is the
+        # shuffle `random.Random(seed)` produces.
+        parts = [str(day.isoformat()), slot_source, key, key]
+        if self.mount != "main":
+            # Mounts sharing a library still get their own running order.
+            parts.append(self.mount)
+        seed = self._stable_seed(*parts)
+        deck = TrackDeck(seed=seed)
+        self._slot_decks[cache_key] = deck
+        return deck
 
     @staticmethod
     def _stable_seed(*parts: str) -> int:
@@ -713,3 +1326,17 @@ class Streamer:
                 pass
 
         return None
+
+
+def _plan_key(slot: Any) -> tuple[str, str]:
+    return (str(slot.source), (slot.key or "").strip())
+
+
+def _slot_view(slot: Any, plan: _SlotPlan | None) -> dict[str, object]:
+    return {
+        "start": slot.start.isoformat(),
+        "end": slot.end.isoformat(),
+        "source": slot.source,
+        "key": slot.key,
+        "label": plan.label if plan is not None else None,
+    }
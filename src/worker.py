@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+import socket
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Scope
+
+from src.api.pages import add_page_routes
+from src.api.stream import StreamEndpoint, query_param
+from src.settings import Settings
+from src.streaming.broadcast import BroadcastReader
+from src.streaming.relay import RelayedOutput, pump_shared_ring
+from src.streaming.rendition import parse_renditions
+from src.streaming.shared_ring import SharedFanout
+
+_PROXY_CONNECT_TIMEOUT_S = 5.0
+# How often a worker checks that its master is still alive.
+_MASTER_CHECK_INTERVAL_S = 2.0
+# Time allowed for the master to start answering; the body may then stream indefinitely.
+_PROXY_TIMEOUT_S = 30.0
+_PROXY_READ_BYTES = 64 * 1024
+# Request headers passed on to the master, and response headers passed back.
+_PROXY_REQUEST_HEADERS = ("authorization", "content-type", "accept")
+_PROXY_RESPONSE_HEADERS = (
+    "content-type",
+    "content-length",
+    "cache-control",
+    "pragma",
+    "www-authenticate",
+)
+
+
+def create_worker_app(
+    settings: Settings, prefix: str, workers: int, worker: int, master_socket: str
+) -> FastAPI:
+    """HTTP worker of split mode (see src.serve).
+
+    Serves /stream from the master's shared-memory rings (one local copy per output,
+    shared by all listeners of this worker) and the player page itself; everything else
+    is proxied to the master.
+    """
+
+    relays: dict[tuple[str, str], RelayedOutput] = {}
+    for mount, mount_settings in settings.mounts():
+        variants = {"main": mount_settings.stream_mime_type}
+        for spec in parse_renditions(mount_settings.renditions):
+            variants[spec.name] = spec.mime_type
+        for variant, mime_type in variants.items():
+            relays[(mount, variant)] = RelayedOutput(
+                mime_type,
+                capacity=int(settings.subscriber_queue_chunks),
+                burst_seconds=float(mount_settings.burst_on_connect_seconds),
+                skip_lagging=settings.slow_subscriber_policy == "skip",
+                max_lag_seconds=float(settings.slow_subscriber_disconnect_seconds),
+                write_max_bytes=int(settings.subscriber_write_max_bytes),
+                write_latency_seconds=float(settings.subscriber_write_latency_seconds),
+            )
+    default_mount = next(iter(settings.mounts()))[0]
+
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        fanout = SharedFanout.attach(prefix, settings, workers)
+
+        def _report(key: tuple[str, str], relay: RelayedOutput) -> None:
+            fanout.report(
+                worker, key[0], key[1], relay.listeners, relay.lagged_total, relay.skips_total
+            )
+
+        pumps = [asyncio.create_task(_exit_with_master(os.getppid()), name="yurets-master-check")]
+        for key, relay in relays.items():
+            relay.on_change = lambda r, key=key: _report(key, r)
+            pumps.append(
+                asyncio.create_task(
+                    pump_shared_ring(fanout.readers[key], relay), name=f"yurets-pump-{key}"
+                )
+            )
+        try:
+            yield
+        finally:
+            for task in pumps:
+                task.cancel()
+            await asyncio.gather(*pumps, return_exceptions=True)
+            for relay in relays.values():
+                relay.output.close()
+            fanout.release()
+
+    app = FastAPI(title="Юрец ФМ", lifespan=lifespan)
+
+    def _open_stream(scope: Scope) -> tuple[BroadcastReader, str]:
+        mount = scope["path_params"].get("mount", default_mount)
+        relay = relays.get((mount, query_param(scope, "rendition") or "main"))
+        if relay is None or relay.mime_type is None:
+            raise HTTPException(status_code=404, detail=f"Unknown mount or rendition: {mount}")
+        return relay.open_listener(), relay.mime_type
+
+    @app.get("/health")
+    async def health() -> dict[str, str]:
+        return {"status": "ok"}
+
+    stream = StreamEndpoint(_open_stream)
+    app.add_route("/stream", stream, methods=["GET"], include_in_schema=False)
+    app.add_route("/stream/{mount}", stream, methods=["GET"], include_in_schema=False)
+
+    add_page_routes(app)
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "HEAD"], include_in_schema=False)
+    async def proxy(request: Request, path: str) -> Response:
+        return await _proxy_to_master(request, master_socket)
+
+    return app
+
+
+async def _exit_with_master(master_pid: int) -> None:
+    # A master killed outright can't stop its workers; they would keep the port.
+    while os.getppid() == master_pid:
+        await asyncio.sleep(_MASTER_CHECK_INTERVAL_S)
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+async def _proxy_to_master(request: Request, master_socket: str) -> Response:
+    # One request per connection. The body is passed on as it arrives, so long-lived
+    # responses such as /relay/<mount> stream through the worker as well.
+    body = await request.body()
+    target = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+    lines = [
+        f"{request.method} {target} HTTP/1.1",
+        "Host: master",
+        "Connection: close",
+        f"Content-Length: {len(body)}",
+    ]
+    lines += [f"{h}: {request.headers[h]}" for h in _PROXY_REQUEST_HEADERS if h in request.headers]
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(master_socket), timeout=_PROXY_CONNECT_TIMEOUT_S
+        )
+    except (OSError, asyncio.TimeoutError) as e:
+        raise HTTPException(status_code=502, detail=f"Master unavailable: {e}") from e
+    try:
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=_PROXY_TIMEOUT_S)
+    except (
+        OSError,
+        asyncio.TimeoutError,
+        asyncio.IncompleteReadError,
+        asyncio.LimitOverrunError,
+    ) as e:
+        writer.close()
+        raise HTTPException(status_code=502, detail=f"Master unavailable: {e}") from e
+
+    status_line, *header_lines = head[:-4].decode("latin-1").split("\r\n")
+    headers: dict[str, str] = {}
+    chunked = False
+    for line in header_lines:
+        name, _, value = line.partition(":")
+        name = name.strip().lower()
+        if name == "transfer-encoding":
+            chunked = "chunked" in value.lower()
+        elif name in _PROXY_RESPONSE_HEADERS:
+            headers[name] = value.strip()
+    try:
+        status = int(status_line.split()[1])
+    except (IndexError, ValueError) as e:
+        writer.close()
+        raise HTTPException(status_code=502, detail="Bad response from master") from e
+
+    async def _body() -> AsyncIterator[bytes]:
+        try:
+            pieces = _read_chunked(reader) if chunked else _read_to_eof(reader)
+            async for piece in pieces:
+                yield piece
+        finally:
+            writer.close()
+
+    return StreamingResponse(_body(), status_code=status, headers=headers)
+
+
+async def _read_to_eof(reader: asyncio.StreamReader) -> AsyncIterator[bytes]:
+    while piece := await reader.read(_PROXY_READ_BYTES):
+        yield piece
+
+
+async def _read_chunked(reader: asyncio.StreamReader) -> AsyncIterator[bytes]:
+    # HTTP/1.1 chunked transfer coding (RFC 9112, 7.1); trailers are dropped.
+    while True:
+        size = int((await reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+        if size == 0:
+            while await reader.readuntil(b"\r\n") != b"\r\n":
+                pass
+            return
+        yield await reader.readexactly(size)
+        await reader.readexactly(2)
+
+
+def run_worker(
+    prefix: str, workers: int, worker: int, master_socket: str, graceful_shutdown_s: int
+) -> None:
+    """Worker process entry point: its own SO_REUSEPORT listener on the shared port."""
+
+    settings = Settings()
+    app = create_worker_app(settings, prefix, workers, worker, master_socket)
+    family = socket.AF_INET6 if ":" in settings.host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    # The kernel spreads incoming connections over every worker bound to the port.
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((settings.host, settings.port))
+    server = uvicorn.Server(
+        uvicorn.Config(app, log_level="info", timeout_graceful_shutdown=graceful_shutdown_s)
+    )
+    server.run(sockets=[sock])
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from src.streaming.broadcast import (
+    BroadcastOutput,
+    BroadcastReader,
+    BroadcastRing,
+    SubscriberLagged,
+)
+
+
+def _publish(output: BroadcastOutput, count: int, duration: float = 0.1, size: int = 10) -> None:
+    for _ in range(count):
+        seq = output.ring.head_seq
+        output.publish(bytes([seq % 256]) * size, duration)
+
+
+def test_ring_wraps_and_reports_lag() -> None:
+    ring = BroadcastRing(capacity=4)
+    for i in range(6):
+        assert ring.publish(bytes([i])) == i
+
+    assert ring.head_seq == 6
+    assert ring.oldest_seq == 2
+    # Slots 0 and 1 were reused by chunks 4 and 5.
+    assert ring.get(4) == b"\x04"
+    assert ring.get(5) == b"\x05"
+    with pytest.raises(SubscriberLagged):
+        ring.get(1)
+    with pytest.raises(IndexError):
+        ring.get(6)
+    assert ring.lag(1) == 5
+    assert ring.lag(6) == 0
+
+
+def test_backlog_start_stops_at_oldest_and_floor() -> None:
+    ring = BroadcastRing(capacity=4)
+    for i in range(6):
+        ring.publish(bytes([i]), 1.0)
+
+    assert ring.backlog_start(2.0) == 4
+    assert ring.backlog_start(100.0) == ring.oldest_seq
+    assert ring.backlog_start(100.0, floor=3) == 3
+    assert ring.span_seconds(0, 6) == 4.0
+
+
+def test_join_does_not_burst_past_codec_headers() -> None:
+    output = BroadcastOutput(capacity=16)
+    _publish(output, 3, duration=1.0)
+    output.publish(b"head1", 0.0, header=True)
+    output.publish(b"head2", 0.0, header=True)
+    _publish(output, 2, duration=1.0)
+
+    assert output.codec_headers == b"head1head2"
+    assert output.codec_headers_seq == 3
+    # A long burst stops at the setup pages, which then come from the ring.
+    assert output.join(100.0) == (3, b"")
+    # A short one starts after them, so they are handed out first.
+    assert output.join(1.0) == (6, b"head1head2")
+
+
+def test_catch_up_replays_headers_only_for_a_new_stream() -> None:
+    output = BroadcastOutput(capacity=64)
+    _publish(output, 2)
+    output.publish(b"head", 0.0, header=True)
+    _publish(output, 30, duration=0.25)
+
+    # The reader already had these setup pages; it restarts a second behind the head.
+    assert output.catch_up(cursor=20) == (29, b"")
+    # The stream began in the part it skipped.
+    assert output.catch_up(cursor=1) == (29, b"head")
+
+
+def test_catch_up_takes_setup_pages_from_the_ring_when_it_reaches_them() -> None:
+    output = BroadcastOutput(capacity=16)
+    _publish(output, 2)
+    output.publish(b"head", 0.0, header=True)
+    _publish(output, 3)
+
+    assert output.catch_up(cursor=1) == (2, b"")
+
+
+def test_skip_with_a_burst_longer_than_the_ring_stays_in_it() -> None:
+    async def scenario() -> None:
+        output = BroadcastOutput(capacity=8)
+        reader = BroadcastReader(
+            output, burst_seconds=100.0, skip_lagging=True, max_lag_seconds=0.0
+        )
+        _publish(output, 20)
+
+        # Half the ring back, not back to the oldest entry.
+        assert await reader.next() == b"\x10" * 10
+        assert reader.cursor == 17
+        # A few more chunks don't push it out again.
+        _publish(output, 3)
+        assert await reader.next() == b"\x11" * 10
+        assert reader.skips == 1
+        assert not reader.lagged
+
+    asyncio.run(scenario())
+
+
+def test_reader_without_skipping_gives_up_on_lag() -> None:
+    async def scenario() -> None:
+        output = BroadcastOutput(capacity=4)
+        reader = BroadcastReader(output, burst_seconds=0.0)
+        _publish(output, 6)
+        with pytest.raises(SubscriberLagged):
+            await reader.next()
+        assert reader.lagged
+        assert reader.skips == 0
+
+    asyncio.run(scenario())
+
+
+def test_reader_skips_then_disconnects_when_lagging_again() -> None:
+    async def scenario() -> None:
+        output = BroadcastOutput(capacity=4)
+        skipped: list[int] = []
+        reader = BroadcastReader(
+            output,
+            burst_seconds=0.2,
+            skip_lagging=True,
+            max_lag_seconds=0.0,
+            on_skip=lambda r: skipped.append(r.cursor),
+        )
+        _publish(output, 10)
+
+        # First fall-out: skip to 0.2 s before the head.
+        assert await reader.next() == b"\x08" * 10
+        assert reader.skips == 1
+        assert reader.skipped_chunks == 8
+        assert skipped == [8]
+        assert reader.lagging_since is not None
+        assert not reader.lagged
+
+        # Falls out again before catching up with the head: gives up.
+        _publish(output, 10)
+        with pytest.raises(SubscriberLagged):
+            await reader.next()
+        assert reader.lagged
+        assert reader.skips == 1
+
+    asyncio.run(scenario())
+
+
+def test_reader_catching_up_resets_the_lag_clock() -> None:
+    async def scenario() -> None:
+        output = BroadcastOutput(capacity=4)
+        reader = BroadcastReader(output, burst_seconds=0.1, skip_lagging=True, max_lag_seconds=0.0)
+        _publish(output, 10)
+        assert await reader.next() == b"\x08" * 10
+        assert await reader.next() == b"\x09" * 10
+        assert reader.lagging_since is not None
+
+        # At the head: waits, and the next chunk finds it caught up.
+        pending = asyncio.ensure_future(reader.next())
+        await asyncio.sleep(0)
+        _publish(output, 1)
+        assert await pending == b"\x0a" * 10
+        assert reader.lagging_since is None
+
+        # So the next fall-out is a skip again, not a disconnect.
+        _publish(output, 10)
+        assert await reader.next() == b"\x13" * 10
+        assert reader.skips == 2
+        assert not reader.lagged
+
+    asyncio.run(scenario())
+
+
+def test_read_coalesces_up_to_write_max_bytes() -> None:
+    async def scenario() -> None:
+        output = BroadcastOutput(capacity=16)
+        _publish(output, 5, size=10)
+        reader = BroadcastReader(output, burst_seconds=100.0, write_max_bytes=25)
+
+        assert await reader.read() == b"\x00" * 10 + b"\x01" * 10
+        assert await reader.read() == b"\x02" * 10 + b"\x03" * 10
+        assert await reader.read() == b"\x04" * 10
+        assert reader.writes == 3
+        assert reader.write_bytes == 50
+
+        output.close()
+        assert await reader.read() is None
+
+    asyncio.run(scenario())
+
+
+def test_read_passes_a_single_chunk_without_copy() -> None:
+    async def scenario() -> None:
+        output = BroadcastOutput(capacity=4)
+        chunk = memoryview(b"x" * 100)
+        output.publish(chunk, 0.1)
+        reader = BroadcastReader(output, burst_seconds=100.0, write_max_bytes=150)
+        assert await reader.read() is chunk
+
+    asyncio.run(scenario())
+
+
+def test_read_stops_once_latency_worth_of_audio_is_pending() -> None:
+    async def scenario() -> None:
+        output = BroadcastOutput(capacity=16)
+        reader = BroadcastReader(output, burst_seconds=0.0, write_latency_seconds=0.25)
+        pending = asyncio.ensure_future(reader.read())
+        for _ in range(4):
+            await asyncio.sleep(0.01)
+            _publish(output, 1, duration=0.1)
+        # Three chunks cover the latency; the fourth goes into the next write.
+        assert len(await pending) == 30
+        assert reader.cursor == 3
+
+    asyncio.run(scenario())
+
+
+def test_read_waits_at_most_write_latency() -> None:
+    async def scenario() -> None:
+        output = BroadcastOutput(capacity=16)
+        reader = BroadcastReader(output, burst_seconds=0.0, write_latency_seconds=0.05)
+        _publish(output, 1, duration=0.01)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        assert len(await reader.read()) == 10
+        assert loop.time() - started >= 0.04
+
+    asyncio.run(scenario())
+
+
+def test_read_starts_with_codec_headers() -> None:
+    async def scenario() -> None:
+        output = BroadcastOutput(capacity=16)
+        output.publish(b"head", 0.0, header=True)
+        _publish(output, 3, duration=1.0)
+        reader = BroadcastReader(output, burst_seconds=1.0)
+
+        assert await reader.read() == b"head" + b"\x03" * 10
+
+    asyncio.run(scenario())
+
+
+def test_first_audio_is_reported_once_after_audio_went_out() -> None:
+    async def scenario() -> None:
+        output = BroadcastOutput(capacity=16)
+        output.publish(b"head", 0.0, header=True)
+        _publish(output, 1)
+        reports: list[float] = []
+        closed: list[BroadcastReader] = []
+        reader = BroadcastReader(
+            output, burst_seconds=0.0, on_first_audio=reports.append, on_close=closed.append
+        )
+
+        assert await reader.read() == b"head"
+        reader.sent()
+        assert reader.first_audio_s is None
+
+        _publish(output, 1)
+        await reader.read()
+        reader.sent()
+        reader.sent()
+        assert len(reports) == 1
+        assert reader.first_audio_s == reports[0]
+
+        reader.close()
+        reader.close()
+        assert closed == [reader]
+
+    asyncio.run(scenario())
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from src.streaming.deck import TrackDeck
+from src.streaming.sources.base import TrackCatalog
+
+_KEYS = [f"track-{i:02d}" for i in range(20)]
+
+
+def _never(key: str) -> bool:
+    return False
+
+
+def _deck(keys: list[str] = _KEYS, seed: int = 42) -> TrackDeck:
+    deck = TrackDeck(seed=seed)
+    deck.sync(TrackCatalog(version=1, keys=keys))
+    return deck
+
+
+def _draw(deck: TrackDeck, count: int) -> list[str | None]:
+    return [deck.draw(skip=_never, defer_by=3) for _ in range(count)]
+
+
+def test_order_depends_only_on_seed_and_library() -> None:
+    assert _draw(_deck(), 50) == _draw(_deck(), 50)
+    assert _draw(_deck(), 20) != _draw(_deck(seed=43), 20)
+
+
+def test_every_key_once_per_cycle() -> None:
+    deck = _deck()
+    first, second = _draw(deck, 20), _draw(deck, 20)
+
+    assert sorted(first) == _KEYS
+    assert sorted(second) == _KEYS
+    assert first != second
+
+
+def test_peek_does_not_change_the_order() -> None:
+    deck, reference = _deck(), _deck()
+    # Peeking past the end of the cycle deals the next one early.
+    assert deck.peek(25, skip=_never) == _draw(reference, 20)
+    assert _draw(deck, 40) == _draw(_deck(), 40)
+
+
+def test_peek_leaves_out_skipped_keys() -> None:
+    deck = _deck()
+    order = _draw(_deck(), 5)
+    assert deck.peek(3, skip=lambda key: key == order[0]) == order[1:4]
+
+
+def test_skipped_card_is_deferred_not_dropped() -> None:
+    order = _draw(_deck(), 6)
+    deck = _deck()
+    recent = {order[0]}
+
+    assert deck.draw(skip=lambda key: key in recent, defer_by=3) == order[1]
+    # Goes back 3 places from where the next pick starts.
+    assert _draw(deck, 4) == [order[2], order[3], order[4], order[0]]
+
+
+def test_draw_returns_a_skipped_card_if_all_are() -> None:
+    deck = _deck(keys=["a", "b", "c"])
+    first = _draw(_deck(keys=["a", "b", "c"]), 1)[0]
+    assert deck.draw(skip=lambda key: True, defer_by=1) == first
+
+
+def test_library_changes_are_merged_in_place() -> None:
+    deck = _deck()
+    _draw(deck, 5)
+    removed = deck.peek(1, skip=_never)[0]
+    keys = [k for k in _KEYS if k != removed] + ["new-1", "new-2"]
+    deck.sync(TrackCatalog(version=2, keys=keys))
+
+    # 15 cards were left: one is gone, two were added.
+    rest = _draw(deck, 16)
+    assert removed not in rest
+    assert {"new-1", "new-2"} <= set(rest)
+    # The next cycle deals from the new library.
+    assert sorted(_draw(deck, 21)) == sorted(keys)
+
+
+def test_unchanged_catalog_version_is_ignored() -> None:
+    deck = _deck()
+    deck.sync(TrackCatalog(version=1, keys=["other"]))
+    assert sorted(_draw(deck, 20)) == _KEYS
+
+
+def test_empty_library() -> None:
+    deck = _deck(keys=[])
+    assert deck.draw(skip=_never, defer_by=3) is None
+    assert deck.peek(3, skip=_never) == []
+
+
+def test_peeking_does_not_change_deferring_draws() -> None:
+    keys = [f"k{i}" for i in range(10)]
+    for window in (6, 7, 8):
+        runs = []
+        for peek_between in (False, True):
+            deck = _deck(keys=keys)
+            played: list[str] = []
+            for _ in range(40):
+                recent = set(played[-window:])
+                key = deck.draw(skip=lambda k, recent=recent: k in recent, defer_by=window)
+                assert key is not None
+                played.append(key)
+                if peek_between:
+                    deck.peek(250, skip=_never)
+            runs.append(played)
+        assert runs[0] == runs[1], window
+
+
+def test_copy_draws_independently() -> None:
+    deck = _deck()
+    _draw(deck, 7)
+    scratch = deck.copy()
+    assert _draw(scratch, 30) == _draw(deck, 30)
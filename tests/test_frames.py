@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import struct
+
+import pytest
+
+from src.streaming.frames import (
+    AudioFrame,
+    FrameChunker,
+    MpegFrameParser,
+    OggPageParser,
+    frame_parser_for,
+)
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding: 417-byte frames of 1152 samples.
+_MP3_HEADER = b"\xff\xfb\x90\x00"
+_MP3_FRAME_LEN = 417
+_MP3_FRAME_S = 1152 / 44100
+
+
+def _mp3_frame(fill: int) -> bytes:
+    return _MP3_HEADER + bytes([fill]) * (_MP3_FRAME_LEN - 4)
+
+
+def _id3(body_size: int) -> bytes:
+    size = bytes((body_size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x04\x00\x00" + size + b"\x00" * body_size
+
+
+def _ogg_page(body: bytes, granule: int, serial: int = 1, bos: bool = False) -> bytes:
+    lacing = [255] * (len(body) // 255) + [len(body) % 255]
+    header = struct.pack(
+        "<4sBBqIIIB", b"OggS", 0, 0x02 if bos else 0, granule, serial, 0, 0, len(lacing)
+    )
+    return header + bytes(lacing) + body
+
+
+def _opus_head(pre_skip: int) -> bytes:
+    return b"OpusHead" + struct.pack("<BBHIhB", 1, 2, pre_skip, 48000, 0, 0)
+
+
+def _feed_in_pieces(
+    parser: MpegFrameParser | OggPageParser, data: bytes, size: int
+) -> list[AudioFrame]:
+    frames: list[AudioFrame] = []
+    for i in range(0, len(data), size):
+        frames += parser.feed(data[i : i + size])
+    return frames + parser.flush()
+
+
+def test_parser_for_mime_type() -> None:
+    assert isinstance(frame_parser_for("audio/ogg"), OggPageParser)
+    assert isinstance(frame_parser_for("audio/mpeg"), MpegFrameParser)
+
+
+def test_mpeg_frames_are_views_of_the_chunk() -> None:
+    parser = MpegFrameParser()
+    data = _id3(100) + b"".join(_mp3_frame(i) for i in range(3))
+    frames = parser.feed(data)
+
+    assert [len(f.data) for f in frames] == [_MP3_FRAME_LEN] * 3
+    assert all(f.duration == pytest.approx(_MP3_FRAME_S) for f in frames)
+    assert parser.skipped_bytes == 110
+    first = frames[0]
+    assert isinstance(first.data, memoryview)
+    assert first.source is data
+    assert first.offset == 110
+    assert bytes(first.data) == _mp3_frame(0)
+    assert parser.flush() == []
+
+
+def test_mpeg_frames_across_chunk_boundaries() -> None:
+    data = b"".join(_mp3_frame(i) for i in range(10))
+    frames = _feed_in_pieces(MpegFrameParser(), data, 100)
+
+    assert b"".join(bytes(f.data) for f in frames) == data
+    assert [bytes(f.data)[4] for f in frames] == list(range(10))
+
+
+def test_mpeg_skips_a_tag_longer_than_the_chunk() -> None:
+    parser = MpegFrameParser()
+    data = _id3(5000) + _mp3_frame(7) + _mp3_frame(8)
+    frames = _feed_in_pieces(parser, data, 1000)
+
+    assert [bytes(f.data) for f in frames] == [_mp3_frame(7), _mp3_frame(8)]
+    assert parser.skipped_bytes == 5010
+
+
+def test_mpeg_resyncs_after_garbage() -> None:
+    parser = MpegFrameParser()
+    # The stray 0xff is not followed by a valid header and must not be taken for one.
+    good = [_mp3_frame(i) for i in range(4)]
+    data = good[0] + good[1] + b"junk\xff\x00junk" + good[2] + good[3]
+    frames = parser.feed(data) + parser.flush()
+
+    assert [bytes(f.data) for f in frames] == good
+    assert parser.skipped_bytes == 10
+
+
+def test_mpeg_needs_two_headers_to_sync() -> None:
+    parser = MpegFrameParser()
+    # A lone header followed by garbage is a false sync, not a frame.
+    frames = parser.feed(_mp3_frame(1) + b"junk" * 200)
+
+    assert frames == []
+    assert parser.skipped_bytes > _MP3_FRAME_LEN
+
+
+def test_ogg_opus_pages_durations_and_headers() -> None:
+    pre_skip = 312
+    data = (
+        _ogg_page(_opus_head(pre_skip), 0, bos=True)
+        + _ogg_page(b"OpusTags" + b"\x00" * 8, 0)
+        + _ogg_page(b"\x00" * 300, pre_skip + 960)
+        + _ogg_page(b"\x00" * 100, -1)
+        + _ogg_page(b"\x00" * 100, pre_skip + 2880)
+    )
+    parser = OggPageParser()
+    frames = _feed_in_pieces(parser, data, 64)
+
+    assert [f.header for f in frames] == [True, True, False, False, False]
+    assert [f.duration for f in frames] == [0.0, 0.0, 0.02, 0.0, 0.04]
+    assert b"".join(bytes(f.data) for f in frames) == data
+    assert parser.skipped_bytes == 0
+
+
+def test_ogg_unknown_codec_has_no_duration() -> None:
+    parser = OggPageParser()
+    frames = parser.feed(b"xx" + _ogg_page(b"\x80theora" + b"\x00" * 20, 0, bos=True))
+
+    assert len(frames) == 1
+    assert frames[0].duration is None
+    assert not frames[0].header
+    assert parser.skipped_bytes == 2
+
+
+def test_chunker_merges_adjacent_frames_without_copy() -> None:
+    data = b"".join(_mp3_frame(i) for i in range(5))
+    chunker = FrameChunker(target_size=2 * _MP3_FRAME_LEN, fallback_bytes_per_second=16000)
+    chunker.push(MpegFrameParser().feed(data))
+    assert chunker.ready()
+
+    unit = chunker.pop()
+    assert unit is not None
+    assert isinstance(unit.data, memoryview)
+    assert unit.data.obj is data
+    assert bytes(unit.data) == data[: 2 * _MP3_FRAME_LEN]
+    assert unit.duration == pytest.approx(2 * _MP3_FRAME_S)
+    assert not unit.estimated
+    assert chunker.pending_bytes == 3 * _MP3_FRAME_LEN
+
+
+def test_chunker_never_splits_a_frame_and_keeps_headers_apart() -> None:
+    chunker = FrameChunker(target_size=10, fallback_bytes_per_second=100)
+    chunker.push(
+        [
+            AudioFrame(data=b"h" * 4, duration=0.0, header=True),
+            AudioFrame(data=b"a" * 30, duration=None),
+            AudioFrame(data=b"b" * 5, duration=0.5),
+        ]
+    )
+
+    header = chunker.pop()
+    assert header is not None and header.header and header.data == b"h" * 4
+    # Larger than the target, but a unit holds at least one whole frame.
+    big = chunker.pop()
+    assert big is not None and big.data == b"a" * 30
+    assert big.estimated and big.duration == pytest.approx(0.3)
+    last = chunker.pop()
+    assert last is not None and last.data == b"b" * 5 and not last.estimated
+    assert chunker.pop() is None
+    assert chunker.pending_bytes == 0
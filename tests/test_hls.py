@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import pytest
+
+from src.streaming import hls
+from src.streaming.hls import HlsSegmenter
+
+
+def _fill(segmenter: HlsSegmenter, seconds: int) -> None:
+    for _ in range(seconds * 10):
+        segmenter.push(b"\x00" * 10, 0.1)
+
+
+def _tag(playlist: str, name: str) -> int:
+    line = next(line for line in playlist.splitlines() if line.startswith(f"#{name}:"))
+    return int(line.split(":", 1)[1])
+
+
+def test_restart_does_not_reuse_segment_uris_or_go_back(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(hls.time, "time", lambda: 1_000_000.0)
+    before = HlsSegmenter(segment_seconds=2.0, window=3, epoch="aaaa")
+    _fill(before, 30)
+    old = before.playlist()
+    assert old is not None
+
+    # 30 s of audio went out; the process restarts right after.
+    monkeypatch.setattr(hls.time, "time", lambda: 1_000_031.0)
+    after = HlsSegmenter(segment_seconds=2.0, window=3, epoch="bbbb")
+    _fill(after, 4)
+    new = after.playlist()
+    assert new is not None
+
+    assert "aaaa/" in old and "aaaa/" not in new
+    assert _tag(new, "EXT-X-MEDIA-SEQUENCE") > _tag(old, "EXT-X-MEDIA-SEQUENCE")
+    assert _tag(new, "EXT-X-DISCONTINUITY-SEQUENCE") >= _tag(old, "EXT-X-DISCONTINUITY-SEQUENCE")
+    # The new run starts with a discontinuity until its first segment leaves the window.
+    assert "#EXT-X-DISCONTINUITY\n" in new
+    assert "#EXT-X-DISCONTINUITY\n" not in old
+
+
+def test_discontinuity_sequence_counts_the_first_segment_leaving() -> None:
+    segmenter = HlsSegmenter(segment_seconds=2.0, window=2, epoch="aaaa")
+    _fill(segmenter, 4)
+    first = segmenter.playlist()
+    assert first is not None
+    _fill(segmenter, 10)
+    later = segmenter.playlist()
+    assert later is not None
+    assert _tag(later, "EXT-X-DISCONTINUITY-SEQUENCE") == (
+        _tag(first, "EXT-X-DISCONTINUITY-SEQUENCE") + 1
+    )
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from datetime import UTC, datetime, time, timedelta
+
+from src.services.scheduler import Scheduler
+from src.settings import ScheduleSlot
+
+_DAY = datetime(2025, 3, 1, tzinfo=UTC)
+
+
+def _slot(start: int, end: int, source: str) -> ScheduleSlot:
+    return ScheduleSlot(start=time(start), end=time(end), source=source)
+
+
+# Overlapping morning slots, a gap in the afternoon and a slot across midnight.
+_SLOTS = [_slot(8, 12, "a"), _slot(10, 14, "b"), _slot(22, 2, "c")]
+
+
+def _at(hour: int, minute: int = 0) -> datetime:
+    return _DAY.replace(hour=hour, minute=minute)
+
+
+def _covers(slot: ScheduleSlot, t: time) -> bool:
+    if slot.start == slot.end:
+        return True
+    if slot.start < slot.end:
+        return slot.start <= t < slot.end
+    return t >= slot.start or t < slot.end
+
+
+def test_lookup_matches_a_linear_scan() -> None:
+    scheduler = Scheduler(_SLOTS)
+    for minute in range(0, 24 * 60, 5):
+        now = _DAY + timedelta(minutes=minute)
+        expected = next((s for s in _SLOTS if _covers(s, now.time())), _SLOTS[0])
+        assert scheduler.choose_slot(now) is expected, now
+
+
+def test_lookup_at_boundaries() -> None:
+    scheduler = Scheduler(_SLOTS)
+    assert scheduler.choose_source(_at(0)) == "c"
+    assert scheduler.choose_source(_at(2)) == "a"  # no slot: the first one
+    assert scheduler.choose_source(_at(10)) == "a"  # first slot in schedule order wins
+    assert scheduler.choose_source(_at(12)) == "b"
+    assert scheduler.choose_source(_at(14)) == "a"
+    assert scheduler.choose_source(_at(22)) == "c"
+
+
+def test_next_transition() -> None:
+    scheduler = Scheduler(_SLOTS)
+    assert scheduler.next_transition(_at(1)) == _at(2)
+    assert scheduler.next_transition(_at(9)) == _at(12)  # 10:00 changes nothing
+    assert scheduler.next_transition(_at(12)) == _at(14)
+    assert scheduler.next_transition(_at(15, 30)) == _at(22)
+    # Midnight is inside "c", so the next change is tomorrow at 02:00.
+    assert scheduler.next_transition(_at(23)) == _at(2) + timedelta(days=1)
+    assert scheduler.next_transition(_at(23)).tzinfo is UTC
+
+
+def test_no_transitions_without_a_change() -> None:
+    assert Scheduler([_slot(0, 0, "a")]).next_transition(_at(12)) is None
+    assert Scheduler([_slot(8, 12, "a")]).next_transition(_at(12)) is None
+    around_the_clock = Scheduler([_slot(8, 12, "a"), _slot(0, 0, "b")])
+    assert around_the_clock.next_transition(_at(12)) == _at(8) + timedelta(days=1)
+
+
+def test_empty_schedule() -> None:
+    scheduler = Scheduler([])
+    assert scheduler.choose_slot(_at(12)) is None
+    assert scheduler.choose_source(_at(12)) == "local"
+    assert scheduler.next_transition(_at(12)) is None
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+from src.api.stream import StreamEndpoint
+from src.streaming.broadcast import BroadcastOutput, BroadcastReader
+
+
+def test_disconnect_is_noticed_while_the_stream_is_quiet() -> None:
+    async def scenario() -> None:
+        output = BroadcastOutput(capacity=16)
+        reader = BroadcastReader(output, burst_seconds=0.0, write_latency_seconds=0.0)
+        endpoint = StreamEndpoint(lambda scope: (reader, "audio/mpeg"))
+        sent: list[dict[str, Any]] = []
+
+        async def receive() -> dict[str, Any]:
+            await asyncio.sleep(0.05)
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict[str, Any]) -> None:
+            sent.append(message)
+
+        # Nothing is ever published: the listener must not wait for audio to leave.
+        await asyncio.wait_for(endpoint({"method": "GET"}, receive, send), timeout=1.0)
+        assert reader.closed
+        assert [m["type"] for m in sent] == ["http.response.start"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+from src.settings import Settings
+from src.streaming.streamer import Streamer, _TrackFeed
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz: 417-byte frames of about 26 ms.
+_MP3_FRAME = b"\xff\xfb\x90\x00" + bytes(413)
+
+
+def _feed(streamer: Streamer, title: str) -> _TrackFeed:
+    return _TrackFeed(
+        slot_source="local",
+        slot_key="music",
+        plan_key=("local", "music"),
+        label="music",
+        track=SimpleNamespace(title=title, duration_seconds=1.0),
+        pace_mode="frames",
+        kbps_used=None,
+        bytes_per_second=16000.0,
+        queue=asyncio.Queue(maxsize=16),
+    )
+
+
+def test_producer_error_mid_track_discards_the_prefetch() -> None:
+    async def scenario() -> None:
+        streamer = Streamer(Settings(prefetch_lead_seconds=10.0))
+        prefetched: list[_TrackFeed] = []
+
+        async def prepare_feed(lead_s: float) -> _TrackFeed:
+            feed = _feed(streamer, "next")
+            # A download that waits for its reader, like a full frame queue.
+            feed.task = asyncio.create_task(asyncio.Event().wait())
+            prefetched.append(feed)
+            return feed
+
+        class FailingSource:
+            id = "local"
+
+            async def stream_track(self, track: Any, chunk_size: int) -> AsyncIterator[bytes]:
+                yield _MP3_FRAME * 4
+                # The next track is prefetched while this one waits for more data.
+                await asyncio.sleep(0.2)
+                yield _MP3_FRAME * 4
+                raise RuntimeError("connection lost")
+
+        streamer._prepare_feed = prepare_feed  # type: ignore[method-assign]
+        feed = _feed(streamer, "current")
+        feed.task = asyncio.create_task(streamer._produce_frames(feed, FailingSource()))
+
+        with pytest.raises(RuntimeError, match="connection lost"):
+            await streamer._play_feed(feed)
+
+        assert len(prefetched) == 1
+        assert prefetched[0].task.cancelled()
+
+    asyncio.run(scenario())
+
+
+def test_track_is_cut_when_the_schedule_switches_slots() -> None:
+    async def scenario() -> None:
+        streamer = Streamer(Settings(prefetch_lead_seconds=10.0))
+        leads: list[float] = []
+
+        async def prepare_feed(lead_s: float) -> _TrackFeed:
+            leads.append(lead_s)
+            return _feed(streamer, "next slot")
+
+        class LongSource:
+            id = "local"
+
+            async def stream_track(self, track: Any, chunk_size: int) -> AsyncIterator[bytes]:
+                # About 10 s of audio.
+                yield _MP3_FRAME * 400
+
+        streamer._prepare_feed = prepare_feed  # type: ignore[method-assign]
+        streamer._slot_end_s = lambda feed: 0.3  # type: ignore[method-assign]
+        feed = _feed(streamer, "current")
+        feed.track.duration_seconds = 10.0
+        feed.task = asyncio.create_task(streamer._produce_frames(feed, LongSource()))
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        next_task = await streamer._play_feed(feed)
+        assert 0.3 <= loop.time() - started < 1.0
+        # The next slot's track was prefetched for the cut, not for the end of the track.
+        assert next_task is not None
+        assert leads and leads[0] <= 0.3
+        assert feed.task.done()
+        assert streamer._slot_cuts_total == 1
+        await next_task
+
+    asyncio.run(scenario())
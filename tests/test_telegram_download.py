@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+from typing import Any
+
+from src.streaming.sources.telegram_download import ParallelDownloader
+
+
+def test_no_parts_are_started_after_the_consumer_left() -> None:
+    async def scenario() -> None:
+        second_part_read = asyncio.Event()
+        offsets: list[int] = []
+
+        class Client:
+            async def iter_download(self, media: object, offset: int, **kwargs: Any):
+                offsets.append(offset)
+                yield b"x" * 16
+                if offset == 16:
+                    second_part_read.set()
+
+        downloader = ParallelDownloader(max_parallel=2, part_size=16)
+        stream: AsyncIterator[bytes] = downloader.stream(
+            Client(), media=object(), size=16 * 20, request_size=16
+        )
+        assert await anext(stream) == b"x" * 16
+        # The consumer leaves right as the second part completes, before its done
+        # callback (which would start the next parts) has run.
+        await second_part_read.wait()
+        await stream.aclose()
+        started = list(offsets)
+
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert offsets == started
+
+    asyncio.run(scenario())